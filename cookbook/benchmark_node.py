@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import xml.dom.minidom as xdm
+
+import nansat
+from nansat.node import Node
+
+###############################################################################
+####    Benchmark of parsing and serializing XML with Node and minidom     ####
+###############################################################################
+
+# Usage: python benchmark_node.py [nBands]
+nBands = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+repeats = 10
+
+# large VRT similar to VRTs created by mappers
+vrtXML = ('<VRTDataset rasterXSize="300" rasterYSize="200">' +
+          ''.join(['<VRTRasterBand dataType="Float32" band="%d">'
+                   '<Metadata><MDI key="name">band%d</MDI>'
+                   '</Metadata><ComplexSource>'
+                   '<SourceFilename relativeToVRT="0">'
+                   '/vsimem/ABC.vrt</SourceFilename>'
+                   '<SourceBand>1</SourceBand>'
+                   '<SrcRect xOff="0" yOff="0" xSize="300" ySize="200"/>'
+                   '<DstRect xOff="0" yOff="0" xSize="300" ySize="200"/>'
+                   '</ComplexSource></VRTRasterBand>' % (i, i)
+                   for i in range(1, nBands + 1)]) +
+          '</VRTDataset>')
+with open(os.path.join(os.path.dirname(nansat.__file__), 'wkv.xml')) as f:
+    wkvXML = f.read()
+
+
+def get_time(function):
+    ''' Get minimum time of <repeats> calls of the function '''
+    times = []
+    for i in range(repeats):
+        t0 = time.time()
+        function()
+        times.append(time.time() - t0)
+    return min(times)
+
+# Node.create + rawxml should be faster than parsing with minidom
+print('%10s  %12s  %12s  %12s' % ('XML', 'Node.rawxml', 'Node.xml',
+                                  'minidom'))
+for name, xml in [('VRT', vrtXML), ('wkv.xml', wkvXML)]:
+    print('%10s  %12.4f  %12.4f  %12.4f' % (
+        name,
+        get_time(lambda: Node.create(xml).rawxml()),
+        get_time(lambda: Node.create(xml).xml()),
+        get_time(lambda: xdm.parseString(xml).toxml())))
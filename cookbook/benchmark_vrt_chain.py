@@ -0,0 +1,34 @@
+import sys
+import time
+
+import numpy as np
+from nansat.vrt import VRT
+
+###############################################################################
+####     Benchmark of copy and get_super_vrt for deep chains of VRTs       ####
+###############################################################################
+
+# Usage: python benchmark_vrt_chain.py [maxDepth]
+maxDepth = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+repeats = 10
+
+array = np.random.randn(200, 300)
+
+
+def get_chain(depth):
+    ''' Create VRT with <depth> sub-VRTs '''
+    vrt = VRT(array=array)
+    for i in range(depth):
+        vrt = vrt.get_super_vrt()
+    return vrt
+
+# Time of copy and get_super_vrt should not grow with the depth of the chain
+print('  depth  time, s')
+for depth in [1, 10, maxDepth]:
+    vrt = get_chain(depth)
+    times = []
+    for i in range(repeats):
+        t0 = time.time()
+        vrt.copy().get_super_vrt()
+        times.append(time.time() - t0)
+    print('%7d  %7.4f' % (depth, min(times)))
@@ -0,0 +1,45 @@
+import sys
+import time
+
+import numpy as np
+from nansat import Nansat, Domain
+
+###############################################################################
+####     Benchmark of reprojection of a swath with several warping threads ####
+###############################################################################
+
+# Usage: python benchmark_warp_threads.py [maxThreads]
+maxThreads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+
+# Create synthetic swath: 4000 x 2000 pixels with curved lon/lat grids
+# (geolocation arrays are used for warping)
+rows, cols = np.mgrid[0:4000, 0:2000].astype('float32')
+lon = 10 + cols * 0.001 + (rows * 0.0001) ** 2
+lat = 60 - rows * 0.001 - (cols * 0.0001) ** 2
+swath = Domain(lon=lon, lat=lat)
+data = np.random.randn(4000, 2000).astype('float32')
+
+# Destination: regular lon/lat grid covering the swath
+dstDomain = Domain(4326, '-te 10 55 14 61 -ts 3000 4000')
+
+# Reproject and read with 1, 2, 4, ... threads (maxError=0.125 as gdalwarp)
+numThreadsList = [1]
+while numThreadsList[-1] * 2 <= maxThreads:
+    numThreadsList.append(numThreadsList[-1] * 2)
+
+results = []
+for maxError in [0, 0.125]:
+    for numThreads in numThreadsList:
+        n = Nansat(domain=swath, array=data, logLevel=40)
+        n.reproject(dstDomain, eResampleAlg=1, numThreads=numThreads,
+                    warpMemoryLimit=256 * 1024 ** 2, maxError=maxError)
+        t0 = time.time()
+        a = n[1]
+        results.append((maxError, numThreads, time.time() - t0))
+
+# Print time and speedup relative to one thread
+print('maxError  threads  time, s  speedup')
+for maxError, numThreads, seconds in results:
+    t1 = [r[2] for r in results if r[0] == maxError and r[1] == 1][0]
+    print('%8.3f  %7d  %7.2f  %7.2f' % (maxError, numThreads, seconds,
+                                       t1 / seconds))
@@ -16,6 +16,9 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 from __future__ import absolute_import
 import os, sys
+import types
+import pkgutil
+import importlib
 import warnings
 
 # check if pixel functions were compiled using setup_tools
@@ -37,31 +40,67 @@ from nansat.nansat import Nansat
 
 __all__ = ['NSR', 'Domain', 'Nansat']
 
-try:
-    from nansat.figure import Figure
-except ImportError:
-    warnings.warn('''Cannot import Figure! Nansat will not make figures!''')
-else:
-    __all__.append('Figure')
-
-try:
-    from nansat.nansatmap import Nansatmap
-except ImportError:
-    warnings.warn('''Cannot import Nansatmap! Nansat will not make maps!''')
-else:
-    __all__.append('Nansatmap')
-
-try:
-    from nansat.mosaic import Mosaic
-except ImportError:
-    warnings.warn('''Cannot import Mosaic! Nansat will not mosaic files!''')
-else:
-    __all__.append('Mosaic')
-
 os.environ['LOG_LEVEL'] = '30'
 
 # import some libraries for convenience
 from nansat.tools import gdal, ogr
 import numpy as np
-import matplotlib.pyplot as plt
-__all__ += ['gdal', 'ogr', 'np', 'plt']
+__all__ += ['gdal', 'ogr', 'np']
+
+# Classes and modules which are imported at the first access (e.g.
+# nansat.Figure or from nansat import Nansatmap). Import of matplotlib, PIL,
+# Basemap and scipy takes long time and is not needed for reading data.
+# name: (module, attribute, required packages, warning if not importable)
+_lazyImports = {
+    'Figure': ('nansat.figure', 'Figure', ['matplotlib', 'PIL'],
+               'Cannot import Figure! Nansat will not make figures!'),
+    'Nansatmap': ('nansat.nansatmap', 'Nansatmap',
+                  ['matplotlib', 'mpl_toolkits.basemap'],
+                  'Cannot import Nansatmap! Nansat will not make maps!'),
+    'Mosaic': ('nansat.mosaic', 'Mosaic', ['scipy'],
+               'Cannot import Mosaic! Nansat will not mosaic files!'),
+    'plt': ('matplotlib.pyplot', None, ['matplotlib'],
+            'Cannot import matplotlib.pyplot!'),
+}
+
+
+def _is_installed(packageNames):
+    ''' Check if packages can be imported without importing them '''
+    for packageName in packageNames:
+        try:
+            if pkgutil.find_loader(packageName) is None:
+                return False
+        except ImportError:
+            return False
+    return True
+
+__all__ += [name for name in sorted(_lazyImports)
+            if _is_installed(_lazyImports[name][2])]
+
+
+class _LazyModule(types.ModuleType):
+    ''' Module nansat which imports attributes from _lazyImports on access '''
+    def __getattr__(self, name):
+        if name not in _lazyImports:
+            raise AttributeError("'module' object has no attribute '%s'"
+                                 % name)
+        moduleName, attrName, packageNames, message = _lazyImports[name]
+        try:
+            module = importlib.import_module(moduleName)
+        except ImportError:
+            warnings.warn(message)
+            raise AttributeError("'module' object has no attribute '%s'"
+                                 % name)
+        if attrName is None:
+            value = module
+        else:
+            value = getattr(module, attrName)
+        setattr(self, name, value)
+        return value
+
+# replace this module with _LazyModule. The original module is kept as an
+# attribute because its globals are used by _LazyModule.__getattr__
+_module = _LazyModule(__name__, __doc__)
+_module.__dict__.update(sys.modules[__name__].__dict__)
+_module._originalModule = sys.modules[__name__]
+sys.modules[__name__] = _module
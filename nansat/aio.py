@@ -0,0 +1,285 @@
+# Name:    aio.py
+# Purpose: Awaitable API for opening, reading and plotting in threads
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+'''Awaitable API for serving many Nansat objects concurrently
+
+Opening files, reading, reprojecting and writing figures block the calling
+thread. The functions below run these operations in a shared thread pool
+with a limited number of workers and pending tasks (BoundedExecutor). If
+asyncio is available they return asyncio futures which can be awaited in
+an event loop, otherwise concurrent.futures.Future objects are returned.
+The package futures is needed on Python 2.
+
+import asyncio
+from nansat import aio
+
+async def quicklook(fileName, pngName):
+    n = await aio.open_nansat(fileName)
+    await aio.write_figure(n, pngName, bands=1, clim='hist')
+
+Operations on the same Nansat object from several tasks don't interfere:
+bands are read from datasets opened for each thread (see
+VRT.get_thread_dataset), reproject and write_figure use copies of the
+Nansat object.
+
+If too many tasks are pending, ExecutorBusyError is raised immediately
+(back-pressure). Awaiting tasks can be cancelled: tasks which have not
+started are removed from the queue, running tasks are completed.
+
+'''
+from __future__ import absolute_import
+import threading
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+from nansat.nansat import Nansat
+from nansat.tools import ExecutorBusyError
+
+
+class BoundedExecutor(object):
+    '''Thread pool with limited number of pending tasks
+
+    Running and waiting tasks are counted. If the limit is reached, new
+    tasks are not accepted (ExecutorBusyError is raised), instead of
+    growing the queue and the waiting time of all tasks.
+
+    '''
+    def __init__(self, maxWorkers=4, maxPending=None):
+        '''Create thread pool
+
+        Parameters
+        -----------
+        maxWorkers : int
+            number of threads
+        maxPending : int
+            maximum number of running and waiting tasks. Default is
+            2 * maxWorkers
+
+        '''
+        if ThreadPoolExecutor is None:
+            raise ImportError('concurrent.futures is not available! '
+                              'Install the package futures.')
+        self.maxWorkers = maxWorkers
+        self.maxPending = maxPending or 2 * maxWorkers
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(maxWorkers)
+
+    def __repr__(self):
+        return ('BoundedExecutor: %d workers, %d of %d tasks pending'
+                % (self.maxWorkers, self.pending, self.maxPending))
+
+    def submit(self, function, *args, **kwargs):
+        '''Run function in a thread
+
+        Parameters
+        -----------
+        function : callable
+        args, kwargs : arguments of the function
+
+        Returns
+        --------
+        future : concurrent.futures.Future
+
+        Raises
+        -------
+        ExecutorBusyError : if maxPending tasks are running or waiting
+
+        '''
+        with self.lock:
+            if self.pending >= self.maxPending:
+                raise ExecutorBusyError('%d tasks are pending' % self.pending)
+            self.pending += 1
+        try:
+            future = self.executor.submit(function, *args, **kwargs)
+        except:
+            self._task_done()
+            raise
+        future.add_done_callback(self._task_done)
+        return future
+
+    def shutdown(self, wait=True):
+        '''Stop accepting tasks and stop threads after the running tasks'''
+        self.executor.shutdown(wait)
+
+    def _task_done(self, future=None):
+        '''Decrease number of pending tasks (when a task is completed or
+        cancelled)'''
+        with self.lock:
+            self.pending -= 1
+
+
+# executor shared by all functions (see get_executor)
+_executor = None
+_executorLock = threading.Lock()
+
+
+def get_executor():
+    '''Get executor which is used by default (created at the first call)'''
+    global _executor
+    with _executorLock:
+        if _executor is None:
+            _executor = BoundedExecutor()
+    return _executor
+
+
+def set_executor(executor):
+    '''Set executor which is used by default
+
+    Parameters
+    -----------
+    executor : BoundedExecutor
+
+    '''
+    global _executor
+    with _executorLock:
+        _executor = executor
+
+
+def _submit(executor, loop, function, *args, **kwargs):
+    '''Submit function to the executor and wrap future for asyncio'''
+    future = (executor or get_executor()).submit(function, *args, **kwargs)
+    if asyncio is None:
+        return future
+    return asyncio.wrap_future(future, loop=loop)
+
+
+def open_nansat(fileName, executor=None, loop=None, **kwargs):
+    '''Open file with Nansat in a thread
+
+    Parameters
+    -----------
+    fileName : str
+        name of the file
+    executor : BoundedExecutor
+        executor for running the task. Default is get_executor()
+    loop : asyncio event loop
+        loop of the returned future. Default is the current loop
+    kwargs : arguments for Nansat() (e.g. mapperName, logLevel)
+
+    Returns
+    --------
+    future of Nansat
+
+    '''
+    return _submit(executor, loop, Nansat, fileName, **kwargs)
+
+
+def _read_window(n, vrt, version, bandNumber, window, expressionNansat):
+    '''Read window from the dataset of the current thread'''
+    if expressionNansat is not None:
+        return expressionNansat._read_band(bandNumber, window)
+    band = vrt.get_thread_dataset(version).GetRasterBand(bandNumber)
+    return n._mask_invalid(band.ReadAsArray(*window), band)
+
+
+def read_window(n, bandID, window=None, executor=None, loop=None):
+    '''Read band (or window from band) in a thread
+
+    Parameters
+    -----------
+    n : Nansat
+    bandID : int or str
+        band number or name
+    window : tuple
+        (xOff, yOff, xSize, ySize) of the window to read. If None, the
+        entire band is read
+    executor : BoundedExecutor
+        executor for running the task. Default is get_executor()
+    loop : asyncio event loop
+        loop of the returned future. Default is the current loop
+
+    Returns
+    --------
+    future of NumPy array
+
+    '''
+    bandNumber = n._get_band_number(bandID)
+    if window is None:
+        window = (0, 0, n.vrt.dataset.RasterXSize, n.vrt.dataset.RasterYSize)
+    version = n.vrt.get_dataset_version()
+
+    # bands with expression read other bands, use a copy of Nansat
+    expressionNansat = None
+    band = n.vrt.dataset.GetRasterBand(bandNumber)
+    if band.GetMetadata().get('expression', '') != '':
+        expressionNansat = n._get_copy()
+
+    return _submit(executor, loop, _read_window, n, n.vrt, version,
+                   bandNumber, tuple(window), expressionNansat)
+
+
+def _reproject_and_read(n, dstDomain, bands, kwargs):
+    '''Reproject Nansat (copy) and read bands'''
+    n.reproject(dstDomain, **kwargs)
+    return n.read_bands(bands)
+
+
+def reproject_and_read(n, dstDomain, bands, executor=None, loop=None,
+                       **kwargs):
+    '''Reproject and read bands in a thread
+
+    Input Nansat object is not changed.
+
+    Parameters
+    -----------
+    n : Nansat
+    dstDomain : Domain
+        destination Domain
+    bands : list
+        band numbers or names
+    executor : BoundedExecutor
+        executor for running the task. Default is get_executor()
+    loop : asyncio event loop
+        loop of the returned future. Default is the current loop
+    kwargs : arguments for Nansat.reproject()
+
+    Returns
+    --------
+    future of 3D NumPy array (see Nansat.read_bands)
+
+    '''
+    return _submit(executor, loop, _reproject_and_read, n._get_copy(),
+                   dstDomain, bands, kwargs)
+
+
+def write_figure(n, fileName, executor=None, loop=None, **kwargs):
+    '''Write figure in a thread
+
+    Parameters
+    -----------
+    n : Nansat
+    fileName : str
+        name of the output file
+    executor : BoundedExecutor
+        executor for running the task. Default is get_executor()
+    loop : asyncio event loop
+        loop of the returned future. Default is the current loop
+    kwargs : arguments for Nansat.write_figure() (e.g. bands, clim)
+
+    Returns
+    --------
+    future of the result of Nansat.write_figure()
+
+    '''
+    return _submit(executor, loop, n._get_copy().write_figure, fileName,
+                   **kwargs)
@@ -0,0 +1,165 @@
+# Name:    bandcache.py
+# Purpose: Cache of arrays read from bands
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import threading
+from collections import OrderedDict
+
+
+class BandCache(object):
+    '''Least recently used cache of arrays read from bands
+
+    Arrays are stored with keys (VRT file name, band, window, dtype).
+    When total size of stored arrays exceeds the budget, the least recently
+    used arrays are removed. The cache is disabled if the budget is 0.
+
+    Nansat uses one cache per process (nansat.bandcache.bandCache). It is
+    disabled by default and can be enabled by setting a budget:
+
+    from nansat.bandcache import bandCache
+    bandCache.set_budget(1024 ** 3)
+    # keep up to 1 GB of arrays in memory
+
+    '''
+    maxBytes = 0
+    nBytes = 0
+    hits = 0
+    misses = 0
+    evictions = 0
+
+    def __init__(self, maxBytes=0):
+        '''Create empty cache
+
+        Parameters
+        -----------
+        maxBytes : int
+            budget of the cache in bytes. Caching is disabled if 0
+
+        '''
+        self.maxBytes = maxBytes
+        self.arrays = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return ('BandCache: %(arrays)d arrays, %(nBytes)d of %(maxBytes)d '
+                'bytes, %(hits)d hits, %(misses)d misses' % self.stats())
+
+    def set_budget(self, maxBytes):
+        '''Set budget of the cache and remove arrays above the budget
+
+        Parameters
+        -----------
+        maxBytes : int
+            budget of the cache in bytes. Caching is disabled if 0
+
+        '''
+        with self.lock:
+            self.maxBytes = maxBytes
+            self._evict()
+
+    def get(self, key):
+        '''Get copy of cached array
+
+        Parameters
+        -----------
+        key : tuple
+            (VRT file name, band, window, dtype)
+
+        Returns
+        --------
+        array : NumPy array or None (if not in cache or cache is disabled)
+
+        '''
+        if self.maxBytes == 0:
+            return None
+        with self.lock:
+            array = self.arrays.pop(key, None)
+            if array is None:
+                self.misses += 1
+                return None
+            # move array to the end of the queue (the most recently used)
+            self.arrays[key] = array
+            self.hits += 1
+        return array.copy()
+
+    def put(self, key, array):
+        '''Store copy of array in cache
+
+        Parameters
+        -----------
+        key : tuple
+            (VRT file name, band, window, dtype)
+        array : NumPy array
+
+        '''
+        if self.maxBytes == 0 or array.nbytes > self.maxBytes:
+            return
+        array = array.copy()
+        with self.lock:
+            if key in self.arrays:
+                self.nBytes -= self.arrays.pop(key).nbytes
+            self.arrays[key] = array
+            self.nBytes += array.nbytes
+            self._evict()
+
+    def invalidate(self, vrtFileName):
+        '''Remove all arrays read from given VRT
+
+        Parameters
+        -----------
+        vrtFileName : str
+            name of the VRT file
+
+        '''
+        if len(self.arrays) == 0:
+            return
+        with self.lock:
+            for key in [key for key in self.arrays if key[0] == vrtFileName]:
+                self.nBytes -= self.arrays.pop(key).nbytes
+
+    def clear(self):
+        '''Remove all arrays and reset counters'''
+        with self.lock:
+            self.arrays.clear()
+            self.nBytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        '''Get statistics of the cache usage
+
+        Returns
+        --------
+        stats : dict
+            number of arrays, bytes used, budget, hits, misses, evictions
+
+        '''
+        return {'arrays': len(self.arrays),
+                'nBytes': self.nBytes,
+                'maxBytes': self.maxBytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+    def _evict(self):
+        '''Remove least recently used arrays until cache fits the budget'''
+        while self.nBytes > self.maxBytes and len(self.arrays) > 0:
+            key, array = self.arrays.popitem(last=False)
+            self.nBytes -= array.nbytes
+            self.evictions += 1
+
+
+# cache of arrays shared by all Nansat objects in the process
+bandCache = BandCache()
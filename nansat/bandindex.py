@@ -0,0 +1,112 @@
+# Name:    bandindex.py
+# Purpose: Index of metadata of bands for fast search of bands
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+
+
+class BandIndex(object):
+    '''Index of metadata of all bands in a GDAL dataset
+
+    Metadata of all bands is read once when the index is created. Bands are
+    found by (key, value) pairs of metadata without calling GDAL, e.g.
+    {'name': 'sigma0_HH'} or {'wkv': 'surface_backwards_scattering_'
+    'coefficient_of_radar_wave', 'polarization': 'HH'}.
+
+    The index is kept by VRT (see VRT.get_band_index) and is re-created
+    when bands are added, deleted or metadata of bands is changed through
+    VRT or Nansat methods.
+
+    '''
+    def __init__(self, dataset):
+        '''Read metadata of all bands
+
+        Parameters
+        -----------
+        dataset : GDAL Dataset
+
+        '''
+        self.dataset = dataset
+        self.rasterCount = dataset.RasterCount
+        self.metadata = []
+        # band numbers for each (key, value) pair
+        self.items = {}
+        for bandNumber in range(1, self.rasterCount + 1):
+            metadata = dataset.GetRasterBand(bandNumber).GetMetadata()
+            self.metadata.append(metadata)
+            for item in metadata.items():
+                self.items.setdefault(item, []).append(bandNumber)
+
+    def __repr__(self):
+        return 'BandIndex: %d bands' % self.rasterCount
+
+    def is_valid(self, dataset):
+        '''Check if the index was created from the given dataset
+
+        Parameters
+        -----------
+        dataset : GDAL Dataset
+
+        Returns
+        --------
+        True if the dataset is the same and has the same number of bands
+
+        '''
+        return (dataset is self.dataset and
+                dataset.RasterCount == self.rasterCount)
+
+    def bands(self):
+        '''Get metadata of all bands
+
+        Returns
+        --------
+        bands : dict
+            key = band number, value = dict with all band metadata (copy)
+
+        '''
+        return dict((bandNumber + 1, dict(metadata))
+                    for bandNumber, metadata in enumerate(self.metadata))
+
+    def find(self, query):
+        '''Find band with given metadata
+
+        Parameters
+        -----------
+        query : dict
+            keys and values of metadata. All pairs should match
+
+        Returns
+        --------
+        bandNumber : int
+            number of the last band with all given metadata or 0 if not
+            found
+
+        '''
+        bandNumbers = None
+        for item in query.items():
+            try:
+                itemBands = self.items.get(item, [])
+            except TypeError:
+                # unhashable value can't be in metadata
+                return 0
+            if bandNumbers is None:
+                bandNumbers = set(itemBands)
+            else:
+                bandNumbers.intersection_update(itemBands)
+            if not bandNumbers:
+                return 0
+
+        if bandNumbers is None:
+            # empty query matches no band
+            return 0
+        return max(bandNumbers)
@@ -0,0 +1,249 @@
+# Name:    chunked.py
+# Purpose: Lazy array of bands read chunk by chunk
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import threading
+from random import choice
+from string import ascii_lowercase, digits
+
+import numpy as np
+
+from nansat.tools import gdal_array, OptionError
+
+
+class ChunkedArray(object):
+    '''Lazy 3D array (bands, rows, columns) of Nansat bands
+
+    No data is read when ChunkedArray is created. Data is read from the
+    VRT only when the array (or a part of it) is requested:
+    np.asarray(chunkedArray) or chunkedArray[0, 100:200, 300:400] read
+    only the windows needed. The array is split into chunks of
+    (rows, columns); each chunk is read by one RasterIO from the VRT. The
+    graph of chunks (see graph() and to_dask()) allows dask to read and
+    process chunks in parallel threads.
+
+    Chunks are read from GDAL datasets opened for each thread (see
+    VRT.get_thread_dataset). Bands with expressions are read in one thread
+    at a time. ChunkedArray keeps the VRT of the Nansat object at the time
+    of creation: later changes of Nansat (e.g. reproject) do not change
+    ChunkedArray.
+
+    Examples
+    --------
+    c = n.to_chunked(['L_645', 'L_555'], chunks=(512, 512))
+    c.shape
+    # (2, ySize, xSize)
+    ratio = c[0, :100, :100] / c[1, :100, :100]
+    # read 100 x 100 pixels from two bands
+    d = c.to_dask()
+    # dask array, each chunk is read in a task
+
+    '''
+    def __init__(self, n, bands=None, chunks=(1024, 1024)):
+        '''Create ChunkedArray from Nansat object
+
+        Parameters
+        -----------
+        n : Nansat
+            source of data
+        bands : list
+            band numbers or names. If None, all bands are used
+        chunks : int or tuple
+            size of chunks (rows, columns) or size of square chunks
+
+        '''
+        if bands is None:
+            bands = range(1, n.vrt.dataset.RasterCount + 1)
+        elif type(bands) not in [list, tuple]:
+            bands = [bands]
+        if type(chunks) not in [list, tuple]:
+            chunks = (chunks, chunks)
+        if min(chunks) < 1:
+            raise OptionError('Wrong size of chunks!')
+
+        self.bandNumbers = [n._get_band_number(band) for band in bands]
+        # later changes of n do not change the copy
+        self._nansat = n._get_copy()
+        self.vrt = self._nansat.vrt
+        self.version = self.vrt.get_dataset_version()
+        self.shape = (len(self.bandNumbers),
+                      n.vrt.dataset.RasterYSize,
+                      n.vrt.dataset.RasterXSize)
+        self.chunks = tuple(chunks)
+
+        # bands with expression are read by the copy of Nansat
+        self._lock = threading.Lock()
+        self.isExpression = []
+        dtypes = []
+        for bandNumber in self.bandNumbers:
+            band = self.vrt.dataset.GetRasterBand(bandNumber)
+            if band.GetMetadata().get('expression', '') != '':
+                self.isExpression.append(True)
+                dtypes.append(self._read_window(len(self.isExpression) - 1,
+                                                (0, 0, 1, 1)).dtype)
+            else:
+                self.isExpression.append(False)
+                dtypes.append(np.dtype(
+                    gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)))
+        self.dtype = np.result_type(*dtypes)
+        self.name = 'nansat-' + ''.join(choice(ascii_lowercase + digits)
+                                        for i in range(10))
+
+    def __repr__(self):
+        return ('ChunkedArray: shape %s, dtype %s, chunks %s'
+                % (self.shape, self.dtype, self.chunks))
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        ''' Number of dimensions '''
+        return len(self.shape)
+
+    def __array__(self, dtype=None):
+        ''' Read entire array (numpy array protocol) '''
+        data = self[:]
+        if dtype is not None:
+            data = data.astype(dtype)
+        return data
+
+    def __getitem__(self, index):
+        ''' Read part of the array given by NumPy index
+
+        Integers and slices (with steps) are supported for all dimensions.
+        Only the smallest window containing the requested pixels is read
+        from each band.
+
+        '''
+        if type(index) is not tuple:
+            index = (index,)
+        if len(index) > self.ndim:
+            raise IndexError('Too many indices')
+        index = list(index) + [slice(None)] * (self.ndim - len(index))
+
+        windowIndices = []
+        subset = []
+        for i, (dimIndex, size) in enumerate(zip(index, self.shape)):
+            if isinstance(dimIndex, (int, long, np.integer)):
+                if dimIndex < 0:
+                    dimIndex += size
+                if dimIndex < 0 or dimIndex >= size:
+                    raise IndexError('Index %d is out of range [0, %d)'
+                                     % (dimIndex, size))
+                windowIndices.append([dimIndex])
+                subset.append(0)
+            elif isinstance(dimIndex, slice):
+                indices = range(*dimIndex.indices(size))
+                if i == 0 or len(indices) == 0:
+                    # bands are read in the requested order
+                    windowIndices.append(indices)
+                    subset.append(slice(None))
+                else:
+                    # read continuous window and take every step-th pixel
+                    start = min(indices)
+                    windowIndices.append(range(start, max(indices) + 1))
+                    subset.append(slice(indices[0] - start, None,
+                                        dimIndex.indices(size)[2]))
+            else:
+                raise IndexError('Only integers and slices are supported!')
+
+        bandIndices, rows, cols = windowIndices
+        data = np.empty((len(bandIndices), len(rows), len(cols)), self.dtype)
+        if data.size > 0:
+            window = (cols[0], rows[0], len(cols), len(rows))
+            for i, bandIndex in enumerate(bandIndices):
+                data[i] = self._read_window(bandIndex, window)
+
+        # select requested pixels and remove dimensions with integer index
+        return data[tuple(subset)]
+
+    def _read_window(self, bandIndex, window):
+        ''' Read window from band in the current thread
+
+        Parameters
+        -----------
+        bandIndex : int
+            index of band in self.bandNumbers
+        window : tuple
+            (xOff, yOff, xSize, ySize)
+
+        Returns
+        --------
+        2D NumPy array
+
+        '''
+        bandNumber = self.bandNumbers[bandIndex]
+        if self.isExpression[bandIndex]:
+            with self._lock:
+                return self._nansat._read_band(bandNumber, window)
+
+        band = self.vrt.get_thread_dataset(self.version).GetRasterBand(
+                                                                    bandNumber)
+        return self._nansat._mask_invalid(band.ReadAsArray(*window), band)
+
+    def _read_chunk(self, bandIndex, window):
+        ''' Read chunk as 3D array (task of the graph) '''
+        return self._read_window(bandIndex, window)[None].astype(self.dtype)
+
+    def get_chunks(self):
+        ''' Get sizes of chunks along each dimension
+
+        Returns
+        --------
+        chunks : tuple
+            ((1, 1, ...), (rows of chunks), (columns of chunks)) as in dask
+
+        '''
+        chunks = [(1,) * self.shape[0]]
+        for size, chunkSize in zip(self.shape[1:], self.chunks):
+            chunks.append(tuple(min(chunkSize, size - offset)
+                                for offset in range(0, size, chunkSize)))
+        return tuple(chunks)
+
+    def graph(self):
+        ''' Get graph of tasks for reading chunks (dask format)
+
+        Returns
+        --------
+        graph : dict
+            keys are (name, band index, row index, column index) of chunks,
+            values are tasks (function, band index, window)
+
+        '''
+        graph = {}
+        chunks = self.get_chunks()
+        for bandIndex in range(self.shape[0]):
+            yOff = 0
+            for i, ySize in enumerate(chunks[1]):
+                xOff = 0
+                for j, xSize in enumerate(chunks[2]):
+                    graph[(self.name, bandIndex, i, j)] = (
+                        self._read_chunk, bandIndex,
+                        (xOff, yOff, xSize, ySize))
+                    xOff += xSize
+                yOff += ySize
+        return graph
+
+    def to_dask(self):
+        ''' Get dask array which reads chunks from ChunkedArray
+
+        Returns
+        --------
+        dask.array.Array
+
+        '''
+        import dask.array
+        return dask.array.Array(self.graph(), self.name, self.get_chunks(),
+                                self.dtype)
@@ -21,9 +21,6 @@ import string
 from xml.etree.ElementTree import ElementTree
 
 import numpy as np
-import matplotlib.pyplot as plt
-from mpl_toolkits.basemap import Basemap
-from matplotlib.patches import Polygon
 
 from nansat.tools import add_logger, initial_bearing, haversine, gdal, osr, ogr
 from nansat.tools import OptionError
@@ -369,7 +366,8 @@ class Domain(object):
         kmlFile.write('</kml>')
         kmlFile.close()
 
-    def get_geolocation_grids(self, stepSize=1):
+    def get_geolocation_grids(self, stepSize=1, fast=False, maxError=0.001,
+                              dtype=None, window=None):
         '''Get longitude and latitude grids representing the full data grid
 
         If GEOLOCATION is not present in the self.vrt.dataset then grids
@@ -377,10 +375,31 @@ class Domain(object):
         If GEOLOCATION is present in the self.vrt.dataset then grids are read
         from the geolocation bands.
 
+        If fast is True and GEOLOCATION is not present, grids are generated
+        without transformation of each pixel by GDAL Transformer:
+        for datasets with GeoTransform, projected coordinates of pixels are
+        calculated from GeoTransform and converted to lon/lat in one call
+        to osr.CoordinateTransformation (or not converted at all for
+        unrotated lat/lon grids); for datasets with GCPs, lon/lat are
+        calculated on a sparse grid which is refined until bicubic
+        interpolation of lon/lat between nodes has error below maxError.
+
         Parameters
         -----------
         stepSize : int
             Reduction factor if output is desired on a reduced grid size
+        fast : bool
+            Use accelerated generation of grids (see above). For datasets
+            with GCPs requires scipy
+        maxError : float
+            Tolerance (degrees) of interpolation of lon/lat between nodes of
+            sparse grid. Only for fast generation for datasets with GCPs
+        dtype : str or numpy dtype
+            Data type of the output grids (e.g. 'float32'). Default is the
+            type given by the transformation (float64)
+        window : tuple
+            (xOff, yOff, xSize, ySize) of the window to get grids for.
+            Default is the full data grid
 
         Returns
         --------
@@ -389,21 +408,111 @@ class Domain(object):
         latitude : numpy array
             grid with latitudes
         '''
-
-        X = range(0, self.vrt.dataset.RasterXSize, stepSize)
-        Y = range(0, self.vrt.dataset.RasterYSize, stepSize)
-        Xm, Ym = np.meshgrid(X, Y)
+        if window is None:
+            window = (0, 0, self.vrt.dataset.RasterXSize,
+                      self.vrt.dataset.RasterYSize)
+        xOff, yOff, xSize, ySize = window
+        X = np.arange(xOff, xOff + xSize, stepSize)
+        Y = np.arange(yOff, yOff + ySize, stepSize)
 
         if len(self.vrt.geolocationArray.d) > 0:
             # if the vrt dataset has geolocationArray
             # read lon,lat grids from geolocationArray
+            Xm, Ym = np.meshgrid(X, Y)
             lon, lat = self.vrt.geolocationArray.get_geolocation_grids()
             longitude, latitude = lon[Ym, Xm], lat[Ym, Xm]
-        else:
+        elif not fast:
             # generate lon,lat grids using GDAL Transformer
-            lonVec, latVec = self.transform_points(Xm.flatten(), Ym.flatten())
-            longitude = lonVec.reshape(Xm.shape)
-            latitude = latVec.reshape(Xm.shape)
+            longitude, latitude = self._transform_grid(X, Y)
+        elif len(self.vrt.dataset.GetGCPs()) > 0:
+            # interpolate lon,lat grids from a sparse grid
+            longitude, latitude = self._get_interpolated_grids(X, Y,
+                                                               maxError)
+        else:
+            # calculate lon,lat grids from GeoTransform
+            longitude, latitude = self._get_projected_grids(X, Y)
+
+        if dtype is not None:
+            longitude = longitude.astype(dtype)
+            latitude = latitude.astype(dtype)
+
+        return longitude, latitude
+
+    def _transform_grid(self, X, Y):
+        ''' Transform pixel/line of grid defined by X and Y vectors into
+        lon/lat grids using GDAL Transformer '''
+        Xm, Ym = np.meshgrid(X, Y)
+        lonVec, latVec = self.transform_points(Xm.flatten(), Ym.flatten())
+        return lonVec.reshape(Xm.shape), latVec.reshape(Xm.shape)
+
+    def _get_projected_grids(self, X, Y):
+        ''' Calculate lon/lat grids from GeoTransform and projection of
+        self.vrt.dataset for grid defined by X and Y vectors '''
+        gt = self.vrt.dataset.GetGeoTransform()
+        srs = NSR(self.vrt.dataset.GetProjection())
+        dstSRS = NSR()
+
+        if gt[2] == 0 and gt[4] == 0 and srs.IsGeographic() and (
+                srs.IsSameGeogCS(dstSRS)):
+            # lat/lon grid: longitude depends on column, latitude on row
+            return np.meshgrid(gt[0] + X * gt[1], gt[3] + Y * gt[5])
+
+        Xm, Ym = np.meshgrid(X, Y)
+        x = gt[0] + Xm * gt[1] + Ym * gt[2]
+        y = gt[3] + Xm * gt[4] + Ym * gt[5]
+        Xm = Ym = None
+        coorTrans = osr.CoordinateTransformation(srs, dstSRS)
+        lonlat = np.array(coorTrans.TransformPoints(
+                          np.column_stack([x.ravel(), y.ravel()]).tolist()))
+        lonlat = lonlat.reshape(-1, 3)
+
+        return (lonlat[:, 0].reshape(x.shape),
+                lonlat[:, 1].reshape(x.shape))
+
+    def _get_interpolated_grids(self, X, Y, maxError):
+        ''' Interpolate lon/lat grids for grid defined by X and Y vectors
+        from sparse grid of nodes transformed by GDAL Transformer
+
+        Distance between nodes is halved until error of bicubic
+        interpolation in the middle between nodes is below maxError or
+        nodes coincide with pixels of the grid
+
+        '''
+        from scipy.interpolate import RectBivariateSpline
+
+        # initial distance between nodes: 1/8 of the grid
+        step = max(X[-1] - X[0], Y[-1] - Y[0]) / 8.
+        while True:
+            xNodes = _get_nodes(X, step)
+            yNodes = _get_nodes(Y, step)
+            if (len(xNodes) >= len(X) or len(xNodes) < 4 or
+                    len(yNodes) >= len(Y) or len(yNodes) < 4):
+                # sparse grid is not sparse
+                return self._transform_grid(X, Y)
+
+            lonNodes, latNodes = self._transform_grid(xNodes, yNodes)
+            # avoid interpolation across the dateline
+            wrapLon = np.ptp(lonNodes) > 180
+            if wrapLon:
+                lonNodes = lonNodes % 360
+            lonSpline = RectBivariateSpline(yNodes, xNodes, lonNodes)
+            latSpline = RectBivariateSpline(yNodes, xNodes, latNodes)
+
+            # check error in the middle between nodes
+            xMid = (xNodes[:-1] + xNodes[1:]) / 2.
+            yMid = (yNodes[:-1] + yNodes[1:]) / 2.
+            lonMid, latMid = self._transform_grid(xMid, yMid)
+            lonError = (lonSpline(yMid, xMid) - lonMid + 180) % 360 - 180
+            latError = latSpline(yMid, xMid) - latMid
+            if max(np.nanmax(np.abs(lonError)),
+                   np.nanmax(np.abs(latError))) <= maxError:
+                break
+            step /= 2.
+
+        longitude = lonSpline(Y, X)
+        latitude = latSpline(Y, X)
+        if wrapLon:
+            longitude = (longitude + 180) % 360 - 180
 
         return longitude, latitude
 
@@ -986,6 +1095,11 @@ class Domain(object):
         meanLon = lonVec.mean()
         meanLat = latVec.mean()
 
+        # matplotlib and Basemap are imported only when maps are made
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.basemap import Basemap
+        from matplotlib.patches import Polygon
+
         # generate template map (can be also tmerc)
         plt.figure(num=1, figsize=figureSize, dpi=dpi)
         bmap = Basemap(projection=projection,
@@ -1043,3 +1157,12 @@ class Domain(object):
             Reprojects all GCPs to new SRS and updates GCPProjection
         '''
         self.vrt.reproject_GCPs(srsString)
+
+
+def _get_nodes(vector, step):
+    ''' Get evenly spaced nodes from first to last element of vector with
+    distance between nodes not larger than step '''
+    if step <= 0:
+        return np.array(vector, 'float64')
+    nNodes = int(np.ceil((vector[-1] - vector[0]) / float(step))) + 1
+    return np.linspace(vector[0], vector[-1], nNodes)
@@ -0,0 +1,370 @@
+# Name:    expression.py
+# Purpose: Compiler of band expressions
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import ast
+
+import numpy as np
+
+from nansat.tools import ExpressionError
+
+# numpy ufuncs which can be used in expressions as np.<name>
+UFUNCS = ['absolute', 'add', 'arccos', 'arccosh', 'arcsin', 'arcsinh',
+          'arctan', 'arctan2', 'arctanh', 'bitwise_and', 'bitwise_or',
+          'bitwise_xor', 'ceil', 'conjugate', 'cos', 'cosh', 'deg2rad',
+          'degrees', 'divide', 'equal', 'exp', 'exp2', 'expm1', 'fabs',
+          'floor', 'floor_divide', 'fmax', 'fmin', 'fmod', 'greater',
+          'greater_equal', 'hypot', 'invert', 'isfinite', 'isinf', 'isnan',
+          'left_shift', 'less', 'less_equal', 'log', 'log10', 'log1p',
+          'log2', 'logical_and', 'logical_not', 'logical_or', 'logical_xor',
+          'maximum', 'minimum', 'mod', 'multiply', 'negative', 'not_equal',
+          'power', 'rad2deg', 'radians', 'remainder', 'right_shift', 'rint',
+          'sign', 'sin', 'sinh', 'sqrt', 'square', 'subtract', 'tan', 'tanh',
+          'true_divide', 'trunc']
+# aliases of ufuncs
+UFUNC_ALIASES = {'abs': 'absolute', 'conj': 'conjugate'}
+# numpy constants which can be used in expressions as np.<name>
+CONSTANTS = ['e', 'inf', 'nan', 'pi']
+
+# ufuncs for operators
+BINARY_OPERATORS = {ast.Add: np.add,
+                    ast.Sub: np.subtract,
+                    ast.Mult: np.multiply,
+                    ast.Div: np.divide,
+                    ast.FloorDiv: np.floor_divide,
+                    ast.Mod: np.remainder,
+                    ast.Pow: np.power,
+                    ast.BitAnd: np.bitwise_and,
+                    ast.BitOr: np.bitwise_or,
+                    ast.BitXor: np.bitwise_xor,
+                    ast.LShift: np.left_shift,
+                    ast.RShift: np.right_shift}
+UNARY_OPERATORS = {ast.USub: np.negative,
+                   ast.Invert: np.invert,
+                   ast.Not: np.logical_not}
+COMPARE_OPERATORS = {ast.Gt: np.greater,
+                     ast.GtE: np.greater_equal,
+                     ast.Lt: np.less,
+                     ast.LtE: np.less_equal,
+                     ast.Eq: np.equal,
+                     ast.NotEq: np.not_equal}
+BOOL_OPERATORS = {ast.And: np.logical_and,
+                  ast.Or: np.logical_or}
+
+# ufuncs which keep floating point type of inputs and can therefore write
+# results into temporary arrays of their inputs
+INPLACE_UFUNCS = set([np.absolute, np.add, np.arccos, np.arccosh, np.arcsin,
+                      np.arcsinh, np.arctan, np.arctan2, np.arctanh, np.ceil,
+                      np.conjugate, np.cos, np.cosh, np.deg2rad, np.degrees,
+                      np.divide, np.exp, np.exp2, np.expm1, np.floor,
+                      np.fmax, np.fmin, np.fmod, np.hypot, np.log, np.log10,
+                      np.log1p, np.log2, np.maximum, np.minimum, np.multiply,
+                      np.negative, np.power, np.rad2deg, np.radians,
+                      np.remainder, np.rint, np.sign, np.sin, np.sinh,
+                      np.sqrt, np.square, np.subtract, np.tan, np.tanh,
+                      np.true_divide, np.trunc])
+
+# number of elements evaluated at once
+CHUNK_SIZE = 2 ** 16
+
+# compiled expressions
+_expressions = {}
+
+
+def compile_expression(source):
+    '''Compile expression or get it from cache of compiled expressions
+
+    Parameters
+    -----------
+    source : str
+        expression from metadata of a band. E.g.:
+        'np.power(10., self["chlor_a_log"])'
+
+    Returns
+    --------
+    expression : Expression
+
+    '''
+    if source not in _expressions:
+        _expressions[source] = Expression(source)
+    return _expressions[source]
+
+
+class Expression(object):
+    '''Compiled arithmetic expression on bands
+
+    The expression is parsed once into a tree of numpy ufuncs. Only
+    arithmetic, comparison and boolean operators, whitelisted numpy ufuncs
+    (np.<name>), numpy constants, numbers, bands (self["name"] or self[N])
+    and data of the band itself (bandData) are allowed. Any other code
+    raises ExpressionError.
+
+    The expression is evaluated in chunks of rows so that temporary
+    arrays stay small. Temporary arrays are reused for results of next
+    operations where possible.
+
+    '''
+    source = None
+    bands = None
+    usesBandData = False
+
+    def __init__(self, source):
+        '''Parse and check the expression
+
+        Parameters
+        -----------
+        source : str
+            expression from metadata of a band
+
+        Modifies
+        ---------
+        self.bands : list
+            names or numbers of bands used in the expression
+        self.usesBandData : bool
+            is data of the band itself used in the expression?
+
+        '''
+        self.source = source
+        self.bands = []
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError as e:
+            raise ExpressionError('Cannot parse expression %s: %s'
+                                  % (source, str(e)))
+        self.tree = self._compile(tree.body)
+
+    def __repr__(self):
+        return 'Expression(%s)' % repr(self.source)
+
+    def _compile(self, node):
+        '''Convert node of abstract syntax tree into expression tree
+
+        Expression tree consists of tuples:
+            ('const', value)
+            ('band', index of band in self.bands)
+            ('bandData', )
+            ('ufunc', ufunc, (arguments))
+        Operations on constants only are evaluated at once.
+
+        '''
+        value = _get_literal(node)
+        if value is not None:
+            return ('const', value)
+        if (hasattr(ast, 'Constant') and isinstance(node, ast.Constant) and
+                isinstance(node.value, bool)):
+            return ('const', node.value)
+
+        if isinstance(node, ast.Name):
+            if node.id == 'bandData':
+                self.usesBandData = True
+                return ('bandData', )
+            if node.id in ['True', 'False']:
+                return ('const', node.id == 'True')
+        elif isinstance(node, ast.Subscript):
+            if isinstance(node.value, ast.Name) and node.value.id == 'self':
+                index = node.slice
+                if isinstance(index, getattr(ast, 'Index', ())):
+                    index = index.value
+                band = _get_literal(index)
+                if band is not None:
+                    if band not in self.bands:
+                        self.bands.append(band)
+                    return ('band', self.bands.index(band))
+        elif isinstance(node, ast.Attribute):
+            if (isinstance(node.value, ast.Name) and
+                    node.value.id in ['np', 'numpy'] and
+                    node.attr in CONSTANTS):
+                return ('const', getattr(np, node.attr))
+        elif isinstance(node, ast.Call):
+            if node.keywords or getattr(node, 'starargs', None) or getattr(
+                                                    node, 'kwargs', None):
+                raise ExpressionError('Only positional arguments are allowed'
+                                      ' in %s' % self.source)
+            return self._compile_ufunc(self._get_ufunc(node.func), node.args)
+        elif isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            return self._compile_ufunc(BINARY_OPERATORS[type(node.op)],
+                                       [node.left, node.right])
+        elif isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.UAdd):
+                return self._compile(node.operand)
+            if type(node.op) in UNARY_OPERATORS:
+                return self._compile_ufunc(UNARY_OPERATORS[type(node.op)],
+                                           [node.operand])
+        elif isinstance(node, ast.Compare):
+            # a < b < c is converted into (a < b) & (b < c)
+            operands = [node.left] + node.comparators
+            tree = None
+            for i, op in enumerate(node.ops):
+                if type(op) not in COMPARE_OPERATORS:
+                    break
+                compared = self._compile_ufunc(COMPARE_OPERATORS[type(op)],
+                                               operands[i:i + 2])
+                if tree is None:
+                    tree = compared
+                else:
+                    tree = self._fold(np.logical_and, (tree, compared))
+            else:
+                return tree
+        elif isinstance(node, ast.BoolOp) and type(node.op) in BOOL_OPERATORS:
+            tree = self._compile(node.values[0])
+            for value in node.values[1:]:
+                tree = self._fold(BOOL_OPERATORS[type(node.op)],
+                                  (tree, self._compile(value)))
+            return tree
+
+        raise ExpressionError('%s is not allowed in expression %s'
+                              % (type(node).__name__, self.source))
+
+    def _get_ufunc(self, node):
+        '''Get whitelisted ufunc from node np.<name>'''
+        if (isinstance(node, ast.Attribute) and
+                isinstance(node.value, ast.Name) and
+                node.value.id in ['np', 'numpy']):
+            name = UFUNC_ALIASES.get(node.attr, node.attr)
+            if name in UFUNCS and isinstance(getattr(np, name, None),
+                                             np.ufunc):
+                return getattr(np, name)
+        raise ExpressionError('Only numpy ufuncs can be called in %s'
+                              % self.source)
+
+    def _compile_ufunc(self, ufunc, args):
+        '''Compile call of ufunc with arguments'''
+        if len(args) != ufunc.nin:
+            raise ExpressionError('%s requires %d arguments in %s'
+                                  % (ufunc.__name__, ufunc.nin, self.source))
+        return self._fold(ufunc, tuple(self._compile(arg) for arg in args))
+
+    def _fold(self, ufunc, args):
+        '''Create ufunc node or evaluate it if all arguments are constants'''
+        if all(arg[0] == 'const' for arg in args):
+            return ('const', ufunc(*[arg[1] for arg in args]))
+        return ('ufunc', ufunc, args)
+
+    def evaluate(self, bandsData, bandData=None, chunkSize=CHUNK_SIZE):
+        '''Evaluate expression on data
+
+        Parameters
+        -----------
+        bandsData : list of NumPy arrays
+            data of bands from self.bands (in the same order)
+        bandData : NumPy array
+            data of the band itself (if self.usesBandData)
+        chunkSize : int
+            approximate number of elements evaluated at once
+
+        Returns
+        --------
+        result : NumPy array
+
+        '''
+        inputs = list(bandsData) + [bandData]
+        arrays = [a for a in inputs if isinstance(a, np.ndarray)]
+        if len(arrays) == 0:
+            return np.asarray(self._evaluate(self.tree, inputs)[0])
+
+        shape = np.broadcast(*arrays).shape
+        if len(shape) == 0 or np.prod(shape) <= chunkSize:
+            return np.asarray(self._evaluate(self.tree, inputs)[0])
+
+        # evaluate in chunks of rows and write into the output array
+        rowSize = max(int(np.prod(shape[1:])), 1)
+        chunkRows = max(chunkSize // rowSize, 1)
+        result = None
+        for row in range(0, shape[0], chunkRows):
+            chunk = slice(row, row + chunkRows)
+            chunkInputs = [self._get_chunk(a, chunk, shape) for a in inputs]
+            if result is None:
+                chunkResult = np.asarray(self._evaluate(self.tree,
+                                                        chunkInputs)[0])
+                result = np.empty(shape, chunkResult.dtype)
+                result[chunk] = chunkResult
+            else:
+                self._evaluate(self.tree, chunkInputs, result[chunk])
+
+        return result
+
+    def _get_chunk(self, array, chunk, shape):
+        '''Get chunk of rows from array which is broadcastable to shape'''
+        if (isinstance(array, np.ndarray) and array.ndim == len(shape) and
+                array.shape[0] == shape[0]):
+            return array[chunk]
+        return array
+
+    def _evaluate(self, node, inputs, out=None):
+        '''Evaluate node of expression tree
+
+        Parameters
+        -----------
+        node : tuple
+            node of expression tree
+        inputs : list
+            data of bands and data of the band itself
+        out : NumPy array
+            array to write the result into
+
+        Returns
+        --------
+        result : NumPy array or scalar
+        isTemporary : bool
+            is result a temporary array which can be overwritten?
+
+        '''
+        if node[0] == 'ufunc':
+            args = [self._evaluate(arg, inputs) for arg in node[2]]
+            values = [arg[0] for arg in args]
+            temporary = out
+            if temporary is None and node[1] in INPLACE_UFUNCS:
+                temporary = self._get_temporary(args)
+            if temporary is not None:
+                try:
+                    return node[1](*values, out=temporary), True
+                except TypeError:
+                    # type of result differs from type of the array
+                    pass
+            result, isTemporary = node[1](*values), True
+        elif node[0] == 'band':
+            result, isTemporary = inputs[node[1]], False
+        elif node[0] == 'bandData':
+            result, isTemporary = inputs[-1], False
+        else:
+            result, isTemporary = node[1], False
+
+        if out is not None:
+            out[...] = result
+            return out, True
+        return result, isTemporary
+
+    def _get_temporary(self, args):
+        '''Find temporary float array among arguments to store result in'''
+        values = [arg[0] for arg in args]
+        for value, isTemporary in args:
+            if (isTemporary and isinstance(value, np.ndarray) and
+                    value.dtype.kind in 'fc' and
+                    value.shape == np.broadcast(*values).shape and
+                    np.result_type(*values) == value.dtype):
+                return value
+        return None
+
+
+def _get_literal(node):
+    '''Get number or string from node of abstract syntax tree or None'''
+    if hasattr(ast, 'Constant') and isinstance(node, ast.Constant):
+        if isinstance(node.value, bool):
+            return None
+        return node.value
+    if isinstance(node, getattr(ast, 'Num', ())):
+        return node.n
+    if isinstance(node, getattr(ast, 'Str', ())):
+        return node.s
+    return None
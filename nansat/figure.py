@@ -29,7 +29,9 @@ try:
 except:
     from PIL import Image, ImageDraw, ImageFont
 
-from nansat.tools import add_logger
+from nansat.tools import add_logger, register_colormaps
+
+register_colormaps()
 
 
 class Figure():
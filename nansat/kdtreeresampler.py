@@ -0,0 +1,203 @@
+# Name:    kdtreeresampler.py
+# Purpose: Resampling of swath data onto grids using KD-tree
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+
+import numpy as np
+
+from nansat.tools import OptionError
+
+# mean radius of the Earth, m
+EARTH_RADIUS = 6371000.
+# kernels of KDTreeResampler
+KERNELS = ['nearest', 'idw', 'gaussian']
+
+
+class KDTreeResampler(object):
+    '''Resampling of swath data onto a grid using neighbours from KD-tree
+
+    Source pixels (e.g. of a swath with geolocation arrays) are put into a
+    KD-tree (scipy.spatial.cKDTree) using their cartesian coordinates on
+    the Earth sphere. Neighbours of each destination pixel within the
+    radius of influence are found once and stored with their weights,
+    then any number of bands is resampled by numpy indexing.
+
+    Kernels:
+        'nearest' : value of the nearest source pixel
+        'idw' : inverse distance weighting of neighbours (weight = 1 / d^2)
+        'gaussian' : gaussian weighting of neighbours
+                     (weight = exp(-d^2 / (2 * sigma^2)))
+
+    Source pixels with NaN are excluded from weighting. Destination pixels
+    without neighbours are filled with NaN (float data) or 0.
+
+    Examples
+    --------
+    resampler = KDTreeResampler(srcLon, srcLat, dstLon, dstLat, 'gaussian',
+                                radius=5000)
+    chlor = resampler.apply(n['chlor_a'])
+    # or
+    n.reproject(dstDomain, method='kdtree', kernel='gaussian', radius=5000)
+
+    '''
+    def __init__(self, srcLon, srcLat, dstLon, dstLat, kernel='nearest',
+                 radius=None, neighbours=8, sigma=None):
+        '''Find neighbours of destination pixels among source pixels
+
+        Parameters
+        -----------
+        srcLon, srcLat : NumPy arrays
+            longitude and latitude of source pixels
+        dstLon, dstLat : NumPy arrays
+            longitude and latitude of destination pixels
+        kernel : str
+            'nearest', 'idw' or 'gaussian'
+        radius : float
+            radius of influence (m). Default is twice the typical distance
+            between source pixels
+        neighbours : int
+            maximum number of neighbours for 'idw' and 'gaussian'
+        sigma : float
+            standard deviation (m) of 'gaussian' kernel. Default is
+            radius / 2
+
+        '''
+        from scipy.spatial import cKDTree
+
+        if kernel not in KERNELS:
+            raise OptionError('Unknown kernel %s! Use one of %s'
+                              % (kernel, KERNELS))
+        self.kernel = kernel
+        self.srcShape = np.shape(srcLon)
+        self.dstShape = np.shape(dstLon)
+
+        # KD-tree of valid source pixels
+        srcXYZ = _lonlat2xyz(srcLon, srcLat)
+        srcValid = np.nonzero(np.isfinite(srcXYZ).all(axis=1))[0]
+        tree = cKDTree(srcXYZ[srcValid])
+        srcXYZ = None
+        if radius is None:
+            radius = 2 * _get_typical_distance(tree)
+        if sigma is None:
+            sigma = radius / 2.
+        self.radius = float(radius)
+
+        # find neighbours of valid destination pixels
+        dstXYZ = _lonlat2xyz(dstLon, dstLat)
+        dstValid = np.isfinite(dstXYZ).all(axis=1)
+        if kernel == 'nearest':
+            neighbours = 1
+        distances, indices = tree.query(dstXYZ[dstValid], k=neighbours,
+                                        distance_upper_bound=radius)
+        distances = distances.reshape(-1, neighbours)
+        indices = indices.reshape(-1, neighbours)
+
+        # keep only destination pixels with neighbours
+        found = indices < tree.n
+        withNeighbours = found.any(axis=1)
+        self.dstIndex = np.nonzero(dstValid)[0][withNeighbours].astype(
+                                                                    'int32')
+        distances = distances[withNeighbours]
+        found = found[withNeighbours]
+        indices = indices[withNeighbours]
+        indices[~found] = 0
+        self.srcIndex = srcValid[indices].astype('int32')
+
+        # weights of neighbours (0 for missing neighbours)
+        distances[~found] = 0
+        if kernel == 'nearest':
+            weights = np.ones(distances.shape)
+        elif kernel == 'idw':
+            weights = 1. / np.maximum(distances, radius * 1e-6) ** 2
+        else:
+            weights = np.exp(-distances ** 2 / (2 * sigma ** 2))
+        weights[~found] = 0
+        self.weights = weights.astype('float32')
+
+    def __repr__(self):
+        return ('KDTreeResampler: %s, %s -> %s, radius %.0f m, '
+                '%d valid pixels' % (self.kernel, self.srcShape,
+                                     self.dstShape, self.radius,
+                                     self.dstIndex.size))
+
+    def apply(self, array, fillValue=None):
+        '''Resample array(s) from source to destination
+
+        Parameters
+        -----------
+        array : NumPy array
+            2D array with source shape or 3D array (bands, rows, columns)
+        fillValue : number
+            value of destination pixels without neighbours. Default is
+            np.nan for float output and 0 otherwise
+
+        Returns
+        --------
+        dstArray : NumPy array
+            2D or 3D array with destination shape. 'nearest' keeps data
+            type, 'idw' and 'gaussian' return float arrays
+
+        '''
+        array = np.asarray(array)
+        if array.shape[-2:] != tuple(self.srcShape):
+            raise OptionError('Shape of array %s does not match source %s'
+                              % (array.shape, self.srcShape))
+        srcData = array.reshape(-1, np.prod(self.srcShape))
+
+        if self.kernel == 'nearest':
+            dstData = srcData[:, self.srcIndex[:, 0]]
+        else:
+            dtype = np.result_type(srcData.dtype, np.float32)
+            values = srcData[:, self.srcIndex].astype(dtype)
+            weights = self.weights[None] * np.isfinite(values)
+            values[weights == 0] = 0
+            weightsSum = weights.sum(axis=2)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                dstData = (values * weights).sum(axis=2) / weightsSum
+
+        if fillValue is None:
+            if dstData.dtype.char in np.typecodes['AllFloat']:
+                fillValue = np.nan
+            else:
+                fillValue = 0
+        dstArray = np.empty((srcData.shape[0], np.prod(self.dstShape)),
+                            dstData.dtype)
+        dstArray.fill(fillValue)
+        dstArray[:, self.dstIndex] = dstData
+
+        return dstArray.reshape(array.shape[:-2] + tuple(self.dstShape))
+
+
+def _lonlat2xyz(lon, lat):
+    ''' Convert longitude, latitude (degrees) to cartesian coordinates (m)
+
+    Returns
+    --------
+    xyz : NumPy array
+        (number of points, 3)
+
+    '''
+    lon = np.radians(np.asarray(lon, 'float64').ravel())
+    lat = np.radians(np.asarray(lat, 'float64').ravel())
+    return EARTH_RADIUS * np.column_stack([np.cos(lat) * np.cos(lon),
+                                           np.cos(lat) * np.sin(lon),
+                                           np.sin(lat)])
+
+
+def _get_typical_distance(tree, sampleSize=1000):
+    ''' Get median distance to the nearest neighbour in a sample of points
+    of the KD-tree '''
+    step = max(1, tree.n // sampleSize)
+    distances = tree.query(tree.data[::step], k=2)[0][:, 1]
+    return float(np.median(distances[distances > 0]))
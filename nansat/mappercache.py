@@ -0,0 +1,423 @@
+# Name:    mappercache.py
+# Purpose: Cache of VRTs created by mappers on disk
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import os
+import re
+import json
+import pickle
+import shutil
+import hashlib
+import tempfile
+import threading
+
+import numpy as np
+
+from nansat.vrt import VRT, GeolocationArray, _get_vrt_tree
+from nansat.tools import add_logger, gdal
+
+# names of VRT files in memory (e.g. /vsimem/ABCDEFGHIJ.vrt)
+VSIMEM_PATTERN = re.compile(r'/vsimem/[^<>"\s,]+')
+# name of MEM dataset pointing to memory of an array (see VRT.array)
+MEM_PATTERN = re.compile(r'MEM:::[^<]*')
+# attributes of VRT which are stored (or re-created) by the cache
+VRT_ATTRIBUTES = set(['logger', 'fileName', 'vrtDriver', 'dataset', 'vrt',
+                      'bandVRTs', 'geolocationArray', 'tps', 'array',
+                      '_bandIndex', '_threadDatasets', '_editNode'])
+
+
+class MapperCache(object):
+    '''Cache of VRTs created by mappers in a directory on disk
+
+    A mapper creates a tree of VRTs: the top VRT (Mapper object), sub-VRT
+    (self.vrt), band VRTs (self.bandVRTs) and VRTs with geolocation arrays.
+    The cache stores XML of all VRTs in the tree, arrays of VRTs pointing
+    to memory of arrays (as .npy files) and binary files of VRTs created
+    from copies of arrays. When the same file is opened again (with
+    the same mapper and arguments) the tree is restored without running the
+    mapper. Keys of the cache are (path, size and modification time of the
+    input file, mapper name, mapper arguments), therefore modified files are
+    processed again.
+
+    Nansat uses one cache per process (nansat.mappercache.mapperCache). It
+    is disabled by default and can be enabled by setting a directory or
+    the environment variable NANSAT_MAPPER_CACHE:
+
+    from nansat.mappercache import mapperCache
+    mapperCache.set_directory('/path/to/cache')
+    n = Nansat(fileName)
+    # mapper is run, VRTs are stored
+    n = Nansat(fileName)
+    # VRTs are restored from the cache
+
+    Attributes of VRT (vrt, bandVRTs, geolocationArray, tps, array) are
+    restored from the tree. Other attributes of the mapper (e.g. information
+    about the product used by methods of Envisat mappers) are pickled.
+    Mappers with attributes which cannot be pickled are not cached.
+
+    '''
+    # version of the cache format (part of the keys)
+    VERSION = 3
+    hits = 0
+    misses = 0
+
+    def __init__(self, directory=None):
+        '''Create cache
+
+        Parameters
+        -----------
+        directory : str or None
+            directory for storing VRTs. Caching is disabled if None
+
+        '''
+        self.directory = directory
+        self.logger = add_logger('Nansat')
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return ('MapperCache: %s, %d hits, %d misses'
+                % (self.directory, self.hits, self.misses))
+
+    def set_directory(self, directory):
+        '''Set directory of the cache
+
+        Parameters
+        -----------
+        directory : str or None
+            directory for storing VRTs. Caching is disabled if None
+
+        '''
+        self.directory = directory
+
+    def get_key(self, fileName, mapperName='', kwargs=None):
+        '''Get key of the cache for the input file
+
+        Parameters
+        -----------
+        fileName : str
+            name of the input file (or directory)
+        mapperName : str
+            name of the requested mapper ('' if selected automatically)
+        kwargs : dict
+            arguments for the mapper
+
+        Returns
+        --------
+        key : str or None
+            hash of the file path, size, modification time (of all files
+            if fileName is a directory, e.g. SAFE), mapper name and
+            arguments or None if the cache is disabled or file does not
+            exist (e.g. URL)
+
+        '''
+        if self.directory is None or not os.path.exists(fileName):
+            return None
+        keyString = repr((self.VERSION,
+                          os.path.realpath(fileName),
+                          _get_file_stats(fileName),
+                          mapperName,
+                          sorted((kwargs or {}).items())))
+        return hashlib.sha1(keyString.encode('utf-8')).hexdigest()
+
+    def get(self, key, get_mapper_class=None):
+        '''Restore VRTs created by a mapper
+
+        Parameters
+        -----------
+        key : str or None
+            key from get_key
+        get_mapper_class : function
+            returns class Mapper from the name of the mapper (or None).
+            The top VRT is restored as the instance of this class
+
+        Returns
+        --------
+        mapperName : str
+            name of the mapper that created the VRTs
+        vrt : VRT
+            the top VRT (or None if not in cache)
+
+        '''
+        if key is None:
+            return None
+        entryDir = os.path.join(self.directory, key)
+        if not os.path.exists(entryDir):
+            self.misses += 1
+            return None
+
+        try:
+            with open(os.path.join(entryDir, 'vrts.json')) as f:
+                entry = json.load(f)
+            mapperName = str(entry['mapper'])
+            mapperClass = None
+            if get_mapper_class is not None:
+                mapperClass = get_mapper_class(mapperName)
+            vrt = self._restore(entryDir, entry['vrts'], mapperClass or VRT)
+        except Exception as e:
+            self.logger.warning('Cannot restore VRTs from %s: %s'
+                                % (entryDir, e))
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.logger.debug('VRTs of %s restored from %s'
+                          % (mapperName, entryDir))
+        return mapperName, vrt
+
+    def put(self, key, mapperName, vrt):
+        '''Store VRTs created by a mapper
+
+        Nothing is stored if the mapper has attributes which cannot be
+        pickled (other than VRT_ATTRIBUTES), or if the VRTs reference files in
+        memory which are not part of the tree of VRTs, memory of arrays
+        not owned by the VRTs or temporary binary files on disk.
+
+        Parameters
+        -----------
+        key : str or None
+            key from get_key
+        mapperName : str
+            name of the mapper that created the VRTs
+        vrt : VRT
+            the top VRT created by the mapper
+
+        '''
+        if key is None:
+            return
+        entryDir = os.path.join(self.directory, key)
+        if os.path.exists(entryDir):
+            return
+
+        attributes = dict((name, value)
+                          for name, value in vrt.__dict__.items()
+                          if name not in VRT_ATTRIBUTES)
+        try:
+            attributesData = pickle.dumps(attributes, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            self.logger.debug('%s has attributes %s which cannot be pickled, '
+                              'not cached' % (mapperName, sorted(attributes)))
+            return
+
+        vrts = _get_vrt_tree(vrt)
+        fileNames = set(iVRT.fileName for iVRT in vrts)
+        vrtDicts = []
+        arrays = []
+        rawFiles = []
+        for iVRT in vrts:
+            xml = iVRT.read_xml()
+            rawFileName = iVRT.fileName.replace('.vrt', '.raw')
+            memFileNames = set(VSIMEM_PATTERN.findall(xml))
+            memFileNames.discard(rawFileName)
+            if not memFileNames.issubset(fileNames):
+                self.logger.debug('%s references unknown VRTs, not cached'
+                                  % mapperName)
+                return
+            arrayFile = None
+            rawFile = None
+            memNames = MEM_PATTERN.findall(xml)
+            if memNames:
+                # VRT should point only to memory of its own array
+                if (iVRT.array is None or
+                        any('DATAPOINTER=%d,' % iVRT.array.ctypes.data
+                            not in memName for memName in memNames)):
+                    self.logger.debug('%s references unknown arrays, '
+                                      'not cached' % mapperName)
+                    return
+                arrayFile = 'array_%d.npy' % len(arrays)
+                arrays.append((arrayFile, np.asarray(iVRT.array)))
+            elif iVRT.array is not None:
+                self.logger.debug('%s uses binary files, not cached'
+                                  % mapperName)
+                return
+            if rawFileName in xml:
+                # copy of array in binary file in memory
+                rawFile = 'raw_%d.raw' % len(rawFiles)
+                rawFiles.append((rawFile, _read_vsi_file(rawFileName)))
+            geolocation = iVRT.geolocationArray
+            vrtDicts.append({
+                'fileName': iVRT.fileName,
+                'xml': xml,
+                'array': arrayFile,
+                'raw': rawFile,
+                'vrt': _get_file_name(iVRT.vrt),
+                'bandVRTs': dict((bandKey, _get_file_name(bandVRT))
+                                 for bandKey, bandVRT
+                                 in (iVRT.bandVRTs or {}).items()),
+                'attributes': iVRT is vrt,
+                'geolocation': {'d': geolocation.d,
+                                'xVRT': _get_file_name(geolocation.xVRT),
+                                'yVRT': _get_file_name(geolocation.yVRT)},
+                'tps': bool(iVRT.tps)})
+
+        # write into temporary directory and rename (other processes may
+        # read or write the same entry)
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        tmpDir = tempfile.mkdtemp(dir=self.directory, prefix='.tmp')
+        try:
+            for arrayFile, array in arrays:
+                np.save(os.path.join(tmpDir, arrayFile), array)
+            for rawFile, rawData in rawFiles:
+                with open(os.path.join(tmpDir, rawFile), 'wb') as f:
+                    f.write(rawData)
+            with open(os.path.join(tmpDir, 'attributes.pickle'), 'wb') as f:
+                f.write(attributesData)
+            with open(os.path.join(tmpDir, 'vrts.json'), 'w') as f:
+                json.dump({'mapper': mapperName, 'vrts': vrtDicts}, f)
+            os.rename(tmpDir, entryDir)
+        except OSError:
+            # entry was written by another process
+            shutil.rmtree(tmpDir, ignore_errors=True)
+        else:
+            self.logger.debug('VRTs of %s stored in %s'
+                              % (mapperName, entryDir))
+
+    def clear(self):
+        '''Remove all stored VRTs and reset counters'''
+        with self.lock:
+            if self.directory is not None and os.path.exists(self.directory):
+                for entry in os.listdir(self.directory):
+                    shutil.rmtree(os.path.join(self.directory, entry),
+                                  ignore_errors=True)
+            self.hits = 0
+            self.misses = 0
+
+    def _restore(self, entryDir, vrtDicts, mapperClass):
+        '''Create VRTs from stored XML and arrays
+
+        Parameters
+        -----------
+        entryDir : str
+            directory with stored arrays
+        vrtDicts : list
+            dicts with XML and references of VRTs (the top VRT is the last)
+        mapperClass : class
+            class of the top VRT
+
+        Returns
+        --------
+        vrt : VRT
+            the top VRT
+
+        '''
+        vrts = {}
+        newNames = {}
+        for vrtDict in vrtDicts:
+            if vrtDict is vrtDicts[-1]:
+                vrtClass = mapperClass
+            else:
+                vrtClass = VRT
+            # create empty VRT without running constructor of the mapper
+            vrt = vrtClass.__new__(vrtClass)
+            VRT.__init__(vrt, srcRasterXSize=1, srcRasterYSize=1)
+            newNames[vrtDict['fileName']] = vrt.fileName
+            if vrtDict['raw'] is not None:
+                # copy binary file into memory (deleted with the VRT)
+                rawFileName = vrt.fileName.replace('.vrt', '.raw')
+                with open(os.path.join(entryDir, vrtDict['raw']), 'rb') as f:
+                    _write_vsi_file(rawFileName, f.read())
+                newNames[vrtDict['fileName'].replace('.vrt', '.raw')] = (
+                                                                rawFileName)
+
+            xml = VSIMEM_PATTERN.sub(lambda m: newNames.get(m.group(0),
+                                                            m.group(0)),
+                                     vrtDict['xml'])
+            if vrtDict['array'] is not None:
+                # point XML to the memory of the loaded array
+                vrt.create_dataset_from_array(
+                    np.load(os.path.join(entryDir, vrtDict['array'])),
+                    copy=False)
+                memFileName = MEM_PATTERN.search(vrt.read_xml()).group(0)
+                xml = MEM_PATTERN.sub(lambda m: memFileName, xml)
+            vrt.write_xml(str(xml))
+
+            vrt.vrt = vrts.get(vrtDict['vrt'])
+            vrt.bandVRTs = dict((str(bandKey), _get_vrt(vrts, bandFileName))
+                                for bandKey, bandFileName
+                                in vrtDict['bandVRTs'].items())
+            geolocation = vrtDict['geolocation']
+            vrt.geolocationArray = GeolocationArray()
+            vrt.geolocationArray.d = dict(
+                (str(gKey), str(newNames.get(gValue, gValue)))
+                for gKey, gValue in geolocation['d'].items())
+            vrt.geolocationArray.xVRT = vrts.get(geolocation['xVRT'])
+            vrt.geolocationArray.yVRT = vrts.get(geolocation['yVRT'])
+            vrt.tps = vrtDict['tps']
+            if vrtDict['attributes']:
+                # attributes of the mapper other than VRT_ATTRIBUTES
+                with open(os.path.join(entryDir, 'attributes.pickle'),
+                          'rb') as f:
+                    vrt.__dict__.update(pickle.load(f))
+            vrts[vrtDict['fileName']] = vrt
+
+        return vrt
+
+
+def _get_file_name(vrt):
+    ''' Get name of VRT file (or list of names) or None '''
+    if vrt is None:
+        return None
+    if isinstance(vrt, list):
+        return [iVRT.fileName for iVRT in vrt]
+    return vrt.fileName
+
+
+def _get_vrt(vrts, fileName):
+    ''' Get restored VRT (or list of VRTs) by name of the stored VRT file '''
+    if isinstance(fileName, list):
+        return [vrts.get(iFileName) for iFileName in fileName]
+    return vrts.get(fileName)
+
+
+def _get_file_stats(fileName):
+    ''' Get size and modification time of the file or of all files in it
+
+    fileName is a file or a directory (e.g. SAFE or RS2 product)
+
+    '''
+    if not os.path.isdir(fileName):
+        fileStat = os.stat(fileName)
+        return fileStat.st_size, fileStat.st_mtime
+
+    fileStats = []
+    for dirName, dirNames, fileNames in os.walk(fileName):
+        dirNames.sort()
+        for iFileName in sorted(fileNames):
+            iFileName = os.path.join(dirName, iFileName)
+            fileStat = os.stat(iFileName)
+            fileStats.append((os.path.relpath(iFileName, fileName),
+                              fileStat.st_size, fileStat.st_mtime))
+    return fileStats
+
+
+def _read_vsi_file(fileName):
+    ''' Read contents of a (VSI) file with GDAL '''
+    vsiFile = gdal.VSIFOpenL(fileName, 'rb')
+    gdal.VSIFSeekL(vsiFile, 0, 2)
+    fileSize = gdal.VSIFTellL(vsiFile)
+    gdal.VSIFSeekL(vsiFile, 0, 0)
+    data = gdal.VSIFReadL(fileSize, 1, vsiFile)
+    gdal.VSIFCloseL(vsiFile)
+    return data
+
+
+def _write_vsi_file(fileName, data):
+    ''' Write contents into a (VSI) file with GDAL '''
+    vsiFile = gdal.VSIFOpenL(fileName, 'wb')
+    gdal.VSIFWriteL(data, len(data), 1, vsiFile)
+    gdal.VSIFCloseL(vsiFile)
+
+
+# cache of VRTs created by mappers shared by all Nansat objects in the process
+mapperCache = MapperCache(os.environ.get('NANSAT_MAPPER_CACHE'))
@@ -0,0 +1,271 @@
+# Name:    mappermanifest.py
+# Purpose: Manifest of mappers for selection of mappers without import
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+'''Manifest of mappers: names, modules and signatures of all mappers
+
+Mapper modules (and their dependencies, e.g. netCDF4, scipy.io) are heavy to
+import. The manifest lists the mappers in a package together with the
+signatures of the Mapper classes (see nansat.nansat._match_signature) read
+from the source code without import. Nansat uses it for selection of
+mappers and imports only the mappers it actually tries.
+
+The manifest of nansat.mappers (nansat/mappers/manifest.json) should be
+regenerated after adding a mapper or changing a signature:
+
+python -m nansat.mappermanifest
+
+If the manifest is missing or does not match the modules in the package
+(e.g. in user-defined nansat_mappers) the source code is scanned at runtime.
+
+'''
+from __future__ import absolute_import
+import os
+import sys
+import ast
+import json
+import pkgutil
+import threading
+from collections import OrderedDict
+
+# name of the manifest file in a package with mappers
+MANIFEST_NAME = 'manifest.json'
+
+
+def _get_signature(classNode):
+    ''' Get value of signature from definition of Mapper class (or None)'''
+    for statement in classNode.body:
+        if (isinstance(statement, ast.Assign) and
+                any(isinstance(target, ast.Name) and target.id == 'signature'
+                    for target in statement.targets)):
+            try:
+                return ast.literal_eval(statement.value)
+            except ValueError:
+                # signature is not a literal, test all files
+                return None
+    return None
+
+
+def _scan_module(fileName):
+    ''' Read module source and get signature of Mapper
+
+    Parameters
+    -----------
+    fileName : str
+        name of the Python file with mapper module
+
+    Returns
+    --------
+    isMapper : bool
+        True if the module defines Mapper (or source cannot be parsed)
+    signature : dict or list or None
+        signature of the Mapper class
+
+    '''
+    try:
+        with open(fileName, 'rb') as f:
+            tree = ast.parse(f.read(), fileName)
+    except (IOError, SyntaxError):
+        # the module may still define Mapper, it will be tested on import
+        return True, None
+
+    for statement in tree.body:
+        if isinstance(statement, ast.ClassDef) and statement.name == 'Mapper':
+            return True, _get_signature(statement)
+        if (isinstance(statement, ast.Assign) and
+                any(isinstance(target, ast.Name) and target.id == 'Mapper'
+                    for target in statement.targets)):
+            return True, None
+        if (isinstance(statement, ast.ImportFrom) and
+                any((alias.asname or alias.name) == 'Mapper'
+                    for alias in statement.names)):
+            return True, None
+
+    return False, None
+
+
+def scan_mappers(path):
+    ''' Create manifest from source code of modules in a directory
+
+    Parameters
+    -----------
+    path : str
+        directory with mapper modules
+
+    Returns
+    --------
+    manifest : dict
+        modules : list of names of all modules in the directory
+        mappers : list of dicts with name, module (file name) and signature
+            (Python literal as a string) of each mapper
+
+    '''
+    manifest = {'modules': [], 'mappers': []}
+    for finder, name, ispkg in pkgutil.iter_modules([path]):
+        manifest['modules'].append(name)
+        moduleName = name + '.py'
+        isMapper, signature = _scan_module(os.path.join(path, moduleName))
+        if isMapper:
+            manifest['mappers'].append({'name': name,
+                                        'module': moduleName,
+                                        'signature': repr(signature)})
+
+    return manifest
+
+
+def read_manifest(path):
+    ''' Read manifest from a directory with mappers
+
+    Parameters
+    -----------
+    path : str
+        directory with mapper modules and manifest.json
+
+    Returns
+    --------
+    manifest : dict or None
+        manifest (see scan_mappers) or None if the manifest is missing or
+        does not list exactly the modules present in the directory
+
+    '''
+    manifestFile = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifestFile):
+        return None
+
+    with open(manifestFile) as f:
+        manifest = json.load(f)
+
+    modules = [name for finder, name, ispkg in pkgutil.iter_modules([path])]
+    if sorted(modules) != sorted(manifest['modules']):
+        return None
+
+    return manifest
+
+
+def write_manifest(path=None):
+    ''' Scan mapper modules and write manifest.json into the directory
+
+    Parameters
+    -----------
+    path : str
+        directory with mapper modules. Default is nansat/mappers
+
+    Returns
+    --------
+    manifestFile : str
+        name of the written file
+
+    '''
+    if path is None:
+        path = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                            'mappers')
+    manifest = scan_mappers(path)
+    manifestFile = os.path.join(path, MANIFEST_NAME)
+    with open(manifestFile, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True,
+                  separators=(',', ': '))
+        f.write('\n')
+
+    return manifestFile
+
+
+class MapperEntry(object):
+    '''Mapper from manifest which is imported only at first use
+
+    Has the signature of the Mapper class. The method load() imports the
+    module and returns the Mapper class or information about ImportError
+    (as returned by sys.exc_info()).
+
+    '''
+    def __init__(self, name, signature, finder):
+        ''' Create entry for a mapper
+
+        Parameters
+        -----------
+        name : str
+            name of the mapper module (e.g. mapper_generic)
+        signature : dict or list or None
+            signature of the Mapper class
+        finder : object
+            finder of the module from pkgutil.iter_modules
+
+        '''
+        self.name = name
+        self.signature = signature
+        self.finder = finder
+        self._mapper = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<MapperEntry %s>' % self.name
+
+    def load(self):
+        ''' Import the mapper module (only once)
+
+        Returns
+        --------
+        mapper : class Mapper(VRT) or tuple or None
+            Mapper class, or sys.exc_info() of ImportError, or None if
+            the module has no Mapper
+
+        '''
+        with self._lock:
+            if self._mapper is None:
+                try:
+                    module = self.finder.find_module(self.name).load_module(
+                                                                    self.name)
+                except ImportError:
+                    # keep ImportError instance instead of the mapper
+                    self._mapper = sys.exc_info()
+                else:
+                    self._mapper = getattr(module, 'Mapper', False)
+
+        return self._mapper or None
+
+
+def get_mapper_entries(path):
+    ''' Get entries for all mappers in a directory without import
+
+    Parameters
+    -----------
+    path : str
+        directory with mapper modules
+
+    Returns
+    --------
+    mapperEntries : OrderedDict
+        key  : mapper name
+        value: MapperEntry
+
+    '''
+    manifest = read_manifest(path)
+    if manifest is None:
+        manifest = scan_mappers(path)
+
+    finders = dict((name, finder) for finder, name, ispkg
+                   in pkgutil.iter_modules([path]))
+    mapperEntries = OrderedDict()
+    for mapperDict in manifest['mappers']:
+        name = str(mapperDict['name'])
+        mapperEntries[name] = MapperEntry(name,
+                                          ast.literal_eval(
+                                                mapperDict['signature']),
+                                          finders[name])
+
+    return mapperEntries
+
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or [None]
+    for path in paths:
+        print('Manifest written to %s' % write_manifest(path))
@@ -25,6 +25,8 @@ class Mapper(VRT, Envisat):
             http://envisat.esa.int/handbooks/asar/CNTR6-6-9.htm#eph.asar.asardf.asarrec.ASAR_Geo_Grid_ADSR
     '''
 
+    signature = {'metadata': ['MPH_PRODUCT']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
 
         '''
@@ -16,6 +16,8 @@ from nansat.nsr import NSR
 class Mapper(VRT):
     ''' Mapper for ASTER L1A VNIR data'''
 
+    signature = {'path': 'AST_L1A_', 'metadata': ['INSTRUMENTSHORTNAME']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  GCP_COUNT=10,
                  bandNames=['VNIR_Band1', 'VNIR_Band2', 'VNIR_Band3N'],
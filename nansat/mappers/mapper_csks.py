@@ -17,6 +17,8 @@ from nansat.vrt import VRT, GeolocationArray
 class Mapper(VRT):
     ''' VRT with mapping of WKV for Cosmo-Skymed '''
 
+    signature = {'name': '^CSKS'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create CSKS VRT '''
 
@@ -20,6 +20,8 @@ from globcolour import Globcolour
 class Mapper(VRT, Globcolour):
     ''' Create VRT with mapping of WKV for MERIS Level 2 (FR or RR)'''
 
+    signature = {'name': '^L3b_', 'ext': ['.nc']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, latlonGrid=None,
                  mask='', **kwargs):
 
@@ -19,6 +19,8 @@ from nansat.tools import gdal, ogr, WrongMapperError
 class Mapper(VRT, Globcolour):
     ''' Mapper for GLOBCOLOR L3M products'''
 
+    signature = {'metadata': ['NC_GLOBAL#title']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' GLOBCOLOR L3M VRT '''
 
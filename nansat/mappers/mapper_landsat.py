@@ -16,6 +16,9 @@ from nansat.node import Node
 class Mapper(VRT):
     ''' Mapper for LANDSAT3,4,5,6,7,8.tar.gz files'''
 
+    # tar, tar.gz or tar.bz2 files
+    signature = {'magic': [b'\x1f\x8b', b'BZh', (257, b'ustar')]}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create LANDSAT VRT '''
         # try to open .tar or .tar.gz or .tgz file with tar
@@ -15,6 +15,8 @@ from envisat import Envisat
 class Mapper(VRT, Envisat):
     ''' VRT with mapping of WKV for MERIS Level 1 (FR or RR) '''
 
+    signature = {'metadata': ['MPH_PRODUCT']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  geolocation=False, zoomSize=500, step=1, **kwargs):
 
@@ -14,6 +14,8 @@ from envisat import Envisat
 class Mapper(VRT, Envisat):
     ''' Create VRT with mapping of WKV for MERIS Level 2 (FR or RR)'''
 
+    signature = {'metadata': ['MPH_PRODUCT']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  geolocation=False, zoomSize=500, step=1, **kwargs):
 
@@ -27,6 +27,8 @@ from nansat.vrt import VRT
 class Mapper(VRT):
     ''' Create VRT with mapping of WKV for Met.no seaice '''
 
+    signature = {'path': '^metno_hires_seaice'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VRT '''
 
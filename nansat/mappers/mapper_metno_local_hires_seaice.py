@@ -27,6 +27,8 @@ import mapper_generic as mg
 class Mapper(mg.Mapper):
     ''' Create VRT with mapping of WKV for Met.no seaice '''
 
+    signature = {'path': '^metno_local_hires_seaice'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VRT '''
 
@@ -13,6 +13,8 @@ from nansat.tools import WrongMapperError
 class Mapper(VRT):
     ''' VRT with mapping of WKV for MOD44W produc (MODIS watermask at 250 m)'''
 
+    signature = {'name': r'^MOD44W\.vrt$'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create VRT '''
 
@@ -14,6 +14,8 @@ from nansat.vrt import VRT
 class Mapper(VRT):
     ''' VRT with mapping of WKV for MODIS Level 1 (QKM, HKM, 1KM) '''
 
+    signature = {'metadata': ['SHORTNAME']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create MODIS_L1 VRT '''
 
@@ -32,6 +32,8 @@ downloads = os.path.join(os.path.expanduser('~'), 'ncep_gfs_downloads')
 class Mapper(VRT, object):
     ''' VRT with mapping of WKV for NCEP GFS '''
 
+    signature = {'path': '^ncep_wind_online'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  outFolder=downloads, **kwargs):
         ''' Create NCEP VRT '''
@@ -17,6 +17,8 @@ keywordBase = __name__[7:]
 
 
 class Mapper(VRT):
+    signature = {'path': '^nora10_local_vpv'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, logLevel=30,
                  **kwargs):
 
@@ -20,6 +20,8 @@ class Mapper(VRT):
     * Test on MODIS Terra
     '''
 
+    signature = {'metadata': ['Title']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  GCP_COUNT=10, **kwargs):
         ''' Create VRT
@@ -23,6 +23,10 @@ from nansat.tools import WrongMapperError
 class Mapper(VRT):
     ''' Create VRT with mapping of WKV for Radarsat2 '''
 
+    # zip file with RS2 product or product.xml
+    signature = [{'magic': [b'PK\x03\x04', b'PK\x05\x06'], 'name': '^RS'},
+                 {'metadata': ['SATELLITE_IDENTIFIER']}]
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
         ''' Create Radarsat2 VRT '''
         fPathName, fExt = os.path.splitext(fileName)
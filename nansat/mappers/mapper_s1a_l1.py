@@ -30,6 +30,9 @@ class Mapper(VRT):
         Create VRT with mapping of Sentinel-1A stripmap mode (S1A_SM)
     '''
 
+    # zip file or directory with SAFE product
+    signature = [{'magic': [b'PK\x03\x04', b'PK\x05\x06']}, {'isdir': True}]
+
     def __init__(self, fileName, gdalDataset, gdalMetadata, **kwargs):
 
         if zipfile.is_zipfile(fileName):
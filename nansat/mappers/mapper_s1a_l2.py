@@ -28,6 +28,8 @@ class Mapper(VRT):
         Create VRT with mapping of Sentinel-1A stripmap mode (S1A_SM)
     '''
 
+    signature = {'metadata': ['NC_GLOBAL']}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  product_type='RVL', GCP_COUNT=10, **kwargs):
         '''
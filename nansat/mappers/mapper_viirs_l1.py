@@ -19,6 +19,8 @@ from nansat.tools import gdal, ogr, WrongMapperError
 class Mapper(VRT):
     ''' VRT with mapping of WKV for VIIRS Level 1B '''
 
+    signature = {'path': 'GMTCO_npp_'}
+
     def __init__(self, fileName, gdalDataset, gdalMetadata,
                  GCP_COUNT0=5, GCP_COUNT1=20, pixelStep=1,
                  lineStep=1, **kwargs):
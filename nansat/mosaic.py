@@ -23,6 +23,7 @@ import numpy as np
 import scipy.stats as st
 
 from nansat.nansat import Nansat
+from nansat.tools import OptionError, GDALError
 
 
 class Mosaic(Nansat):
@@ -422,15 +423,22 @@ class Mosaic(Nansat):
             stdMatTmp = np.zeros((len(self.bandIDs),
                                   dstShape[0], dstShape[1]), 'float16')
 
+            # get projected data from Nansat object (all bands at once)
+            try:
+                arrays = n.read_bands(self.bandIDs)
+            except (OptionError, GDALError, RuntimeError):
+                # some bands are missing: read the available bands one by one
+                arrays = [None] * len(self.bandIDs)
+                for bi, b in enumerate(self.bandIDs):
+                    try:
+                        arrays[bi] = n[b]
+                    except:
+                        self.logger.error('%s is not in %s' % (b, n.fileName))
+
             # add data to summation matrices
             for bi, b in enumerate(self.bandIDs):
                 self.logger.info('    Adding %s to sum' % b)
-                # get projected data from Nansat object
-                a = None
-                try:
-                    a = n[b]
-                except:
-                    self.logger.error('%s is not in %s' % (b, n.fileName))
+                a = arrays[bi]
                 if a is not None:
                     # mask invalid data
                     a[mask < 64] = 0
@@ -438,6 +446,7 @@ class Mosaic(Nansat):
                     avgMatTmp[bi] += a
                     stdMatTmp[bi] += np.square(a)
             # destroy Nansat image
+            arrays = None
             n = None
 
             # get intermediate results from queue
@@ -17,8 +17,11 @@
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 from __future__ import absolute_import
 import os
+import re
+import copy
 import glob
 import sys
+import time
 import tempfile
 import datetime
 import dateutil.parser
@@ -30,22 +33,20 @@ if hasattr(collections, 'OrderedDict'):
 else:
     from ordereddict import OrderedDict
 
-import scipy
-from scipy.io.netcdf import netcdf_file
 import numpy as np
-import matplotlib
-from matplotlib import cm
-import matplotlib.pyplot as plt
 
 from nansat.nsr import NSR
 from nansat.domain import Domain
-from nansat.figure import Figure
 from nansat.vrt import VRT
-from nansat.nansatshape import Nansatshape
-from nansat.tools import add_logger, gdal
+from nansat.tools import add_logger, register_colormaps, gdal, gdal_array
 from nansat.tools import OptionError, WrongMapperError, Error, GDALError
 from nansat.node import Node
-from nansat.pointbrowser import PointBrowser
+from nansat.expression import compile_expression
+from nansat.bandcache import bandCache
+from nansat.mappercache import mapperCache
+from nansat.mappermanifest import get_mapper_entries
+from nansat.chunked import ChunkedArray
+from nansat.kdtreeresampler import KDTreeResampler
 
 # container for all mappers
 nansatMappers = None
@@ -80,6 +81,8 @@ class Nansat(Domain):
     Nansat uses instance of VRT (wraper around GDAL VRT-files)
     Nansat uses instance of Figure (collection of methods for visualization)
     '''
+    # remove simple sub-VRTs after crop, resize and add_band (see optimize)
+    autoOptimize = False
 
     def __init__(self, fileName='', mapperName='', domain=None,
                  array=None, parameters=None, logLevel=30, **kwargs):
@@ -178,32 +181,162 @@ class Nansat(Domain):
 
         self.logger.debug('Object created from %s ' % self.fileName)
 
+    @property
+    def vrt(self):
+        ''' VRT object with bands and geo-reference of Nansat '''
+        return self.__dict__.get('_vrt')
+
+    @vrt.setter
+    def vrt(self, vrt):
+        ''' Set VRT object and remove cached arrays read from the old VRT '''
+        oldVRT = self.__dict__.get('_vrt')
+        if oldVRT is not None and oldVRT is not vrt:
+            bandCache.invalidate(oldVRT.fileName)
+        self.__dict__['_vrt'] = vrt
+
     def __getitem__(self, bandID):
         ''' Returns the band as a NumPy array, by overloading []
 
         Parameters
         -----------
-        bandID : int or str
+        bandID : int or str or tuple
             If int, array from band with number <bandID> is returned
             If string, array from band with metadata 'name' equal to
             <bandID> is returned
+            If tuple (bandID, rows, cols), only the window defined by
+            <rows> and <cols> (slices or ints, as in NumPy indexing) is
+            read from the band
 
         Returns
         --------
         self.get_GDALRasterBand(bandID).ReadAsArray() : NumPy array
 
+        Examples
+        --------
+        a = n['sigma0_HH', 1000:1512, 2000:2512]
+        # read 512 x 512 pixels window only
+
+        '''
+        if type(bandID) != tuple:
+            return self._read_band(bandID)
+
+        # get window and subset of the window from the row/column indices
+        indices = list(bandID[1:]) + [slice(None)] * (3 - len(bandID))
+        window, subset = self._get_window(*indices)
+
+        return self._read_band(bandID[0], window)[subset]
+
+    def _get_window(self, rows=slice(None), cols=slice(None)):
+        ''' Convert row and column indices into a window for reading
+
+        Parameters
+        -----------
+        rows, cols : slice or int
+            indices of rows and columns (negative values and steps are
+            treated as in NumPy indexing)
+
+        Returns
+        --------
+        window : tuple
+            (xOff, yOff, xSize, ySize) of the smallest window containing
+            the indexed pixels
+        subset : tuple
+            indices to apply to the array read from the window
+
+        '''
+        window = []
+        subset = []
+        for index, size in [(cols, self.vrt.dataset.RasterXSize),
+                            (rows, self.vrt.dataset.RasterYSize)]:
+            if isinstance(index, (int, long, np.integer)):
+                if index < 0:
+                    index += size
+                if index < 0 or index >= size:
+                    raise IndexError('Index %d is out of range [0, %d)'
+                                     % (index, size))
+                window.append((index, 1))
+                subset.append(0)
+            elif isinstance(index, slice):
+                start, stop, step = index.indices(size)
+                count = len(xrange(start, stop, step))
+                if count == 0:
+                    raise OptionError('Empty window requested')
+                last = start + (count - 1) * step
+                offset = min(start, last)
+                window.append((offset, abs(last - start) + 1))
+                subset.append(slice(start - offset, None, step))
+            else:
+                raise OptionError('Only slices or integers can be used '
+                                  'for rows and columns!')
+
+        return ((window[0][0], window[1][0], window[0][1], window[1][1]),
+                (subset[1], subset[0]))
+
+    def _read_band(self, bandID, window=None):
+        ''' Read band (or a window from band) and apply expression and
+        _FillValue
+
+        Parameters
+        -----------
+        bandID : int or str
+            band number or name
+        window : tuple or None
+            (xOff, yOff, xSize, ySize) of the window to read.
+            If None, the entire band is read
+
+        Returns
+        --------
+        bandData : NumPy array
+
         '''
         # get band
-        band = self.get_GDALRasterBand(bandID)
+        bandNumber = self._get_band_number(bandID)
+        band = self.vrt.dataset.GetRasterBand(bandNumber)
+        if window is None:
+            window = (0, 0, band.XSize, band.YSize)
+
+        # get data from cache
+        cacheKey = (self.vrt.fileName, bandNumber, tuple(window), None)
+        bandData = bandCache.get(cacheKey)
+        if bandData is not None:
+            return bandData
+
         # get expression from metadata
         expression = band.GetMetadata().get('expression', '')
-        # get data
-        bandData = band.ReadAsArray()
-        # execute expression if any
-        if expression != '':
-            bandData = eval(expression)
 
-        # Set invalid and missing data to np.nan (for floats only)
+        if expression == '':
+            # get data
+            bandData = band.ReadAsArray(*window)
+        else:
+            # evaluate compiled expression on data from the window
+            expression = compile_expression(expression)
+            bandData = None
+            if expression.usesBandData:
+                bandData = band.ReadAsArray(*window)
+            bandsData = [self._read_band(exprBand, window)
+                         for exprBand in expression.bands]
+            bandData = expression.evaluate(bandsData, bandData)
+
+        bandData = self._mask_invalid(bandData, band)
+        bandCache.put(cacheKey, bandData)
+
+        return bandData
+
+    def _mask_invalid(self, bandData, band):
+        ''' Set invalid and missing data to np.nan (for floats only)
+
+        Parameters
+        -----------
+        bandData : NumPy array
+            data read from <band>
+        band : GDAL RasterBand
+            band with metadata (_FillValue)
+
+        Returns
+        --------
+        bandData : NumPy array
+
+        '''
         if ('_FillValue' in band.GetMetadata() and
              bandData.dtype.char in np.typecodes['AllFloat']):
             fillValue = float(band.GetMetadata()['_FillValue'])
@@ -219,6 +352,121 @@ class Nansat(Domain):
 
         return bandData
 
+    def read_decimated(self, bandID, outShape, resampling='average',
+                       window=None):
+        '''Read band with reduced size in one pass (e.g. for quicklooks)
+
+        GDAL RasterIO reads the window into a smaller buffer and resamples
+        data on the fly (using overviews if the source file has them).
+        Unlike resize(), no new VRT is created and the object is not
+        changed.
+
+        Parameters
+        -----------
+        bandID : int or str
+            band number or name
+        outShape : tuple
+            (rows, columns) of the output array. If one of them is None, it
+            is computed from the other one keeping the aspect ratio
+        resampling : str
+            'nearest', 'bilinear', 'cubic', 'cubicspline', 'lanczos',
+            'average', 'mode' or 'gauss'
+        window : tuple
+            (xOff, yOff, xSize, ySize) of the window to read.
+            If None, the entire band is read
+
+        Returns
+        --------
+        bandData : NumPy array
+            array with shape <outShape>
+
+        Notes
+        ------
+        Pixels with _FillValue are excluded from resampling (GDAL uses
+        _FillValue as NoDataValue of the band) and are set to np.nan.
+        Expressions are evaluated on decimated data of the source bands.
+        GDAL < 2.0 supports only nearest neighbour resampling.
+
+        Examples
+        --------
+        a = n.read_decimated('sigma0_HH', (None, 512))
+        # read quicklook with 512 columns
+
+        '''
+        if resampling not in RESAMPLING_ALGS:
+            raise OptionError('Unknown resampling %s! Use one of %s'
+                              % (resampling, sorted(RESAMPLING_ALGS)))
+        bandNumber = self._get_band_number(bandID)
+        band = self.vrt.dataset.GetRasterBand(bandNumber)
+        if window is None:
+            window = (0, 0, band.XSize, band.YSize)
+        window = tuple(window)
+
+        # compute missing size from the aspect ratio of the window
+        ySize, xSize = outShape
+        if ySize is None and xSize is None:
+            raise OptionError('Rows or columns of outShape should be given!')
+        if ySize is None:
+            ySize = max(int(round(float(xSize) * window[3] / window[2])), 1)
+        if xSize is None:
+            xSize = max(int(round(float(ySize) * window[2] / window[3])), 1)
+        outShape = (int(ySize), int(xSize))
+
+        # get data from cache
+        cacheKey = (self.vrt.fileName, bandNumber, window,
+                    ('decimated', outShape, resampling))
+        bandData = bandCache.get(cacheKey)
+        if bandData is not None:
+            return bandData
+
+        expression = band.GetMetadata().get('expression', '')
+        if expression == '':
+            bandData = self._read_decimated_raster(band, window, outShape,
+                                                   resampling)
+        else:
+            expression = compile_expression(expression)
+            bandData = None
+            if expression.usesBandData:
+                bandData = self._read_decimated_raster(band, window, outShape,
+                                                       resampling)
+            bandsData = [self.read_decimated(exprBand, outShape, resampling,
+                                             window)
+                         for exprBand in expression.bands]
+            bandData = expression.evaluate(bandsData, bandData)
+
+        bandData = self._mask_invalid(bandData, band)
+        bandCache.put(cacheKey, bandData)
+
+        return bandData
+
+    def _read_decimated_raster(self, band, window, outShape, resampling):
+        ''' Read window from GDAL band into buffer with reduced size
+
+        If the band has _FillValue but no NoDataValue, it is read from a
+        temporary copy of self.vrt with NoDataValue set to _FillValue, so
+        that GDAL excludes fill values from resampling
+
+        '''
+        fillValue = band.GetMetadata().get('_FillValue')
+        if (resampling != 'nearest' and fillValue is not None and
+                band.GetNoDataValue() is None):
+            tmpVRT = self.vrt.copy()
+            tmpBand = tmpVRT.dataset.GetRasterBand(band.GetBand())
+            if tmpBand is not None:
+                tmpBand.SetNoDataValue(float(fillValue))
+                band = tmpBand
+        try:
+            return band.ReadAsArray(*window, buf_xsize=outShape[1],
+                                    buf_ysize=outShape[0],
+                                    resample_alg=getattr(
+                                        gdal, RESAMPLING_ALGS[resampling]))
+        except (TypeError, AttributeError):
+            # GDAL < 2.0 does not support resampling in RasterIO
+            self.logger.warning('Resampling %s is not supported by GDAL, '
+                                'nearest neighbour is used' % resampling)
+            return band.ReadAsArray(*window, buf_xsize=outShape[1],
+                                    buf_ysize=outShape[0])
+
     def __repr__(self):
         '''Creates string with basic info about the Nansat object'''
 
@@ -232,7 +480,7 @@ class Nansat(Domain):
         outString += Domain.__repr__(self)
         return outString
 
-    def add_band(self, array, parameters=None, nomem=False):
+    def add_band(self, array, parameters=None, nomem=False, copy=True):
         '''Add band from the array to self.vrt
 
         Create VRT object which contains VRT and RAW binary file and append it
@@ -245,6 +493,13 @@ class Nansat(Domain):
         parameters : dictionary
             band metadata: wkv, name, etc. (or for several bands)
         nomem : boolean, saves the vrt to a tempfile if nomem is True
+        copy : boolean
+            if False, the array is not copied: the band points to the memory
+            of the array. Later changes of the array change the band, but
+            data already read from the band and cached in bandCache is not
+            updated (call bandCache.invalidate(n.vrt.fileName) after changes).
+            Newer GDAL versions require GDAL_MEM_ENABLE_OPEN=YES, otherwise
+            OptionError is raised (see nansat.vrt.mem_open_enabled)
 
         Modifies
         ---------
@@ -260,10 +515,13 @@ class Nansat(Domain):
         n.add_band(a, p, nomem=True)
         # add new band from an array <a> with metadata <p> but keep it
         # temporarli on disk intead of memory
+
+        n.add_band(a, p, copy=False)
+        # add new band which shares memory with the array <a>
         '''
-        self.add_bands([array], [parameters], nomem)
+        self.add_bands([array], [parameters], nomem, copy)
 
-    def add_bands(self, arrays, parameters=None, nomem=False):
+    def add_bands(self, arrays, parameters=None, nomem=False, copy=True):
         '''Add band from the array to self.vrt
 
         Create VRT object which contains VRT and RAW binary file and append it
@@ -276,6 +534,8 @@ class Nansat(Domain):
         parameters : dictionary or list
             band metadata: wkv, name, etc. (or for several bands)
         nomem : boolean, saves the vrt to a tempfile if nomem is True
+        copy : boolean
+            if False, the arrays are not copied (see add_band)
 
         Modifies
         ---------
@@ -290,7 +550,8 @@ class Nansat(Domain):
 
         '''
         # create VRTs from arrays
-        bandVRTs = [VRT(array=array, nomem=nomem) for array in arrays]
+        bandVRTs = [VRT(array=array, nomem=nomem, copy=copy)
+                    for array in arrays]
 
         self.vrt = self.vrt.get_super_vrt()
 
@@ -307,6 +568,9 @@ class Nansat(Domain):
 
         self.vrt.dataset.FlushCache()  # required after adding bands
 
+        if self.autoOptimize:
+            self.optimize()
+
     def bands(self):
         ''' Make a dictionary with all metadata from all bands
 
@@ -316,11 +580,7 @@ class Nansat(Domain):
             key = N, value = dict with all band metadata
 
         '''
-        b = {}
-        for iBand in range(self.vrt.dataset.RasterCount):
-            b[iBand + 1] = self.get_metadata(bandID=iBand + 1)
-
-        return b
+        return self.vrt.get_band_index().bands()
 
     def has_band(self, band):
         '''Check if self has band with name <band>
@@ -334,13 +594,330 @@ class Nansat(Domain):
             True/False if band exists or not
 
         '''
-        bandExists = False
-        for b in self.bands():
-            if self.bands()[b]['name'] == band:
-                bandExists = True
+        bandExists = self.vrt.get_band_index().find({'name': band}) > 0
 
         return bandExists
 
+    def iter_blocks(self, bands=None, blockSize=None, overlap=0, threads=1):
+        '''Iterate over blocks of bands without reading entire bands
+
+        Parameters
+        -----------
+        bands : list or int or str
+            band numbers or names. If None, all bands are read
+        blockSize : int or tuple
+            size of blocks (xSize, ySize) or size of square blocks. If None,
+            natural block size of the first band of self.vrt is used
+        overlap : int
+            width of halo around each block. Arrays include <overlap> pixels
+            from the neighbouring blocks on each side (less at the edges of
+            the raster)
+        threads : int
+            number of threads for reading blocks in advance. Bands without
+            expression are read in parallel from datasets opened for each
+            thread (see VRT.get_thread_dataset)
+
+        Returns
+        --------
+        generator of tuples (xOff, yOff, arrays)
+            xOff, yOff : int
+                offset of the block (without halo)
+            arrays : list of NumPy arrays
+                data from each band. Arrays start at pixel
+                (max(xOff - overlap, 0), max(yOff - overlap, 0))
+
+        Examples
+        --------
+        for xOff, yOff, arrays in n.iter_blocks(['L_645', 'L_555'], 512):
+            ratio = arrays[0] / arrays[1]
+            # process 512 x 512 pixels of both bands at a time
+
+        '''
+        if bands is None:
+            bands = range(1, self.vrt.dataset.RasterCount + 1)
+        elif type(bands) not in [list, tuple]:
+            bands = [bands]
+        bandNumbers = [self._get_band_number(band) for band in bands]
+
+        if blockSize is None:
+            blockXSize, blockYSize = self.vrt.dataset.GetRasterBand(
+                                            bandNumbers[0]).GetBlockSize()
+        elif type(blockSize) in [list, tuple]:
+            blockXSize, blockYSize = blockSize
+        else:
+            blockXSize, blockYSize = blockSize, blockSize
+
+        if blockXSize < 1 or blockYSize < 1 or overlap < 0:
+            raise OptionError('Wrong blockSize or overlap!')
+
+        rasterXSize = self.vrt.dataset.RasterXSize
+        rasterYSize = self.vrt.dataset.RasterYSize
+        windows = []
+        for yOff in range(0, rasterYSize, blockYSize):
+            yStart = max(yOff - overlap, 0)
+            yEnd = min(yOff + blockYSize + overlap, rasterYSize)
+            for xOff in range(0, rasterXSize, blockXSize):
+                xStart = max(xOff - overlap, 0)
+                xEnd = min(xOff + blockXSize + overlap, rasterXSize)
+                windows.append((xOff, yOff, (xStart, yStart,
+                                             xEnd - xStart, yEnd - yStart)))
+
+        if threads > 1:
+            for block in self._iter_blocks_threaded(bandNumbers, windows,
+                                                    threads):
+                yield block
+            return
+
+        for xOff, yOff, window in windows:
+            arrays = [self._read_band(bandNumber, window)
+                      for bandNumber in bandNumbers]
+            yield xOff, yOff, arrays
+
+    def _iter_blocks_threaded(self, bandNumbers, windows, threads):
+        ''' Read blocks in parallel threads (see iter_blocks)
+
+        At most 2 * <threads> blocks are read in advance. Bands with
+        expression are read in the calling thread.
+
+        Parameters
+        -----------
+        bandNumbers : list of int
+        windows : list of tuples
+            (xOff, yOff, (xStart, yStart, xSize, ySize)) of each block
+        threads : int
+            number of threads
+
+        Returns
+        --------
+        generator of tuples (xOff, yOff, arrays)
+
+        '''
+        from multiprocessing.pool import ThreadPool
+        version = self.vrt.get_dataset_version()
+        bands = [self.vrt.dataset.GetRasterBand(bandNumber)
+                 for bandNumber in bandNumbers]
+        isExpression = [band.GetMetadata().get('expression', '') != ''
+                        for band in bands]
+
+        def read_block(window):
+            dataset = self.vrt.get_thread_dataset(version)
+            return [None if isExpression[i] else
+                    dataset.GetRasterBand(bandNumber).ReadAsArray(*window)
+                    for i, bandNumber in enumerate(bandNumbers)]
+
+        pool = ThreadPool(threads)
+        try:
+            windows = iter(windows)
+            results = collections.deque()
+            for xOff, yOff, window in windows:
+                results.append((xOff, yOff, window,
+                                pool.apply_async(read_block, (window,))))
+                if len(results) == 2 * threads:
+                    break
+            while len(results) > 0:
+                xOff, yOff, window, result = results.popleft()
+                arrays = result.get()
+                # read next block while this one is processed
+                for nextXOff, nextYOff, nextWindow in windows:
+                    results.append((nextXOff, nextYOff, nextWindow,
+                                    pool.apply_async(read_block,
+                                                     (nextWindow,))))
+                    break
+                for i, band in enumerate(bands):
+                    if isExpression[i]:
+                        arrays[i] = self._read_band(bandNumbers[i], window)
+                    else:
+                        self._mask_invalid(arrays[i], band)
+                yield xOff, yOff, arrays
+        finally:
+            pool.close()
+            pool.join()
+
+    def read_bands(self, bandList, window=None, dtype=None, threads=1):
+        '''Read several bands with one call to GDAL (or in parallel)
+
+        All bands are read by one Dataset.ReadAsArray() so that GDAL can
+        share e.g. warping and block cache between bands. Bands with
+        expression are read separately. If several threads are used, each
+        band is read in a separate thread from a dataset opened for this
+        thread (see VRT.get_thread_dataset)
+
+        Parameters
+        -----------
+        bandList : list
+            band numbers or names
+        window : tuple
+            (xOff, yOff, xSize, ySize) of the window to read.
+            If None, entire bands are read
+        dtype : str or numpy.dtype
+            data type of the output array. If None, the data type which can
+            hold data from all bands is used
+        threads : int
+            number of threads for reading bands without expression
+
+        Returns
+        --------
+        bandsData : 3D NumPy array
+            data from the bands with shape (len(bandList), ySize, xSize)
+
+        Examples
+        --------
+        a = n.read_bands(['L_645', 'L_555', 'L_469'], (100, 200, 50, 50))
+        # read 50 x 50 pixels from three bands
+
+        a = n.read_bands(range(1, 11), threads=8)
+        # read 10 bands in 8 threads
+
+        '''
+        bandNumbers = [self._get_band_number(band) for band in bandList]
+        if window is None:
+            window = (0, 0, self.vrt.dataset.RasterXSize,
+                      self.vrt.dataset.RasterYSize)
+
+        # get data from cache
+        cacheKey = (self.vrt.fileName, tuple(bandNumbers), tuple(window),
+                    dtype if dtype is None else np.dtype(dtype).str)
+        bandsData = bandCache.get(cacheKey)
+        if bandsData is not None:
+            return bandsData
+
+        # read bands with expression separately
+        bands = [self.vrt.dataset.GetRasterBand(bandNumber)
+                 for bandNumber in bandNumbers]
+        exprData = {}
+        dtypes = []
+        for i, band in enumerate(bands):
+            if band.GetMetadata().get('expression', '') != '':
+                exprData[i] = self._read_band(bandNumbers[i], window)
+                dtypes.append(exprData[i].dtype)
+            else:
+                dtypes.append(np.dtype(
+                    gdal_array.GDALTypeCodeToNumericTypeCode(band.DataType)))
+        if dtype is None:
+            dtype = np.result_type(*dtypes)
+        dtype = np.dtype(dtype)
+
+        # read all other bands at once
+        rawIndices = [i for i in range(len(bands)) if i not in exprData]
+        rawData = None
+        if len(rawIndices) > 1 and threads > 1:
+            rawData = self._read_raster_threaded(
+                        [bandNumbers[i] for i in rawIndices], window, dtype,
+                        threads)
+        elif len(rawIndices) > 0:
+            rawData = self._read_raster(
+                        [bandNumbers[i] for i in rawIndices], window, dtype)
+
+        if len(exprData) == 0:
+            bandsData = rawData
+        else:
+            bandsData = np.empty((len(bands), window[3], window[2]), dtype)
+            for i in exprData:
+                bandsData[i] = exprData[i]
+            for i, rawIndex in enumerate(rawIndices):
+                bandsData[rawIndex] = rawData[i]
+            rawData = None
+
+        # set invalid and missing data to np.nan
+        for i, band in enumerate(bands):
+            if i not in exprData:
+                self._mask_invalid(bandsData[i], band)
+        bandCache.put(cacheKey, bandsData)
+
+        return bandsData
+
+    def _read_raster(self, bandNumbers, window, dtype):
+        ''' Read bands from self.vrt.dataset with one call to GDAL
+
+        Parameters
+        -----------
+        bandNumbers : list of int
+        window : tuple
+            (xOff, yOff, xSize, ySize)
+        dtype : numpy.dtype
+
+        Returns
+        --------
+        3D NumPy array
+
+        '''
+        bufType = gdal_array.NumericTypeCodeToGDALTypeCode(dtype.type)
+        try:
+            data = self.vrt.dataset.ReadAsArray(*window, buf_type=bufType,
+                                                band_list=bandNumbers)
+        except TypeError:
+            # older GDAL does not support band_list in ReadAsArray()
+            data = np.fromstring(self.vrt.dataset.ReadRaster(
+                                        *window, buf_type=bufType,
+                                        band_list=bandNumbers), dtype)
+
+        return data.reshape(len(bandNumbers), window[3], window[2])
+
+    def _read_raster_threaded(self, bandNumbers, window, dtype, threads):
+        ''' Read bands without expression in parallel threads
+
+        Parameters
+        -----------
+        bandNumbers : list of int
+        window : tuple
+            (xOff, yOff, xSize, ySize)
+        dtype : numpy.dtype
+        threads : int
+            number of threads
+
+        Returns
+        --------
+        3D NumPy array
+
+        '''
+        from multiprocessing.pool import ThreadPool
+        version = self.vrt.get_dataset_version()
+        data = np.empty((len(bandNumbers), window[3], window[2]), dtype)
+
+        def read_band(i):
+            dataset = self.vrt.get_thread_dataset(version)
+            data[i] = dataset.GetRasterBand(bandNumbers[i]).ReadAsArray(
+                                                                    *window)
+
+        pool = ThreadPool(min(threads, len(bandNumbers)))
+        try:
+            pool.map(read_band, range(len(bandNumbers)))
+        finally:
+            pool.close()
+            pool.join()
+
+        return data
+
+    def to_chunked(self, bands=None, chunks=(1024, 1024)):
+        '''Get lazy array of bands which is read chunk by chunk
+
+        Parameters
+        -----------
+        bands : list
+            band numbers or names. If None, all bands are used
+        chunks : int or tuple
+            size of chunks (rows, columns)
+
+        Returns
+        --------
+        chunkedArray : ChunkedArray
+            3D array (bands, rows, columns) which supports numpy.asarray(),
+            indexing with integers and slices and conversion to dask array
+            (ChunkedArray.to_dask()). Data is read only when requested
+
+        Examples
+        --------
+        c = n.to_chunked(['L_645', 'L_555'], chunks=(512, 512))
+        a = c[:, 1000:1100, 2000:2100]
+        # read 100 x 100 pixels from two bands
+
+        d = c.to_dask()
+        ratio = (d[0] / d[1]).mean().compute()
+        # chunks are read and processed in parallel threads
+
+        '''
+        return ChunkedArray(self, bands, chunks)
+
     def export(self, fileName, bands=None, rmMetadata=[], addGeolocArray=True,
                addGCPs=True, driver='netCDF', bottomup=False, options=None):
         '''Export Nansat object into netCDF or GTiff file
@@ -558,6 +1135,7 @@ class Nansat(Domain):
             return 1
 
         # open output file for adding GCPs
+        from scipy.io.netcdf import netcdf_file
         try:
             ncFile = netcdf_file(fileName, 'a')
         except TypeError as e:
@@ -652,7 +1230,8 @@ class Nansat(Domain):
 
         # add required bands to data
         dstBands = {}
-        srcBands = [self.bands()[b]['name'] for b in self.bands()]
+        bandsMeta = self.bands()
+        srcBands = [bandsMeta[b]['name'] for b in bandsMeta]
         for iband in bands:
             # skip non exiting bands
             if iband not in srcBands:
@@ -723,6 +1302,7 @@ class Nansat(Domain):
         data.export(tmpName)
 
         # open files for input and output
+        from scipy.io.netcdf import netcdf_file
         ncI = netcdf_file(tmpName, 'r')
         ncO = netcdf_file(fileName, 'w')
 
@@ -962,8 +1542,22 @@ class Nansat(Domain):
         subMetaData.pop('fileName')
         self.set_metadata(subMetaData)
 
+        if self.autoOptimize:
+            self.optimize()
+
         return factor
 
+    def _get_copy(self):
+        ''' Get shallow copy of self with a copy of the top-level VRT
+
+        The copy can be changed (e.g. reprojected) or read in another thread
+        without changing self. Sub-VRTs are shared (see VRT.copy)
+
+        '''
+        nCopy = copy.copy(self)
+        nCopy.__dict__['_vrt'] = self.vrt.copy()
+        return nCopy
+
     def get_GDALRasterBand(self, bandID=1):
         ''' Get a GDALRasterBand of a given Nansat object
 
@@ -1026,7 +1620,7 @@ class Nansat(Domain):
             return outString
 
     def reproject(self, dstDomain=None, eResampleAlg=0, blockSize=None,
-                  WorkingDataType=None, tps=None, **kwargs):
+                  WorkingDataType=None, tps=None, method='gdal', **kwargs):
         ''' Change projection of the object based on the given Domain
 
         Create superVRT from self.vrt with AutoCreateWarpedVRT() using
@@ -1035,6 +1629,8 @@ class Nansat(Domain):
         Generate warpedVRT and replace self.vrt with warpedVRT.
         If current object spans from 0 to 360 and dstDomain is west of 0,
         the object is shifted by 180 westwards.
+        If method is 'kdtree', bands are resampled in memory using
+        neighbours found on geolocation grids (see KDTreeResampler).
 
         Parameters
         -----------
@@ -1063,6 +1659,43 @@ class Nansat(Domain):
             If not given explicitly, 'skip_gcps' is fetched from the
             metadata of self, or from dstDomain (as set by mapper or user).
             [defaults to 1 if not specified, i.e. using all GCPs]
+        max_gcp_error : float
+            Adaptive alternative to skip_gcps: only GCPs needed to keep
+            the error of interpolation of pixel/line below max_gcp_error
+            (pixels) are used, i.e. many GCPs where the geometry is curved
+            and few where it is nearly linear. Applied to fake GCPs of
+            destination or to GCPs of self. Requires scipy.
+        numThreads : int or str
+            number of threads used by GDAL for warping (e.g. 4 or
+            'ALL_CPUS'). Default is one thread
+        warpMemoryLimit : float
+            memory (bytes) used by GDAL for warping of one chunk
+        maxError : float
+            error threshold (pixels) for the approximate transformer.
+            Default is 0 (exact transformation of each pixel). E.g. 0.125
+            (as in gdalwarp) speeds up warping considerably
+        optimizeSize : bool
+            warp in chunks aligned with blocks of the WarpedVRT
+        method : str
+            'gdal' : warping by GDAL (default)
+            'kdtree' : swath-to-grid resampling with KD-tree of longitude
+            and latitude grids. Suits products with geolocation arrays.
+            All bands are read and resampled; the search for neighbours is
+            done once for all bands. Requires scipy.
+            Options eResampleAlg, blockSize, WorkingDataType, tps and the
+            above keywords for GDAL are not used and raise OptionError.
+        kernel : str
+            'nearest' (default), 'idw' (inverse distance weighting) or
+            'gaussian'. Only for method='kdtree'
+        radius : float
+            radius of influence (m). Default is twice the typical distance
+            between pixels of self. Only for method='kdtree'
+        neighbours : int
+            maximum number of neighbours for 'idw' and 'gaussian' kernels
+            (default 8). Only for method='kdtree'
+        sigma : float
+            standard deviation (m) of 'gaussian' kernel (default radius/2).
+            Only for method='kdtree'
 
         Modifies
         ---------
@@ -1082,6 +1715,23 @@ class Nansat(Domain):
         if dstDomain is None:
             return
 
+        if method == 'kdtree':
+            # options of GDAL warping which differ from defaults
+            gdalOptions = [name for name, isSet in [
+                           ('eResampleAlg', eResampleAlg != 0),
+                           ('blockSize', blockSize is not None),
+                           ('WorkingDataType', WorkingDataType is not None),
+                           ('tps', tps is not None)] if isSet]
+            if gdalOptions:
+                raise OptionError('Options for method gdal cannot be used '
+                                  'with method kdtree: %s'
+                                  % ', '.join(gdalOptions))
+            self._reproject_kdtree(dstDomain, **kwargs)
+            return
+        elif method != 'gdal':
+            raise OptionError('Unknown reprojection method %s! '
+                              'Use "gdal" or "kdtree"' % method)
+
         # if self spans from 0 to 360 and dstDomain is west of 0:
         #     shift self westwards by 180 degrees
         # check span
@@ -1150,10 +1800,52 @@ class Nansat(Domain):
         subMetaData.pop('fileName')
         self.set_metadata(subMetaData)
 
+    def _reproject_kdtree(self, dstDomain, kernel='nearest', radius=None,
+                          neighbours=8, sigma=None, **kwargs):
+        ''' Reproject all bands with KDTreeResampler (see reproject)
+
+        Bands are resampled into arrays and added to a new VRT with
+        geometry of dstDomain. The new VRT references self.vrt as sub-VRT
+        for undo().
+
+        '''
+        if kwargs:
+            raise OptionError('Unknown options for method kdtree: %s'
+                              % ', '.join(sorted(kwargs)))
+
+        srcLon, srcLat = self.get_geolocation_grids()
+        dstLon, dstLat = dstDomain.get_geolocation_grids()
+        resampler = KDTreeResampler(srcLon, srcLat, dstLon, dstLat, kernel,
+                                    radius, neighbours, sigma)
+        srcLon = srcLat = dstLon = dstLat = None
+        self.logger.debug('%s' % resampler)
+
+        # create VRT with geometry of dstDomain and add resampled bands
+        dstVRT = VRT(gdalDataset=dstDomain.vrt.dataset)
+        bandsMeta = self.bands()
+        for bandNumber in sorted(bandsMeta):
+            bandVRT = VRT(array=resampler.apply(self[bandNumber]))
+            params = dict((key, value)
+                          for key, value in bandsMeta[bandNumber].items()
+                          if key not in ['SourceFilename', 'SourceBand',
+                                         'expression'])
+            bandName = dstVRT._create_band({'SourceFilename': bandVRT.fileName,
+                                            'SourceBand': 1}, params)
+            dstVRT.bandVRTs[bandName] = bandVRT
+        dstVRT.dataset.FlushCache()  # required after adding bands
+
+        # keep global metadata of self
+        subMetaData = self.vrt.dataset.GetMetadata()
+        subMetaData.pop('fileName', None)
+        dstVRT.vrt = self.vrt
+        self.vrt = dstVRT
+        self.set_metadata(subMetaData)
+
     def undo(self, steps=1):
         '''Undo reproject, resize, add_band or crop of Nansat object
 
-        Restore the self.vrt from self.vrt.vrt
+        Restore the self.vrt from a copy of self.vrt.vrt (the sub-VRT may be
+        shared with copies of self and should not be modified)
 
         Parameters
         -----------
@@ -1166,7 +1858,46 @@ class Nansat(Domain):
 
         '''
 
-        self.vrt = self.vrt.get_sub_vrt(steps)
+        self.vrt = self.vrt.get_sub_vrt(steps).copy()
+
+    def optimize(self):
+        '''Remove simple intermediate VRTs from the chain of VRTs
+
+        Each crop, resize or add_band creates a new VRT which references
+        the previous VRT (see undo). If the previous VRT only passes
+        through or crops the data, the new VRT can reference the data
+        directly and the previous VRT is removed from the chain. That
+        makes reading of data faster and saves memory in long sessions.
+        The removed steps cannot be undone. If Nansat.autoOptimize is True,
+        optimize is called after each crop, resize and add_band.
+
+        Returns
+        --------
+        nVRTs : int
+            number of removed VRTs
+
+        Modifies
+        ---------
+        self.vrt
+
+        Examples
+        --------
+        n.crop(10, 20, 500, 600)
+        n.crop(10, 20, 50, 60)
+        n.optimize()
+        # the last crop references the mapper VRT directly
+
+        Nansat.autoOptimize = True
+        # optimize all Nansat objects after crop, resize and add_band
+
+        '''
+        nVRTs = 0
+        while self.vrt._collapse_sub_vrt():
+            nVRTs += 1
+        if nVRTs > 0:
+            self.logger.debug('%d VRTs removed from chain' % nVRTs)
+
+        return nVRTs
 
     def watermask(self, mod44path=None, dstDomain=None, **kwargs):
         ''' Create numpy array with watermask (water=1, land=0)
@@ -1323,18 +2054,11 @@ class Nansat(Domain):
             bands = [self._get_band_number(bands)]
 
         # == create 3D ARRAY ==
-        array = None
-        for band in bands:
-            # get array from band and reshape to (1,height,width)
-            iArray = self[band]
-            iArray = iArray.reshape(1, iArray.shape[0], iArray.shape[1])
-            # create new 3D array or append band
-            if array is None:
-                array = iArray
-            else:
-                array = np.append(array, iArray, axis=0)
+        array = self.read_bands(bands)
 
         # == CREATE FIGURE object and parse input parameters ==
+        # (matplotlib and PIL are imported only when figures are made)
+        from nansat.figure import Figure
         fig = Figure(array, **kwargs)
         array = None
 
@@ -1400,6 +2124,7 @@ class Nansat(Domain):
         if fileName is not None:
             if type(fileName) == bool and fileName:
                 try:
+                    import matplotlib.pyplot as plt
                     if plt.get_backend() == 'agg':
                         plt.switch_backend('QT4Agg')
                 except:
@@ -1459,6 +2184,8 @@ class Nansat(Domain):
         except:
             colormap = 'jet'
         #try:
+        from matplotlib import cm
+        register_colormaps()
         cmap = cm.get_cmap(colormap, 256)
         cmap = cmap(np.arange(256)) * 255
         colorTable = gdal.ColorTable()
@@ -1579,6 +2306,10 @@ class Nansat(Domain):
         else:
             metaReceiverVRT.SetMetadataItem(key, value)
 
+        # metadata (e.g. expression, _FillValue) may change data of bands
+        bandCache.invalidate(self.vrt.fileName)
+        self.vrt.invalidate_band_index()
+
     def _get_mapper(self, mapperName, **kwargs):
         ''' Create VRT file in memory (VSI-file) with variable mapping
 
@@ -1613,11 +2344,18 @@ class Nansat(Domain):
             ff = glob.glob(os.path.join(self.fileName,'*.*'))
             for f in ff:
                 test_openable(f)
-        # lazy import of nansat mappers
-        # if nansat mappers were not imported yet
+        # lazy import of nansat mappers: only manifests are read here,
+        # a mapper module is imported when the mapper is tried
         global nansatMappers
         if nansatMappers is None:
-            nansatMappers = _import_mappers()
+            nansatMappers = _get_mapper_entries()
+
+        # restore VRTs created by a mapper from the file earlier (if cached)
+        cacheKey = mapperCache.get_key(self.fileName, mapperName, kwargs)
+        cachedVRT = mapperCache.get(cacheKey, _get_mapper_class)
+        if cachedVRT is not None:
+            self.mapper, tmpVRT = cachedVRT
+            return tmpVRT
 
         # open GDAL dataset. It will be parsed to all mappers for testing
         gdalDataset = None
@@ -1647,26 +2385,25 @@ class Nansat(Domain):
                 raise Error('Mapper ' + mapperName + ' not found')
 
             # check if mapper is importbale or raise an ImportError error
-            if isinstance(nansatMappers[mapperName], tuple):
-                errType, err, traceback = nansatMappers[mapperName]
+            mapper = nansatMappers[mapperName].load()
+            if isinstance(mapper, tuple):
+                errType, err, traceback = mapper
                 #self.logger.error(err, exc_info=(errType, err, traceback))
                 raise errType, err, traceback
+            if mapper is None:
+                raise Error('Mapper ' + mapperName + ' not found')
 
             # create VRT using the selected mapper
-            tmpVRT = nansatMappers[mapperName](self.fileName,
-                                               gdalDataset,
-                                               metadata,
-                                               **kwargs)
+            tmpVRT = mapper(self.fileName, gdalDataset, metadata, **kwargs)
             self.mapper = mapperName.replace('mapper_', '')
         else:
-            # We test all mappers, import one by one
-            for iMapper in nansatMappers:
-                # skip non-importable mappers
-                if isinstance(nansatMappers[iMapper], tuple):
-                    # keep errors to show before use of generic mapper
-                    importErrors.append(nansatMappers[iMapper][1])
-                    continue
+            # select mappers with signatures matching the file
+            fileInfo = _get_file_info(self.fileName, gdalDataset, metadata)
+            candidates = _rank_mappers(nansatMappers, fileInfo)
+            self.logger.debug('Mappers matching the file: %s' % candidates)
 
+            # We test the selected mappers, one by one
+            for iMapper in candidates:
                 self.logger.debug('Trying %s...' % iMapper)
 
                 # show all ImportError warnings before trying generic_mapper
@@ -1676,17 +2413,30 @@ class Nansat(Domain):
                     for ie in importErrors:
                         self.logger.error(importErrors)
 
+                # import the mapper module (only the tried mappers)
+                t0 = time.time()
+                mapper = nansatMappers[iMapper].load()
+                if isinstance(mapper, tuple):
+                    # keep errors of non-importable mappers to show before
+                    # use of generic mapper
+                    self.logger.debug('%s could not be imported' % iMapper)
+                    importErrors.append(mapper[1])
+                    continue
+                if mapper is None:
+                    continue
+
                 # create a Mapper object and get VRT dataset from it
                 try:
-                    tmpVRT = nansatMappers[iMapper](self.fileName,
-                                                    gdalDataset,
-                                                    metadata,
-                                                    **kwargs)
+                    tmpVRT = mapper(self.fileName, gdalDataset, metadata,
+                                    **kwargs)
                     self.logger.info('Mapper %s - success!' % iMapper)
+                    self.logger.debug('%s created VRT in %f s'
+                                      % (iMapper, time.time() - t0))
                     self.mapper = iMapper.replace('mapper_', '')
                     break
                 except WrongMapperError:
-                    pass
+                    self.logger.debug('%s rejected the file in %f s'
+                                      % (iMapper, time.time() - t0))
 
         # if no mapper fits, make simple copy of the input DS into a VSI/VRT
         if tmpVRT is None and gdalDataset is not None:
@@ -1704,6 +2454,10 @@ class Nansat(Domain):
                 raise IOError('%s: File does not exist' % (self.fileName))
             raise GDALError('NANSAT can not open the file ' + self.fileName)
 
+        # store VRTs created by the mapper (if caching is enabled)
+        if getattr(self, 'mapper', ''):
+            mapperCache.put(cacheKey, self.mapper, tmpVRT)
+
         return tmpVRT
 
     def _get_pixelValue(self, val, defVal):
@@ -1735,18 +2489,9 @@ class Nansat(Domain):
         if type(bandID) == str:
             bandID = {'name': bandID}
 
-        # if bandID is dict: search self.bands with seraching criteria
+        # if bandID is dict: search index of bands metadata
         if type(bandID) == dict:
-            bandsMeta = self.bands()
-            for b in bandsMeta:
-                numCorrectKeys = 0
-                for key in bandID:
-                    if (key in bandsMeta[b] and
-                            bandID[key] == bandsMeta[b][key]):
-                        numCorrectKeys = numCorrectKeys + 1
-                    if numCorrectKeys == len(bandID):
-                        bandNumber = b
-                        break
+            bandNumber = self.vrt.get_band_index().find(bandID)
 
         # if bandID is int and with bounds: return this number
         if (type(bandID) == int and bandID >= 1 and
@@ -1827,6 +2572,12 @@ class Nansat(Domain):
         it is possible to select multiple shapes by pressing any key
 
         '''
+        # GUI and plotting modules are imported only when transect is made
+        import matplotlib
+        import scipy.stats
+        from nansat.nansatshape import Nansatshape
+        from nansat.pointbrowser import PointBrowser
+
         if matplotlib.is_interactive() and points is None:
             warnings.warn('''
         Python is started with -pylab option, transect will not work.
@@ -2095,6 +2846,7 @@ class Nansat(Domain):
         if (xOff == 0 and yOff == 0 and
                 xSize is None and ySize is None and
                 lonlim is None and latlim is None):
+            from nansat.pointbrowser import PointBrowser
             factor = self.resize(width=1000)
             data = self[1]
             browser = PointBrowser(data)
@@ -2165,33 +2917,29 @@ class Nansat(Domain):
                                'larger or equal to image!'))
             return 2
 
-        # create super VRT and get its XML
+        # create super VRT and edit its XML (written on exit)
         self.vrt = self.vrt.get_super_vrt()
-        xml = self.vrt.read_xml()
-        node0 = Node.create(xml)
-
-        # change size
-        node0.node('VRTDataset').replaceAttribute('rasterXSize', str(xSize))
-        node0.node('VRTDataset').replaceAttribute('rasterYSize', str(ySize))
-
-        # replace x/y-Off and x/y-Size
-        #   in <SrcRect> and <DstRect> of each source
-        for iNode1 in node0.nodeList('VRTRasterBand'):
-            iNode2 = iNode1.node('ComplexSource')
-
-            iNode3 = iNode2.node('SrcRect')
-            iNode3.replaceAttribute('xOff', str(xOff))
-            iNode3.replaceAttribute('yOff', str(yOff))
-            iNode3.replaceAttribute('xSize', str(xSize))
-            iNode3.replaceAttribute('ySize', str(ySize))
-
-            iNode3 = iNode2.node('DstRect')
-            iNode3.replaceAttribute('xSize', str(xSize))
-            iNode3.replaceAttribute('ySize', str(ySize))
-
-        # write modified XML
-        xml = node0.rawxml()
-        self.vrt.write_xml(xml)
+        with self.vrt.editing() as node0:
+            # change size
+            node0.node('VRTDataset').replaceAttribute('rasterXSize',
+                                                      str(xSize))
+            node0.node('VRTDataset').replaceAttribute('rasterYSize',
+                                                      str(ySize))
+
+            # replace x/y-Off and x/y-Size
+            #   in <SrcRect> and <DstRect> of each source
+            for iNode1 in node0.nodeList('VRTRasterBand'):
+                iNode2 = iNode1.node('ComplexSource')
+
+                iNode3 = iNode2.node('SrcRect')
+                iNode3.replaceAttribute('xOff', str(xOff))
+                iNode3.replaceAttribute('yOff', str(yOff))
+                iNode3.replaceAttribute('xSize', str(xSize))
+                iNode3.replaceAttribute('ySize', str(ySize))
+
+                iNode3 = iNode2.node('DstRect')
+                iNode3.replaceAttribute('xSize', str(xSize))
+                iNode3.replaceAttribute('ySize', str(ySize))
 
         # modify GCPs or GeoTranfrom to fit the new shape of image
         gcps = self.vrt.dataset.GetGCPs()
@@ -2248,25 +2996,179 @@ class Nansat(Domain):
         subMetaData.pop('fileName')
         self.set_metadata(subMetaData)
 
+        if self.autoOptimize:
+            self.optimize()
+
         return 0, extent
 
 
-def _import_mappers(logLevel=None):
-    ''' Import available mappers into a dictionary
+# GDAL resampling algorithms of RasterIO (see Nansat.read_decimated)
+RESAMPLING_ALGS = {'nearest': 'GRIORA_NearestNeighbour',
+                   'bilinear': 'GRIORA_Bilinear',
+                   'cubic': 'GRIORA_Cubic',
+                   'cubicspline': 'GRIORA_CubicSpline',
+                   'lanczos': 'GRIORA_Lanczos',
+                   'average': 'GRIORA_Average',
+                   'mode': 'GRIORA_Mode',
+                   'gauss': 'GRIORA_Gauss'}
+
+# size of file header for testing of 'magic' in mapper signatures
+MAGIC_SIZE = 512
+
+
+def _get_file_info(fileName, gdalDataset=None, metadata=None):
+    ''' Get properties of input file for testing of mapper signatures
+
+    Parameters
+    -----------
+    fileName : str
+        name of the input file
+    gdalDataset : GDAL Dataset or None
+        dataset opened from the file
+    metadata : dict or None
+        metadata of gdalDataset
 
     Returns
     --------
-    nansatMappers : dict
-        key  : mapper name
-        value: class Mapper(VRT) from the mapper module
+    fileInfo : dict
+        fileName, baseName, ext, isdir, header (first bytes of the file),
+        driver (short name of GDAL driver), metadata
 
     '''
-    logger = add_logger('import_mappers', logLevel=logLevel)
-    # import built-in mappers
+    header = b''
+    if os.path.isfile(fileName):
+        with open(fileName, 'rb') as f:
+            header = f.read(MAGIC_SIZE)
+
+    driver = ''
+    if gdalDataset is not None:
+        driver = gdalDataset.GetDriver().ShortName
+
+    return {'fileName': fileName,
+            'baseName': os.path.basename(fileName),
+            'ext': os.path.splitext(fileName)[1],
+            'isdir': os.path.isdir(fileName),
+            'header': header,
+            'driver': driver,
+            'metadata': metadata or {}}
+
+
+def _match_magic(magics, header):
+    ''' Check if header starts with one of magic strings (or (offset, str))'''
+    for magic in magics:
+        offset = 0
+        if isinstance(magic, tuple):
+            offset, magic = magic
+        if header[offset:offset + len(magic)] == magic:
+            return True
+    return False
+
+# tests of file properties for each key of mapper signature
+SIGNATURE_TESTS = {
+    'ext': lambda value, info: info['ext'] in value,
+    'name': lambda value, info: re.search(value, info['baseName']) is not None,
+    'path': lambda value, info: re.search(value, info['fileName']) is not None,
+    'magic': lambda value, info: _match_magic(value, info['header']),
+    'driver': lambda value, info: info['driver'] in value,
+    'metadata': lambda value, info: all(key in info['metadata']
+                                        for key in value),
+    'isdir': lambda value, info: info['isdir'] == value,
+}
+
+
+def _match_signature(signature, fileInfo):
+    ''' Test if file matches signature of a mapper
+
+    Signature is a class attribute of Mapper: a dictionary with cheap tests
+    of the input file which should all pass if the mapper can open the file:
+        ext : list of file extensions (e.g. ['.nc'])
+        name : regular expression for the base name of the file
+        path : regular expression for the full file name
+        magic : list of first bytes of the file (str or (offset, str))
+        driver : list of GDAL driver short names
+        metadata : list of keys required in GDAL metadata
+        isdir : True if the input is a directory
+    Signature can also be a list of such dictionaries if any of them can
+    match.
+
+    Parameters
+    -----------
+    signature : dict or list or None
+        signature of a mapper
+    fileInfo : dict
+        properties of the file from _get_file_info
+
+    Returns
+    --------
+    score : int or None
+        number of passed tests (0 if mapper has no signature) or None if
+        the file does not match the signature
+
+    '''
+    if signature is None:
+        return 0
+    if isinstance(signature, dict):
+        signature = [signature]
+
+    score = None
+    for signatureDict in signature:
+        if all(SIGNATURE_TESTS[key](signatureDict[key], fileInfo)
+               for key in signatureDict):
+            score = max(score or 0, len(signatureDict))
+
+    return score
+
+
+def _rank_mappers(nansatMappers, fileInfo):
+    ''' Select importable mappers which match the file and sort them
+
+    User-defined mappers (from nansat_mappers) keep their original order and
+    come first, so that they can override built-in mappers. Built-in mappers
+    with more matching tests in the signature come next, built-in mappers
+    without signature follow in the original order, mapper_generic is last
+
+    Parameters
+    -----------
+    nansatMappers : OrderedDict
+        mapper names and classes (or import errors) or MapperEntry objects
+    fileInfo : dict
+        properties of the file from _get_file_info
+
+    Returns
+    --------
+    candidates : list
+        names of mappers to try
+
+    '''
+    import nansat.mappers
+    builtinMappers = set(name for finder, name, ispkg
+                         in pkgutil.iter_modules(nansat.mappers.__path__))
+
+    scores = OrderedDict()
+    for mapperName in nansatMappers:
+        mapper = nansatMappers[mapperName]
+        if isinstance(mapper, tuple):
+            continue
+        score = _match_signature(getattr(mapper, 'signature', None), fileInfo)
+        if score is not None:
+            scores[mapperName] = score
+
+    def rank(mapperName):
+        ''' Sorting key: generic last, user-defined first, best score first '''
+        isBuiltin = mapperName in builtinMappers
+        return (mapperName == 'mapper_generic', isBuiltin,
+                -scores[mapperName] if isBuiltin else 0)
+
+    return sorted(scores, key=rank)
+
+
+def _get_mappers_packages(logger):
+    ''' Get packages with mappers: user-defined (if any) and built-in '''
+    # import built-in mappers package
     import nansat.mappers
     mappersPackages = [nansat.mappers]
 
-    # import user-defined mappers (if any)
+    # import user-defined mappers package (if any)
     try:
         import nansat_mappers
     except:
@@ -2276,6 +3178,62 @@ def _import_mappers(logLevel=None):
                     % nansat_mappers.__path__)
         mappersPackages = [nansat_mappers, nansat.mappers]
 
+    return mappersPackages
+
+
+def _get_mapper_entries(logLevel=None):
+    ''' Get available mappers from manifests without importing them
+
+    Mapper modules are imported only by MapperEntry.load(), when the mapper
+    is tried. Signatures of mappers are read from the manifest of the
+    package (or from the source code if the manifest is missing or old).
+
+    Returns
+    --------
+    nansatMappers : OrderedDict
+        key  : mapper name
+        value: MapperEntry with signature and method load()
+
+    '''
+    logger = add_logger('import_mappers', logLevel=logLevel)
+    nansatMappers = OrderedDict()
+    for mappersPackage in _get_mappers_packages(logger):
+        logger.debug('From package: %s' % mappersPackage.__path__)
+        for path in mappersPackage.__path__:
+            nansatMappers.update(get_mapper_entries(path))
+
+        # move generic_mapper to the end
+        if 'mapper_generic' in nansatMappers:
+            gm = nansatMappers.pop('mapper_generic')
+            nansatMappers['mapper_generic'] = gm
+
+    return nansatMappers
+
+
+def _get_mapper_class(mapperName):
+    ''' Get class Mapper by name of the mapper (e.g. 'generic') or None '''
+    mapperName = 'mapper_' + mapperName
+    if nansatMappers is None or mapperName not in nansatMappers:
+        return None
+    mapper = nansatMappers[mapperName].load()
+    if isinstance(mapper, tuple):
+        return None
+    return mapper
+
+
+def _import_mappers(logLevel=None):
+    ''' Import available mappers into a dictionary
+
+    Returns
+    --------
+    nansatMappers : dict
+        key  : mapper name
+        value: class Mapper(VRT) from the mapper module
+
+    '''
+    logger = add_logger('import_mappers', logLevel=logLevel)
+    mappersPackages = _get_mappers_packages(logger)
+
     # create ordered dict for mappers
     nansatMappers = OrderedDict()
 
@@ -24,6 +24,9 @@ from scipy import ndimage
 import numpy as np
 
 from nansat.nsr import NSR
+from nansat.tools import register_colormaps
+
+register_colormaps()
 
 
 class Nansatmap(Basemap):
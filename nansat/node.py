@@ -16,8 +16,20 @@
 # but WITHOUT ANY WARRANTY without even the implied warranty of
 # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
 import os
-import re
+import copy
+from io import BytesIO
+from xml.sax.saxutils import escape, quoteattr
 import xml.dom.minidom as xdm
+try:
+    from lxml import etree as ET
+except ImportError:
+    try:
+        import xml.etree.cElementTree as ET
+    except ImportError:
+        import xml.etree.ElementTree as ET
+
+# URI of the namespace with prefix 'xml' (e.g. in xml:lang)
+XML_NAMESPACE = 'http://www.w3.org/XML/1998/namespace'
 
 
 class Node(object):
@@ -63,9 +75,11 @@ class Node(object):
     specific language' by subclassing Node to create Node types
     specific to your problem domain.
 
-    This implementation uses xml.dom.minidom which is available
-    in the standard Python 2.4 library. However, it can be
-    retargeted to use other XML libraries without much effort.
+    This implementation uses lxml (if available) or cElementTree from
+    the standard library for parsing. The XML is written by Node itself.
+    dom() still creates xml.dom.minidom objects for compatibility.
+    Namespace prefixes are kept in tags and attribute names as in the
+    original XML (e.g. 'safe:startTime').
 
     '''
 
@@ -232,11 +246,9 @@ class Node(object):
 
     def insert(self, contents):
         ''' return Node of the node with inserted <contents>'''
-        dom2 = xdm.parseString(contents)
-        dom1 = xdm.parseString(self.dom().toxml())
-        dom1.childNodes[0].appendChild(dom1.importNode(dom2.childNodes[0],
-                                                       True))
-        return Node.create(dom1)
+        node = copy.deepcopy(self)
+        node += Node.create(contents)
+        return node
 
     def __getitem__(self, tag):
         '''
@@ -308,32 +320,150 @@ class Node(object):
                 element.appendChild(child.dom())  # Generate children as well
         return element
 
+    def _write(self, parts, separator=None, indent=''):
+        ''' Append XML representation of this node to the list <parts> '''
+        parts.append(indent + '<' + self.tag)
+        for key, val in sorted(self.attributes.items()):
+            parts.append(' %s=%s' % (key, quoteattr(val)))
+        newLine = ''
+        if separator is not None:
+            newLine = '\n'
+        if self.value:
+            assert not self.children, ('cannot have value and children: %s'
+                                       % str(self))
+            parts.append('>%s</%s>%s' % (escape(self.value), self.tag,
+                                          newLine))
+        elif self.children:
+            parts.append('>' + newLine)
+            for child in self.children:
+                if separator is None:
+                    child._write(parts)
+                else:
+                    child._write(parts, separator, indent + separator)
+            parts.append('%s</%s>%s' % (indent, self.tag, newLine))
+        else:
+            parts.append('/>' + newLine)
+
+    def _join(self, parts):
+        ''' Join list of strings into XML string '''
+        xml = ''.join(parts)
+        if not isinstance(xml, str):
+            # unicode in Python 2
+            xml = xml.encode('utf-8')
+        return xml
+
     def xml(self, separator='  '):
-        return self.dom().toprettyxml(separator)
+        ''' Get formatted XML of this node (without XML declaration) '''
+        parts = []
+        self._write(parts, separator)
+        return self._join(parts)
 
     def rawxml(self):
-        return str(self.dom().toxml())
+        ''' Get XML of this node in one line (without XML declaration, as
+        toxml() of the minidom element returned by dom()) '''
+        parts = []
+        self._write(parts)
+        return self._join(parts)
 
     @staticmethod
     def create(dom):
         '''
         Create a Node representation, given either
-        a string representation of an XML doc, or a dom.
+        a string representation of an XML doc, a file name,
+        an ElementTree element or a dom.
 
         '''
         if isinstance(dom, str):
             if os.path.exists(dom):
                 # parse input file
-                dom = xdm.parse(dom)
+                with open(dom, 'rb') as xmlFile:
+                    return Node._parse(xmlFile)
             else:
-                # Strip all extraneous whitespace so that
+                # Strip all extraneous whitespace in values so that
                 # text input is handled consistently:
-                dom = re.sub('\s+', ' ', dom)
-                dom = dom.replace('> ', '>')
-                dom = dom.replace(' <', '<')
-                return Node.create(xdm.parseString(dom))
+                if not isinstance(dom, bytes):
+                    dom = dom.encode('utf-8')
+                return Node._parse(BytesIO(dom), normalize=True)
+        if hasattr(dom, 'nodeType'):
+            return Node._create_from_dom(dom)
+        return Node._create_from_element(dom)
+
+    @staticmethod
+    def _parse(source, normalize=False):
+        '''
+        Create a Node representation from a file object with XML.
+        Namespace prefixes are restored in tags and attribute names.
+
+        '''
+        # prefixes of namespaces in scope of each open element
+        scopes = [{XML_NAMESPACE: 'xml'}]
+        namespaces = []
+        nodes = []
+        root = None
+        for event, item in ET.iterparse(source, events=('start-ns', 'start',
+                                                        'end')):
+            if event == 'start-ns':
+                namespaces.append(item)
+            elif event == 'start':
+                prefixes = scopes[-1]
+                if namespaces:
+                    # namespaces declared in this element are in scope of
+                    # this element and its children only
+                    prefixes = dict(prefixes)
+                    for prefix, uri in namespaces:
+                        prefixes[uri] = prefix
+                scopes.append(prefixes)
+                node = Node(_get_qname(item.tag, prefixes))
+                for name, val in item.attrib.items():
+                    node.setAttribute(_get_qname(name, prefixes), val)
+                # namespaces declared in this element
+                for prefix, uri in namespaces:
+                    if prefix:
+                        node.setAttribute('xmlns:' + prefix, uri)
+                    else:
+                        node.setAttribute('xmlns', uri)
+                namespaces = []
+                if nodes:
+                    nodes[-1] += node
+                else:
+                    root = node
+                nodes.append(node)
+            else:
+                scopes.pop()
+                node = nodes.pop()
+                if item.text and item.text.strip():
+                    if normalize:
+                        node.value = ' '.join(item.text.split())
+                    else:
+                        node.value = item.text
+                # free memory
+                item.clear()
+        return root
+
+    @staticmethod
+    def _create_from_element(element):
+        '''
+        Create a Node representation, given an ElementTree element.
+
+        '''
+        node = Node(element.tag.split('}')[-1])
+        for name, val in element.attrib.items():
+            node.setAttribute(name.split('}')[-1], val)
+        if element.text and element.text.strip():
+            node.value = element.text
+        for child in element:
+            if isinstance(child.tag, str):
+                node += Node._create_from_element(child)
+        return node
+
+    @staticmethod
+    def _create_from_dom(dom):
+        '''
+        Create a Node representation, given a dom.
+
+        '''
         if dom.nodeType == dom.DOCUMENT_NODE:
-            return Node.create(dom.childNodes[0])
+            return Node._create_from_dom(dom.childNodes[0])
         if dom.nodeName == '#text':
             return
         node = Node(dom.nodeName)
@@ -344,7 +474,18 @@ class Node(object):
             if n.nodeType == n.TEXT_NODE and n.wholeText.strip():
                 node.value = n.wholeText
             else:
-                subnode = Node.create(n)
+                subnode = Node._create_from_dom(n)
                 if subnode:
                     node += subnode
         return node
+
+
+def _get_qname(name, prefixes):
+    ''' Convert ElementTree name '{uri}local' into 'prefix:local' '''
+    if not name.startswith('{'):
+        return name
+    uri, localName = name[1:].split('}', 1)
+    prefix = prefixes.get(uri)
+    if prefix:
+        return prefix + ':' + localName
+    return localName
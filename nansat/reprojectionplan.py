@@ -0,0 +1,413 @@
+# Name:    reprojectionplan.py
+# Purpose: Precomputed mapping of destination pixels to source pixels
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from nansat.nansat import Nansat
+from nansat.tools import OptionError
+
+# reprojection algorithms of the plan and corresponding GDALResampleAlg
+PLAN_RESAMPLING = {'nearest': 0, 'bilinear': 1}
+
+
+class ReprojectionPlan(object):
+    '''Mapping of destination pixels to source pixels for fast reprojection
+
+    Nansat.reproject() creates a warped VRT and GDAL computes the
+    coordinate transformation for each block at each read. The plan computes
+    the transformation once: source column and row of each destination
+    pixel. Then any number of bands from any number of files with the same
+    geometry (e.g. fixed-grid products) is reprojected by a numpy lookup
+    (nearest neighbour) or bilinear interpolation.
+
+    The mapping is computed by Nansat.reproject() (with all its options)
+    applied to bands with pixel/line coordinates of the source, therefore
+    the plan reproduces Nansat.reproject() (exactly for nearest neighbour).
+    Computing the plan needs 4 (nearest) or 8 (bilinear) bytes per source
+    pixel. The plan stores only valid destination pixels: indices (int32)
+    of destination and source pixels or source coordinates (float32).
+
+    Examples
+    --------
+    plan = ReprojectionPlan(n, dstDomain)
+    # or get_plan(n, dstDomain) to reuse plans for the same geometries
+    sst = plan.apply(n['sst'])
+    # reproject one array
+    n2 = plan.reproject(Nansat(otherFileName))
+    # create Nansat object with reprojected bands from another file
+    plan.save('plan.npz')
+    plan = ReprojectionPlan.load('plan.npz')
+
+    '''
+    def __init__(self, n, dstDomain, resampling='nearest', **kwargs):
+        '''Compute plan for reprojection of source to destination
+
+        Parameters
+        -----------
+        n : Nansat
+            source object (is not changed)
+        dstDomain : Domain
+            destination Domain
+        resampling : str
+            'nearest' or 'bilinear'
+        kwargs : arguments of Nansat.reproject (e.g. tps, skip_gcps,
+            use_gcps, blockSize)
+
+        '''
+        if resampling not in PLAN_RESAMPLING:
+            raise OptionError('Unknown resampling %s! Use one of %s'
+                              % (resampling, sorted(PLAN_RESAMPLING)))
+        self.resampling = resampling
+        self.srcShape = n.shape()
+        self.dstShape = dstDomain.shape()
+        self.dstDomain = dstDomain
+
+        # add bands with coordinates of source pixels and reproject them
+        coords = n._get_copy()
+        srcRows, srcCols = self.srcShape
+        if resampling == 'nearest':
+            # flat index + 1 (0 is outside of the source)
+            index = np.arange(1, srcRows * srcCols + 1, dtype='int32')
+            coords.add_band(index.reshape(self.srcShape),
+                            {'name': 'plan_index'})
+            bandNames = ['plan_index']
+        else:
+            # coordinates of pixel centers (0 is outside of the source)
+            cols = np.empty(self.srcShape, 'float32')
+            cols[:] = np.arange(srcCols, dtype='float32') + 0.5
+            rows = np.empty(self.srcShape, 'float32')
+            rows[:] = (np.arange(srcRows, dtype='float32') + 0.5)[:, None]
+            coords.add_bands([cols, rows], [{'name': 'plan_col'},
+                                            {'name': 'plan_row'}])
+            bandNames = ['plan_col', 'plan_row']
+        coords.reproject(dstDomain, eResampleAlg=PLAN_RESAMPLING[resampling],
+                         **kwargs)
+        dstCoords = coords.read_bands(bandNames)
+        coords = None
+
+        # keep only valid destination pixels
+        dstValid = dstCoords[0].ravel() > 0
+        if resampling == 'bilinear':
+            dstValid &= np.isfinite(dstCoords[0].ravel())
+        self.dstIndex = np.nonzero(dstValid)[0].astype('int32')
+        if resampling == 'nearest':
+            self.srcIndex = (dstCoords[0].ravel()[self.dstIndex] -
+                             1).astype('int32')
+        else:
+            self.srcCols = dstCoords[0].ravel()[self.dstIndex] - 0.5
+            self.srcRows = dstCoords[1].ravel()[self.dstIndex] - 0.5
+
+    def __repr__(self):
+        return ('ReprojectionPlan: %s, %s -> %s, %d valid pixels'
+                % (self.resampling, self.srcShape, self.dstShape,
+                   self.dstIndex.size))
+
+    def apply(self, array, fillValue=None):
+        '''Reproject array(s) with the plan
+
+        Parameters
+        -----------
+        array : NumPy array
+            2D array with source shape or 3D array (bands, rows, columns)
+        fillValue : number
+            value of destination pixels outside of the source. Default is
+            np.nan for float arrays and 0 otherwise
+
+        Returns
+        --------
+        dstArray : NumPy array
+            2D or 3D array with destination shape. Nearest neighbour keeps
+            data type, bilinear interpolation returns float arrays
+
+        '''
+        array = np.asarray(array)
+        if array.shape[-2:] != tuple(self.srcShape):
+            raise OptionError('Shape of array %s does not match source %s'
+                              % (array.shape, self.srcShape))
+        srcData = array.reshape(-1, self.srcShape[0] * self.srcShape[1])
+
+        if self.resampling == 'nearest':
+            dstData = srcData[:, self.srcIndex]
+        else:
+            dstData = self._interpolate(srcData)
+
+        if fillValue is None:
+            if dstData.dtype.char in np.typecodes['AllFloat']:
+                fillValue = np.nan
+            else:
+                fillValue = 0
+        dstArray = np.empty((srcData.shape[0],
+                             self.dstShape[0] * self.dstShape[1]),
+                            dstData.dtype)
+        dstArray.fill(fillValue)
+        dstArray[:, self.dstIndex] = dstData
+
+        return dstArray.reshape(array.shape[:-2] + tuple(self.dstShape))
+
+    def _interpolate(self, srcData):
+        '''Bilinear interpolation of flattened source data
+
+        Parameters
+        -----------
+        srcData : 2D NumPy array
+            (bands, rows * columns)
+
+        Returns
+        --------
+        dstData : 2D NumPy array
+            (bands, valid destination pixels)
+
+        '''
+        srcRows, srcCols = self.srcShape
+        # coordinates of the upper left neighbour (clipped at the edges)
+        col0 = np.clip(np.floor(self.srcCols), 0, max(srcCols - 2, 0))
+        row0 = np.clip(np.floor(self.srcRows), 0, max(srcRows - 2, 0))
+        wCol = np.clip(self.srcCols - col0, 0, 1)[None]
+        wRow = np.clip(self.srcRows - row0, 0, 1)[None]
+        col0 = col0.astype('int32')
+        row0 = row0.astype('int32')
+        col1 = np.minimum(col0 + 1, srcCols - 1)
+        row1 = np.minimum(row0 + 1, srcRows - 1)
+
+        dtype = np.result_type(srcData.dtype, np.float32)
+        srcData = srcData.astype(dtype, copy=False)
+        return ((srcData[:, row0 * srcCols + col0] * (1 - wCol) +
+                 srcData[:, row0 * srcCols + col1] * wCol) * (1 - wRow) +
+                (srcData[:, row1 * srcCols + col0] * (1 - wCol) +
+                 srcData[:, row1 * srcCols + col1] * wCol) * wRow)
+
+    def read_bands(self, n, bands, fillValue=None):
+        '''Read bands from Nansat object and reproject them
+
+        Parameters
+        -----------
+        n : Nansat
+            source object with the same geometry as the source of the plan
+        bands : list
+            band numbers or names
+        fillValue : number
+            see apply()
+
+        Returns
+        --------
+        dstArray : 3D NumPy array
+            (bands, rows, columns) of destination
+
+        '''
+        if n.shape() != tuple(self.srcShape):
+            raise OptionError('Shape of Nansat %s does not match source %s'
+                              % (n.shape(), self.srcShape))
+        return self.apply(n.read_bands(bands), fillValue)
+
+    def reproject(self, n, bands=None):
+        '''Create Nansat object with reprojected bands
+
+        Parameters
+        -----------
+        n : Nansat
+            source object with the same geometry as the source of the plan
+        bands : list
+            band numbers or names. If None, all bands are reprojected
+
+        Returns
+        --------
+        dstNansat : Nansat
+            object with destination Domain and reprojected bands (in memory)
+
+        '''
+        if bands is None:
+            bands = range(1, n.vrt.dataset.RasterCount + 1)
+        bandsMeta = n.bands()
+        bandNumbers = [n._get_band_number(band) for band in bands]
+        dstArrays = self.read_bands(n, bandNumbers)
+
+        dstNansat = Nansat(domain=self.dstDomain)
+        dstNansat.add_bands(list(dstArrays),
+                            [_get_band_parameters(bandsMeta[bandNumber])
+                             for bandNumber in bandNumbers])
+        return dstNansat
+
+    def save(self, fileName):
+        '''Save plan into NumPy file (.npz)
+
+        Destination Domain is not saved, it should be given to load() for
+        using reproject()
+
+        Parameters
+        -----------
+        fileName : str
+            name of the output file
+
+        '''
+        arrays = {'resampling': np.array(self.resampling),
+                  'srcShape': np.array(self.srcShape),
+                  'dstShape': np.array(self.dstShape),
+                  'dstIndex': self.dstIndex}
+        if self.resampling == 'nearest':
+            arrays['srcIndex'] = self.srcIndex
+        else:
+            arrays['srcCols'] = self.srcCols
+            arrays['srcRows'] = self.srcRows
+        with open(fileName, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+
+    @staticmethod
+    def load(fileName, dstDomain=None):
+        '''Load plan saved by save()
+
+        Parameters
+        -----------
+        fileName : str
+            name of the input file
+        dstDomain : Domain
+            destination Domain (needed only for reproject())
+
+        Returns
+        --------
+        plan : ReprojectionPlan
+
+        '''
+        plan = ReprojectionPlan.__new__(ReprojectionPlan)
+        arrays = np.load(fileName)
+        plan.resampling = str(arrays['resampling'])
+        plan.srcShape = tuple(int(i) for i in arrays['srcShape'])
+        plan.dstShape = tuple(int(i) for i in arrays['dstShape'])
+        plan.dstIndex = arrays['dstIndex']
+        if plan.resampling == 'nearest':
+            plan.srcIndex = arrays['srcIndex']
+        else:
+            plan.srcCols = arrays['srcCols']
+            plan.srcRows = arrays['srcRows']
+        arrays.close()
+        plan.dstDomain = dstDomain
+        if dstDomain is not None and dstDomain.shape() != plan.dstShape:
+            raise OptionError('Shape of Domain %s does not match plan %s'
+                              % (dstDomain.shape(), plan.dstShape))
+        return plan
+
+
+class PlanCache(object):
+    '''Cache of reprojection plans with keys (source geometry, destination
+    geometry, resampling, options)
+
+    Geometry is size, GeoTransform, projection, GCPs and geolocation
+    metadata of the VRT dataset. Geolocation arrays are compared by the
+    names of their VRT files, therefore plans of objects with geolocation
+    arrays are reused only for the same object.
+
+    '''
+    hits = 0
+    misses = 0
+
+    def __init__(self, maxPlans=8):
+        '''Create empty cache
+
+        Parameters
+        -----------
+        maxPlans : int
+            maximum number of stored plans (least recently used are removed)
+
+        '''
+        self.maxPlans = maxPlans
+        self.plans = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return ('PlanCache: %d of %d plans, %d hits, %d misses'
+                % (len(self.plans), self.maxPlans, self.hits, self.misses))
+
+    def get_plan(self, n, dstDomain, resampling='nearest', **kwargs):
+        '''Get plan from cache or compute and store a new plan
+
+        Parameters
+        -----------
+        see ReprojectionPlan
+
+        Returns
+        --------
+        plan : ReprojectionPlan
+
+        '''
+        key = hashlib.sha1(repr((_get_geometry(n.vrt),
+                                 _get_geometry(dstDomain.vrt),
+                                 resampling,
+                                 sorted(kwargs.items())))).hexdigest()
+        with self.lock:
+            plan = self.plans.pop(key, None)
+            if plan is not None:
+                self.plans[key] = plan
+                self.hits += 1
+                return plan
+            self.misses += 1
+
+        plan = ReprojectionPlan(n, dstDomain, resampling, **kwargs)
+        with self.lock:
+            self.plans[key] = plan
+            while len(self.plans) > self.maxPlans:
+                self.plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        '''Remove all plans and reset counters'''
+        with self.lock:
+            self.plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def _get_geometry(vrt):
+    ''' Get tuple with all parameters of geo-reference of VRT '''
+    dataset = vrt.dataset
+    return (dataset.RasterXSize,
+            dataset.RasterYSize,
+            tuple(dataset.GetGeoTransform()),
+            dataset.GetProjection(),
+            tuple((gcp.GCPPixel, gcp.GCPLine, gcp.GCPX, gcp.GCPY)
+                  for gcp in dataset.GetGCPs()),
+            dataset.GetGCPProjection(),
+            sorted((dataset.GetMetadata('GEOLOCATION') or {}).items()),
+            dataset.GetMetadataItem('skip_gcps'),
+            bool(vrt.tps))
+
+
+def _get_band_parameters(bandMetadata):
+    ''' Get metadata of band without keys describing sources '''
+    return dict((key, value) for key, value in bandMetadata.items()
+                if key not in ['SourceFilename', 'SourceBand', 'expression'])
+
+
+# plans shared by all Nansat objects in the process (see get_plan)
+planCache = PlanCache()
+
+
+def get_plan(n, dstDomain, resampling='nearest', **kwargs):
+    '''Get reprojection plan for the geometries of source and destination
+
+    Plans are computed once and reused (see PlanCache)
+
+    Parameters
+    -----------
+    see ReprojectionPlan
+
+    Returns
+    --------
+    plan : ReprojectionPlan
+
+    '''
+    return planCache.get_plan(n, dstDomain, resampling, **kwargs)
@@ -0,0 +1,90 @@
+#------------------------------------------------------------------------------
+# Name:         test_aio.py
+# Purpose:      Test the awaitable API
+#
+# Author:       Anton Korosov
+#
+# Created:      18.10.2016
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import os
+import threading
+
+import numpy as np
+
+from nansat import Nansat, Domain
+from nansat import aio
+from nansat.tools import ExecutorBusyError
+
+import nansat_test_data as ntd
+
+
+@unittest.skipIf(aio.ThreadPoolExecutor is None,
+                 'concurrent.futures is not available')
+class AioTest(unittest.TestCase):
+    def setUp(self):
+        self.test_file_gcps = os.path.join(ntd.test_data_path, 'gcps.tif')
+        self.executor = aio.BoundedExecutor(maxWorkers=4, maxPending=20)
+        if aio.asyncio is not None:
+            self.loop = aio.asyncio.new_event_loop()
+            aio.asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.executor.shutdown()
+        if aio.asyncio is not None:
+            self.loop.close()
+
+    def _get_results(self, futures):
+        ''' Wait for asyncio (or concurrent) futures and return results '''
+        if aio.asyncio is None:
+            return [future.result() for future in futures]
+        return self.loop.run_until_complete(aio.asyncio.gather(*futures))
+
+    def test_open_and_read_window(self):
+        n0 = Nansat(self.test_file_gcps, logLevel=40)
+        n, = self._get_results([aio.open_nansat(self.test_file_gcps,
+                                                executor=self.executor,
+                                                logLevel=40)])
+        futures = [aio.read_window(n, band, (5, 10, 20, 15),
+                                   executor=self.executor)
+                   for band in [1, 'L_555', 3] * 5]
+        arrays = self._get_results(futures)
+
+        self.assertEqual(n.shape(), n0.shape())
+        self.assertEqual(len(arrays), 15)
+        np.testing.assert_array_equal(arrays[1], n0['L_555'][10:25, 5:25])
+        np.testing.assert_array_equal(arrays[-1], n0[3][10:25, 5:25])
+
+    def test_reproject_and_read(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 50 40")
+        data, = self._get_results([aio.reproject_and_read(
+                                            n, d, [1, 2],
+                                            executor=self.executor)])
+
+        self.assertEqual(data.shape, (2, 40, 50))
+        self.assertEqual(n.shape(), (200, 200))
+
+    def test_executor_busy(self):
+        event = threading.Event()
+        executor = aio.BoundedExecutor(maxWorkers=1, maxPending=2)
+        try:
+            executor.submit(event.wait)
+            future = executor.submit(event.wait)
+            self.assertRaises(ExecutorBusyError, executor.submit, event.wait)
+            # cancelled task does not block the executor
+            self.assertTrue(future.cancel())
+            executor.submit(event.wait)
+        finally:
+            event.set()
+            executor.shutdown()
+
+        self.assertEqual(executor.pending, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
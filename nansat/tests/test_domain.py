@@ -82,6 +82,35 @@ class DomainTest(unittest.TestCase):
         self.assertEqual(type(lat), np.ndarray)
         self.assertEqual(lat.shape, (500, 500))
 
+    def test_get_geolocation_grids_fast_projected(self):
+        for srs in [4326, '+proj=stere +lat_0=90 +lon_0=0 +datum=WGS84']:
+            d = Domain(srs, "-lle 25 70 35 72 -ts 500 400")
+            lon0, lat0 = d.get_geolocation_grids()
+            lon1, lat1 = d.get_geolocation_grids(fast=True)
+
+            self.assertEqual(lon1.shape, (400, 500))
+            np.testing.assert_allclose(lon1, lon0, atol=1e-6)
+            np.testing.assert_allclose(lat1, lat0, atol=1e-6)
+
+    def test_get_geolocation_grids_fast_gcps(self):
+        d = Domain(ds=gdal.Open(self.test_file))
+        lon0, lat0 = d.get_geolocation_grids()
+        lon1, lat1 = d.get_geolocation_grids(fast=True, maxError=0.0001)
+
+        self.assertEqual(lon1.shape, lon0.shape)
+        np.testing.assert_allclose(lon1, lon0, atol=0.001)
+        np.testing.assert_allclose(lat1, lat0, atol=0.001)
+
+    def test_get_geolocation_grids_window_dtype(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
+        lon0, lat0 = d.get_geolocation_grids()
+        lon1, lat1 = d.get_geolocation_grids(dtype='float32',
+                                             window=(10, 20, 100, 50))
+
+        self.assertEqual(lon1.dtype, np.float32)
+        self.assertEqual(lat1.shape, (50, 100))
+        np.testing.assert_allclose(lat1, lat0[20:70, 10:110], rtol=1e-6)
+
     def test_get_border(self):
         d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
         lon, lat = d.get_border()
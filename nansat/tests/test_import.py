@@ -0,0 +1,63 @@
+#------------------------------------------------------------------------------
+# Name:         test_import.py
+# Purpose:      Test import of the nansat package
+#
+# Author:       Anton Korosov
+#
+# Created:      18.10.2016
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import sys
+import subprocess
+
+# modules which should not be imported by import nansat
+HEAVY_MODULES = ['matplotlib', 'matplotlib.pyplot', 'mpl_toolkits.basemap',
+                 'PIL', 'Image', 'scipy.io', 'scipy.stats', 'scipy.ndimage',
+                 'nansat.figure', 'nansat.nansatmap', 'nansat.pointbrowser',
+                 'nansat.nansatshape', 'nansat.mosaic']
+
+
+def _run_python(code):
+    ''' Run code in a new Python process and return the printed output '''
+    return subprocess.check_output([sys.executable, '-c', code]).strip()
+
+
+class ImportTest(unittest.TestCase):
+    def test_import_nansat_is_light(self):
+        ''' import nansat does not import GUI, plotting or scipy modules '''
+        output = _run_python('import sys\n'
+                             'import nansat\n'
+                             'print("imported: " + ",".join(m for m in %s '
+                             'if m in sys.modules))' % repr(HEAVY_MODULES))
+        importedModules = output.splitlines()[-1]
+
+        self.assertEqual(importedModules.strip(), 'imported:')
+
+    def test_lazy_attributes(self):
+        ''' Figure, Nansatmap, Mosaic and plt are imported at first access '''
+        output = _run_python('import sys\n'
+                             'import nansat\n'
+                             'from nansat import Figure, Mosaic\n'
+                             'print(Figure.__module__)\n'
+                             'print(nansat.Mosaic is Mosaic)\n'
+                             'print("nansat.figure" in sys.modules)')
+
+        self.assertEqual(output.splitlines()[-3:],
+                         ['nansat.figure', 'True', 'True'])
+
+    def test_register_colormaps(self):
+        from matplotlib import cm
+        from nansat.tools import register_colormaps
+        register_colormaps()
+        register_colormaps()
+
+        self.assertEqual(cm.get_cmap('obpg').name, 'obpg')
+        self.assertEqual(cm.get_cmap('ak01').name, 'ak01')
+
+
+if __name__ == "__main__":
+    unittest.main()
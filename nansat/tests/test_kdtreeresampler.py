@@ -0,0 +1,87 @@
+#------------------------------------------------------------------------------
+# Name:         test_kdtreeresampler.py
+# Purpose:      Test the KDTreeResampler class
+#
+# Author:       Anton Korosov
+#
+# Created:      18.10.2016
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+
+import numpy as np
+
+from nansat.kdtreeresampler import KDTreeResampler
+from nansat.tools import OptionError
+
+
+class KDTreeResamplerTest(unittest.TestCase):
+    def setUp(self):
+        # curved swath and regular grid covering part of it
+        rows, cols = np.mgrid[0:50, 0:40]
+        self.srcLon = 10 + cols * 0.01 + rows * 0.001
+        self.srcLat = 60 - rows * 0.01
+        self.dstLon, self.dstLat = np.meshgrid(np.linspace(9.9, 10.5, 30),
+                                               np.linspace(59.4, 60.05, 25))
+        self.data = np.random.randn(50, 40).astype('float32')
+
+    def test_nearest_same_grid(self):
+        resampler = KDTreeResampler(self.srcLon, self.srcLat,
+                                    self.srcLon, self.srcLat)
+        rows = np.mgrid[0:50, 0:40][0]
+
+        np.testing.assert_array_equal(resampler.apply(rows), rows)
+        np.testing.assert_array_equal(resampler.apply(self.data), self.data)
+
+    def test_kernels(self):
+        for kernel in ['nearest', 'idw', 'gaussian']:
+            resampler = KDTreeResampler(self.srcLon, self.srcLat,
+                                        self.dstLon, self.dstLat, kernel)
+            a = resampler.apply(self.data)
+
+            self.assertEqual(a.shape, (25, 30))
+            self.assertEqual(a.dtype, np.float32)
+            self.assertTrue(np.any(np.isnan(a)))
+            self.assertTrue(np.any(np.isfinite(a)))
+
+    def test_apply_3d(self):
+        resampler = KDTreeResampler(self.srcLon, self.srcLat,
+                                    self.dstLon, self.dstLat, 'idw')
+        a = resampler.apply(np.array([self.data, self.data * 2]))
+
+        self.assertEqual(a.shape, (2, 25, 30))
+        np.testing.assert_allclose(a[1], resampler.apply(self.data) * 2,
+                                   rtol=1e-5)
+
+    def test_nan_source_ignored(self):
+        self.data[20:30, 10:20] = np.nan
+        resampler = KDTreeResampler(self.srcLon, self.srcLat,
+                                    self.srcLon, self.srcLat, 'gaussian')
+        a = resampler.apply(self.data)
+
+        self.assertTrue(np.all(np.isfinite(a[22:28, 13:17]) == False))
+        self.assertTrue(np.isfinite(a[20, 10]))
+
+    def test_radius(self):
+        resampler = KDTreeResampler(self.srcLon, self.srcLat,
+                                    self.dstLon + 1, self.dstLat,
+                                    radius=1000)
+        a = resampler.apply(self.data)
+
+        self.assertTrue(np.all(np.isnan(a)))
+
+    def test_wrong_input(self):
+        with self.assertRaises(OptionError):
+            KDTreeResampler(self.srcLon, self.srcLat,
+                            self.dstLon, self.dstLat, 'cubic')
+        resampler = KDTreeResampler(self.srcLon, self.srcLat,
+                                    self.dstLon, self.dstLat)
+        with self.assertRaises(OptionError):
+            resampler.apply(np.zeros((10, 10)))
+
+
+if __name__ == "__main__":
+    unittest.main()
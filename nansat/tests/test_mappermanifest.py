@@ -0,0 +1,94 @@
+#------------------------------------------------------------------------------
+# Name:         test_mappermanifest.py
+# Purpose:      Test the manifest of mappers
+#
+# Author:       Anton Korosov
+#
+# Created:      18.10.2016
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import os
+import sys
+import ast
+import shutil
+import tempfile
+
+import nansat.mappers
+from nansat.mappermanifest import (scan_mappers, read_manifest,
+                                   write_manifest, get_mapper_entries,
+                                   MapperEntry)
+
+
+class MapperManifestTest(unittest.TestCase):
+    def setUp(self):
+        self.mappersDir = nansat.mappers.__path__[0]
+        self.tmpDir = tempfile.mkdtemp()
+        with open(os.path.join(self.tmpDir, 'mapper_fake_manifest.py'),
+                  'w') as f:
+            f.write("class Mapper(object):\n"
+                    "    signature = {'ext': ['.fake'], 'magic': [b'FAKE']}\n")
+        with open(os.path.join(self.tmpDir, 'fake_helper.py'), 'w') as f:
+            f.write("class Helper(object):\n    pass\n")
+        with open(os.path.join(self.tmpDir, 'mapper_fake_broken.py'),
+                  'w') as f:
+            f.write("import nansat_fake_missing_module\n\n\n"
+                    "class Mapper(object):\n    pass\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+        sys.modules.pop('mapper_fake_manifest', None)
+
+    def test_manifest_is_up_to_date(self):
+        ''' nansat/mappers/manifest.json matches the mapper modules '''
+        manifest = read_manifest(self.mappersDir)
+        scanned = scan_mappers(self.mappersDir)
+
+        self.assertTrue(manifest is not None)
+        self.assertEqual([m['name'] for m in manifest['mappers']],
+                         [m['name'] for m in scanned['mappers']])
+        for m0, m1 in zip(manifest['mappers'], scanned['mappers']):
+            self.assertEqual(ast.literal_eval(m0['signature']),
+                             ast.literal_eval(m1['signature']))
+
+    def test_scan_mappers(self):
+        manifest = scan_mappers(self.tmpDir)
+
+        self.assertEqual(sorted(manifest['modules']),
+                         ['fake_helper', 'mapper_fake_broken',
+                          'mapper_fake_manifest'])
+        self.assertEqual(sorted(m['name'] for m in manifest['mappers']),
+                         ['mapper_fake_broken', 'mapper_fake_manifest'])
+
+    def test_read_manifest_missing_or_old(self):
+        self.assertEqual(read_manifest(self.tmpDir), None)
+        write_manifest(self.tmpDir)
+        self.assertTrue(read_manifest(self.tmpDir) is not None)
+        with open(os.path.join(self.tmpDir, 'mapper_fake_new.py'), 'w') as f:
+            f.write("class Mapper(object):\n    pass\n")
+        self.assertEqual(read_manifest(self.tmpDir), None)
+
+    def test_get_mapper_entries_lazy(self):
+        ''' Mapper modules are imported only by MapperEntry.load '''
+        entries = get_mapper_entries(self.tmpDir)
+        entry = entries['mapper_fake_manifest']
+
+        self.assertTrue(isinstance(entry, MapperEntry))
+        self.assertEqual(entry.signature['ext'], ['.fake'])
+        self.assertFalse('mapper_fake_manifest' in sys.modules)
+        self.assertEqual(entry.load().__name__, 'Mapper')
+        self.assertTrue('mapper_fake_manifest' in sys.modules)
+        self.assertTrue(entry.load() is entry.load())
+
+    def test_get_mapper_entries_import_error(self):
+        entry = get_mapper_entries(self.tmpDir)['mapper_fake_broken']
+
+        self.assertTrue(isinstance(entry.load(), tuple))
+        self.assertTrue(issubclass(entry.load()[0], ImportError))
+
+
+if __name__ == "__main__":
+    unittest.main()
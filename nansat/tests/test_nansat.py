@@ -17,14 +17,25 @@ import warnings
 import os
 import sys
 import glob
+import shutil
+import tempfile
 from types import ModuleType, FloatType
 import datetime
+import threading
+from collections import OrderedDict
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy.io.netcdf import netcdf_file
 
 from nansat import Nansat, Domain
-from nansat.tools import gdal, OptionError
+from nansat.nansat import (_get_file_info, _match_signature, _rank_mappers,
+                           _import_mappers, _get_mapper_entries,
+                           SIGNATURE_TESTS)
+from nansat.tools import gdal, OptionError, ExpressionError
+from nansat.bandcache import bandCache
+from nansat.mappercache import mapperCache, MapperCache
+from nansat.vrt import VRT, mem_open_enabled
+from nansat.node import Node
 
 import nansat_test_data as ntd
 
@@ -117,6 +128,48 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(n.get_metadata('name', 1), 'band1')
         self.assertEqual(n.get_metadata('name', 2), 'band2')
 
+    def test_add_band_copies_array(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
+        arr = np.random.randn(500, 500)
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr, {'name': 'band1'})
+        arr0 = arr.copy()
+        arr += 1
+
+        self.assertTrue(n.vrt.bandVRTs['band1'].array is None)
+        np.testing.assert_allclose(n['band1'], arr0)
+
+    @unittest.skipUnless(mem_open_enabled(), 'GDAL_MEM_ENABLE_OPEN required')
+    def test_add_band_without_copy(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
+        arr = np.random.randn(500, 500)
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr, {'name': 'band1'}, copy=False)
+        bandVRT = n.vrt.bandVRTs['band1']
+
+        self.assertTrue(np.may_share_memory(bandVRT.array, arr))
+        np.testing.assert_allclose(n['band1'], arr)
+
+    def test_add_band_nomem(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
+        arr = np.random.randn(500, 500).astype('float32')
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr, {'name': 'band1'}, nomem=True)
+        bandVRT = n.vrt.bandVRTs['band1']
+
+        self.assertEqual(type(bandVRT.array), np.memmap)
+        self.assertTrue(os.path.exists(bandVRT.fileName.replace('.vrt',
+                                                                '.raw')))
+        np.testing.assert_allclose(n['band1'], arr)
+
+    def test_add_band_view(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 250 250")
+        arr = np.random.randn(500, 500)
+        n = Nansat(domain=d, logLevel=40)
+        n.add_band(arr[::2, ::2], {'name': 'band1'})
+
+        np.testing.assert_allclose(n['band1'], arr[::2, ::2])
+
     def test_add_subvrts_only_to_one_nansat(self):
         d = Domain(4326, "-te 25 70 35 72 -ts 500 500")
         arr = np.random.randn(500, 500)
@@ -144,6 +197,18 @@ class NansatTest(unittest.TestCase):
 
         self.assertTrue(hb)
 
+    def test_get_band_number_after_set_metadata(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.set_metadata('name', 'L_645_new', bandID='L_645')
+
+        self.assertEqual(n._get_band_number('L_645_new'), 1)
+        self.assertEqual(n._get_band_number({'name': 'L_645_new',
+                                             'wkv': n.get_metadata(
+                                                'wkv', bandID=1)}), 1)
+        self.assertFalse(n.has_band('L_645'))
+        with self.assertRaises(OptionError):
+            n._get_band_number('L_645')
+
     def test_export_gcps_to_netcdf(self):
         ''' Should export file with GCPs and write correct bands'''
         n0 = Nansat(self.test_file_gcps, logLevel=40)
@@ -351,6 +416,293 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(type(b), gdal.Band)
         self.assertEqual(type(arr), np.ndarray)
 
+    def test_getitem_window(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        a = n['L_645', 10:20, 5:15]
+
+        self.assertEqual(a.shape, (10, 10))
+        self.assertTrue(np.all(a == n['L_645'][10:20, 5:15]))
+
+    def test_getitem_window_step_and_index(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        full = n[1]
+
+        self.assertTrue(np.all(n[1, 10:40:3, -20:] == full[10:40:3, -20:]))
+        self.assertTrue(np.all(n[1, ::-2, 7] == full[::-2, 7]))
+        self.assertTrue(np.all(n[1, 5] == full[5]))
+        self.assertRaises(IndexError, n.__getitem__, (1, 10000, 0))
+
+    def test_getitem_expression(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.add_band(np.ones(n.shape(), 'float32'),
+                   {'name': 'expr',
+                    'expression': 'np.sqrt(self["L_645"] / 2.) + bandData'})
+        expected = np.sqrt(n['L_645'] / 2.) + 1
+
+        self.assertTrue(np.allclose(n['expr'], expected))
+        self.assertTrue(np.allclose(n['expr', 10:20, 30:50],
+                                    expected[10:20, 30:50]))
+
+    def test_getitem_expression_not_allowed(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.add_band(np.ones(n.shape(), 'float32'),
+                   {'name': 'expr', 'expression': '__import__("os")'})
+
+        self.assertRaises(ExpressionError, n.__getitem__, 'expr')
+
+    def test_band_cache(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        bandCache.clear()
+        bandCache.set_budget(100 * 1024 ** 2)
+        try:
+            a1 = n['L_645']
+            a1[:] = 0
+            a2 = n['L_645']
+            stats = bandCache.stats()
+            n.resize(0.5)
+            a3 = n['L_645']
+        finally:
+            bandCache.set_budget(0)
+            bandCache.clear()
+
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertTrue(np.any(a2 != 0))
+        self.assertEqual(a3.shape, n.shape())
+
+    def test_mapper_cache(self):
+        cacheDir = tempfile.mkdtemp(dir=ntd.tmp_data_path)
+        mapperCache.set_directory(cacheDir)
+        try:
+            n1 = Nansat(self.test_file_gcps, logLevel=40)
+            n2 = Nansat(self.test_file_gcps, logLevel=40)
+            stats = mapperCache.hits, mapperCache.misses
+        finally:
+            mapperCache.clear()
+            mapperCache.set_directory(None)
+            shutil.rmtree(cacheDir)
+
+        self.assertEqual(stats, (1, 1))
+        self.assertEqual(n2.mapper, n1.mapper)
+        self.assertEqual(n2.vrt.__class__.__name__, 'Mapper')
+        self.assertEqual(n2.bands(), n1.bands())
+        self.assertEqual(n2.vrt.dataset.GetGCPCount(),
+                         n1.vrt.dataset.GetGCPCount())
+        np.testing.assert_allclose(n2['L_645'], n1['L_645'])
+
+    @unittest.skipUnless(mem_open_enabled(), 'GDAL_MEM_ENABLE_OPEN required')
+    def test_mapper_cache_arrays(self):
+        lon, lat = np.meshgrid(np.linspace(25, 30, 50),
+                               np.linspace(70, 72, 40))
+        vrt = VRT(lat=lat, lon=lon)
+        vrt.bandVRTs['band1'] = VRT(array=lat * 2)
+        vrt.bandVRTs['band2'] = VRT(array=lat * 3, copy=False)
+        vrt._create_band({'SourceFilename': vrt.bandVRTs['band1'].fileName},
+                         {'name': 'band1'})
+        vrt._create_band({'SourceFilename': vrt.bandVRTs['band2'].fileName},
+                         {'name': 'band2'})
+        cacheDir = tempfile.mkdtemp(dir=ntd.tmp_data_path)
+        cache = MapperCache(cacheDir)
+        try:
+            key = cache.get_key(self.test_file_gcps)
+            cache.put(key, 'fake', vrt)
+            mapperName, vrt2 = cache.get(key)
+        finally:
+            shutil.rmtree(cacheDir)
+
+        self.assertEqual(mapperName, 'fake')
+        self.assertNotEqual(vrt2.fileName, vrt.fileName)
+        np.testing.assert_allclose(vrt2.dataset.GetRasterBand(1).ReadAsArray(),
+                                   lat * 2)
+        np.testing.assert_allclose(vrt2.dataset.GetRasterBand(2).ReadAsArray(),
+                                   lat * 3)
+        lon2, lat2 = vrt2.geolocationArray.get_geolocation_grids()
+        np.testing.assert_allclose(lon2, lon)
+        np.testing.assert_allclose(lat2, lat)
+
+    def test_mapper_cache_attributes(self):
+        vrt = VRT(array=np.zeros((40, 50)))
+        vrt.bandVRTs['adsVRTs'] = [VRT(array=np.ones((40, 50))),
+                                   VRT(array=np.ones((40, 50)) * 2)]
+        vrt.product = 'ASA_WSM_1P'
+        vrt.dsOffsetDict = {'MDS1': (1, 2)}
+        cacheDir = tempfile.mkdtemp(dir=ntd.tmp_data_path)
+        cache = MapperCache(cacheDir)
+        try:
+            key = cache.get_key(self.test_file_gcps)
+            cache.put(key, 'fake', vrt)
+            mapperName, vrt2 = cache.get(key)
+        finally:
+            shutil.rmtree(cacheDir)
+
+        self.assertEqual(vrt2.product, 'ASA_WSM_1P')
+        self.assertEqual(vrt2.dsOffsetDict, {'MDS1': (1, 2)})
+        adsVRTs = vrt2.bandVRTs['adsVRTs']
+        self.assertEqual(len(adsVRTs), 2)
+        np.testing.assert_allclose(adsVRTs[1].dataset.ReadAsArray(), 2)
+
+    def test_mapper_cache_key_of_directory(self):
+        cacheDir = tempfile.mkdtemp(dir=ntd.tmp_data_path)
+        productDir = tempfile.mkdtemp(dir=ntd.tmp_data_path)
+        cache = MapperCache(cacheDir)
+        try:
+            with open(os.path.join(productDir, 'data.txt'), 'w') as f:
+                f.write('1')
+            key1 = cache.get_key(productDir)
+            with open(os.path.join(productDir, 'data.txt'), 'w') as f:
+                f.write('22')
+            key2 = cache.get_key(productDir)
+        finally:
+            shutil.rmtree(cacheDir)
+            shutil.rmtree(productDir)
+
+        self.assertNotEqual(key1, key2)
+
+    @unittest.skipUnless(mem_open_enabled(), 'GDAL_MEM_ENABLE_OPEN required')
+    def test_mapper_cache_not_cacheable(self):
+        arrayVRT = VRT(array=np.zeros((40, 50)), copy=False)
+        # copy of XML with pointer to memory of array not owned by the VRT
+        memVRT = VRT(srcRasterXSize=50, srcRasterYSize=40)
+        memVRT.write_xml(arrayVRT.read_xml())
+        mapperVRT = VRT(array=np.zeros((40, 50)))
+        mapperVRT.lock = threading.Lock()
+        cacheDir = tempfile.mkdtemp(dir=ntd.tmp_data_path)
+        cache = MapperCache(cacheDir)
+        try:
+            key = cache.get_key(self.test_file_gcps)
+            cache.put(key, 'fake', memVRT)
+            cache.put(key, 'fake', mapperVRT)
+            cached = cache.get(key)
+        finally:
+            shutil.rmtree(cacheDir)
+
+        self.assertTrue(cached is None)
+
+    def test_iter_blocks(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        full = n[1]
+        restored = np.zeros(full.shape, full.dtype)
+        for xOff, yOff, arrays in n.iter_blocks([1, 'L_555'], (40, 30)):
+            self.assertEqual(len(arrays), 2)
+            self.assertTrue(arrays[0].shape[0] <= 30)
+            self.assertTrue(arrays[0].shape[1] <= 40)
+            restored[yOff:yOff + arrays[0].shape[0],
+                     xOff:xOff + arrays[0].shape[1]] = arrays[0]
+
+        self.assertTrue(np.all(restored == full))
+
+    def test_read_bands(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        a = n.read_bands([1, 'L_555', 3])
+
+        self.assertEqual(a.shape, (3,) + n.shape())
+        self.assertTrue(np.all(a[1] == n['L_555']))
+
+    def test_read_bands_window_dtype(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        a = n.read_bands([1, 2], (5, 10, 20, 15), 'float32')
+
+        self.assertEqual(a.shape, (2, 15, 20))
+        self.assertEqual(a.dtype, np.float32)
+        self.assertTrue(np.all(a[0] == n[1][10:25, 5:25]))
+
+    def test_read_bands_threads(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.add_band(np.ones(n.shape(), 'float32'),
+                   {'name': 'expr', 'expression': 'self["L_555"] * 2'})
+        a = n.read_bands([1, 'L_555', 3, 'expr'], (5, 10, 20, 15),
+                         threads=3)
+        b = n.read_bands([1, 'L_555', 3, 'expr'], (5, 10, 20, 15))
+
+        np.testing.assert_array_equal(a, b)
+
+    def test_iter_blocks_threads(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        blocks = list(n.iter_blocks([1, 'L_555'], (40, 30)))
+        blocksThreads = list(n.iter_blocks([1, 'L_555'], (40, 30),
+                                           threads=2))
+
+        self.assertEqual([block[:2] for block in blocksThreads],
+                         [block[:2] for block in blocks])
+        for block, blockThreads in zip(blocks, blocksThreads):
+            np.testing.assert_array_equal(blockThreads[2][0], block[2][0])
+            np.testing.assert_array_equal(blockThreads[2][1], block[2][1])
+
+    def test_iter_blocks_overlap(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        full = n[1]
+        for xOff, yOff, arrays in n.iter_blocks(1, 50, overlap=2):
+            x0, y0 = max(xOff - 2, 0), max(yOff - 2, 0)
+            ySize, xSize = arrays[0].shape
+            self.assertTrue(np.all(arrays[0] ==
+                                   full[y0:y0 + ySize, x0:x0 + xSize]))
+
+    def test_read_decimated(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 200 100")
+        arr = np.random.randn(100, 200).astype('float32')
+        n = Nansat(domain=d, array=arr, parameters={'name': 'band1'},
+                   logLevel=40)
+        n.add_band(np.ones((100, 200), 'float32'),
+                   {'name': 'expr', 'expression': 'self["band1"] * 2'})
+        vrtFileName = n.vrt.fileName
+        a = n.read_decimated('band1', (50, 100))
+        meanArr = arr.reshape(50, 2, 100, 2).mean(axis=3).mean(axis=1)
+
+        self.assertEqual(n.vrt.fileName, vrtFileName)
+        self.assertEqual(n.shape(), (100, 200))
+        np.testing.assert_allclose(a, meanArr, rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(n.read_decimated('expr', (50, 100)),
+                                   meanArr * 2, rtol=1e-5, atol=1e-6)
+        self.assertEqual(n.read_decimated(1, (None, 20), 'nearest').shape,
+                         (10, 20))
+        self.assertEqual(n.read_decimated(1, (5, None), window=(0, 0, 50,
+                                                               50)).shape,
+                         (5, 5))
+        with self.assertRaises(OptionError):
+            n.read_decimated(1, (10, 10), 'wrong')
+
+    def test_read_decimated_fill_value(self):
+        d = Domain(4326, "-te 25 70 35 72 -ts 200 100")
+        arr = np.ones((100, 200), 'float32')
+        arr[:, :15] = -32767
+        n = Nansat(domain=d, array=arr,
+                   parameters={'name': 'band1', '_FillValue': '-32767'},
+                   logLevel=40)
+        a = n.read_decimated('band1', (10, 20))
+
+        self.assertTrue(np.all(np.isnan(a[:, 0])))
+        np.testing.assert_allclose(a[:, 1:], 1)
+
+    def test_to_chunked(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        n.add_band(np.ones(n.shape(), 'float32'),
+                   {'name': 'expr', 'expression': 'self["L_555"] * 2'})
+        c = n.to_chunked([1, 'expr'], chunks=(40, 30))
+        full = n.read_bands([1, 'expr'])
+
+        self.assertEqual(c.shape, full.shape)
+        self.assertEqual(c.dtype, full.dtype)
+        self.assertEqual(sum(c.get_chunks()[1]), full.shape[1])
+        self.assertEqual(max(c.get_chunks()[2]), 30)
+        np.testing.assert_array_equal(np.asarray(c), full)
+        np.testing.assert_array_equal(c[1, 5:25, 10:40:3],
+                                      full[1, 5:25, 10:40:3])
+        np.testing.assert_array_equal(c[:, -1, ::-2], full[:, -1, ::-2])
+
+    def test_to_chunked_graph(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        c = n.to_chunked(['L_555'], chunks=50)
+        graph = c.graph()
+        chunks = c.get_chunks()
+        key = (c.name, 0, len(chunks[1]) - 1, 1)
+        task = graph[key]
+        data = task[0](*task[1:])
+
+        self.assertEqual(len(graph), len(chunks[1]) * len(chunks[2]))
+        self.assertEqual(data.shape, (1, chunks[1][-1], chunks[2][1]))
+        np.testing.assert_array_equal(
+            data[0], n['L_555'][-chunks[1][-1]:, 50:50 + chunks[2][1]])
+
     def test_list_bands_false(self):
         n = Nansat(self.test_file_gcps, logLevel=40)
         lb = n.list_bands(False)
@@ -368,6 +720,60 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(n.shape(), (500, 500))
         self.assertEqual(type(n[1]), np.ndarray)
 
+    def test_reproject_warp_options(self):
+        n1 = Nansat(self.test_file_gcps, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 500 500")
+        n1.reproject(d)
+        n2.reproject(d, numThreads=2, warpMemoryLimit=2**24, maxError=0.125,
+                     optimizeSize=True)
+        xml = n2.vrt.read_xml()
+
+        self.assertTrue('<Option name="NUM_THREADS">2</Option>' in xml)
+        self.assertTrue('<Option name="OPTIMIZE_SIZE">TRUE</Option>' in xml)
+        self.assertTrue('ApproxTransformer' in xml)
+        self.assertFalse('ApproxTransformer' in n1.vrt.read_xml())
+        self.assertEqual(float(Node.create(xml).node('WarpMemoryLimit').value),
+                         2**24)
+        self.assertTrue(np.mean(n1[1] == n2[1]) > 0.99)
+
+    def test_reproject_kdtree(self):
+        n1 = Nansat(self.test_file_gcps, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 300 200")
+        n1.reproject(d)
+        n2.reproject(d, method='kdtree')
+
+        self.assertEqual(n2.shape(), d.shape())
+        self.assertEqual(n2.bands()[1]['name'], n1.bands()[1]['name'])
+        self.assertTrue(np.mean(n1[1] == n2[1]) > 0.9)
+        n2.undo()
+        self.assertEqual(n2.shape(),
+                         Nansat(self.test_file_gcps, logLevel=40).shape())
+
+    def test_reproject_kdtree_gaussian(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 300 200")
+        n.reproject(d, method='kdtree', kernel='gaussian', radius=3000)
+
+        self.assertEqual(n[1].dtype, np.float32)
+        self.assertTrue(np.any(np.isfinite(n[1])))
+        with self.assertRaises(OptionError):
+            n.reproject(d, method='pyresample')
+
+    def test_reproject_kdtree_unknown_option(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 300 200")
+
+        with self.assertRaises(OptionError):
+            n.reproject(d, method='kdtree', radious=5000)
+        with self.assertRaises(OptionError):
+            n.reproject(d, method='kdtree', numThreads=4)
+        with self.assertRaises(OptionError):
+            n.reproject(d, method='kdtree', eResampleAlg=1)
+        with self.assertRaises(OptionError):
+            n.reproject(d, method='kdtree', tps=True)
+
     def test_reproject_stere(self):
         n1 = Nansat(self.test_file_gcps, logLevel=40)
         n2 = Nansat(self.test_file_stere, logLevel=40)
@@ -390,6 +796,17 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(n1.shape(), n2.shape())
         self.assertEqual(type(n1[1]), np.ndarray)
 
+    def test_reproject_gcps_max_gcp_error(self):
+        n1 = Nansat(self.test_file_stere, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40)
+        n1.reproject(n2, tps=True, max_gcp_error=0.5)
+        b1 = n1[1]
+        n1.undo()
+        n1.reproject(n2, tps=True)
+
+        self.assertEqual(n1.shape(), n2.shape())
+        self.assertTrue(np.mean(b1 == n1[1]) > 0.95)
+
     def test_reproject_gcps_resize(self):
         n1 = Nansat(self.test_file_stere, logLevel=40)
         n2 = Nansat(self.test_file_gcps, logLevel=40)
@@ -412,6 +829,17 @@ class NansatTest(unittest.TestCase):
 
         self.assertEqual(shape1, shape2)
 
+    def test_undo_does_not_change_copies(self):
+        n1 = Nansat(self.test_file_stere, logLevel=40)
+        n1.resize(0.5)
+        n2 = n1._get_copy()
+        n1.undo()
+        n1.set_metadata('test', 'value')
+        n2.undo()
+
+        self.assertEqual(n1.get_metadata('test'), 'value')
+        self.assertFalse('test' in n2.get_metadata())
+
     def test_write_figure(self):
         n1 = Nansat(self.test_file_stere, logLevel=40)
         tmpfilename = os.path.join(ntd.tmp_data_path,
@@ -559,6 +987,34 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(ext, (10, 20, 50, 60))
         self.assertEqual(type(n1[1]), np.ndarray)
 
+    def test_optimize_crop(self):
+        n1 = Nansat(self.test_file_gcps, logLevel=40)
+        n1.crop(10, 20, 50, 60)
+        n1.crop(5, 10, 20, 30)
+        n2 = Nansat(self.test_file_gcps, logLevel=40)
+        n2.crop(15, 30, 20, 30)
+
+        nVRTs = n1.optimize()
+
+        self.assertEqual(nVRTs, 1)
+        self.assertTrue(n1.vrt.vrt.vrt is None)
+        self.assertEqual(n1.shape(), (30, 20))
+        np.testing.assert_allclose(n1[1], n2[1])
+
+    def test_optimize_auto_add_band(self):
+        Nansat.autoOptimize = True
+        try:
+            n = Nansat(self.test_file_stere, logLevel=40)
+            arr = np.random.randn(*n.shape())
+            n.add_band(arr, {'name': 'band_a'})
+            n.add_band(arr * 2, {'name': 'band_b'})
+        finally:
+            Nansat.autoOptimize = False
+
+        self.assertTrue(n.vrt.vrt.vrt is None)
+        np.testing.assert_allclose(n['band_a'], arr)
+        np.testing.assert_allclose(n['band_b'], arr * 2)
+
     def test_crop_lonlat_lims(self):
         n1 = Nansat(self.test_file_gcps, logLevel=40)
         st, ext = n1.crop(lonlim=[28, 29], latlim=[70.5, 71])
@@ -568,6 +1024,70 @@ class NansatTest(unittest.TestCase):
         self.assertEqual(ext, (31, 89, 110, 111))
         self.assertEqual(type(n1[1]), np.ndarray)
 
+    def test_match_signature(self):
+        ds = gdal.Open(self.test_file_gcps)
+        fileInfo = _get_file_info(self.test_file_gcps, ds, ds.GetMetadata())
+
+        self.assertEqual(_match_signature(None, fileInfo), 0)
+        self.assertEqual(_match_signature({'ext': ['.tif'],
+                                           'driver': ['GTiff'],
+                                           'magic': [b'II*\x00', b'MM\x00*']},
+                                          fileInfo), 3)
+        self.assertEqual(_match_signature({'ext': ['.tif'],
+                                           'name': '^MOD44W'}, fileInfo),
+                         None)
+        self.assertEqual(_match_signature([{'ext': ['.nc']},
+                                           {'name': '^gcps'}], fileInfo), 1)
+
+    def test_mapper_signatures(self):
+        ''' All mappers have valid signatures, mapper_generic is last '''
+        nansatMappers = _import_mappers()
+        ds = gdal.Open(self.test_file_gcps)
+        fileInfo = _get_file_info(self.test_file_gcps, ds, ds.GetMetadata())
+        for mapperName in nansatMappers:
+            signature = getattr(nansatMappers[mapperName], 'signature', None)
+            if isinstance(signature, dict):
+                signature = [signature]
+            for signatureDict in signature or []:
+                self.assertTrue(set(signatureDict).issubset(SIGNATURE_TESTS))
+        candidates = _rank_mappers(nansatMappers, fileInfo)
+
+        self.assertEqual(candidates[-1], 'mapper_generic')
+        self.assertFalse('mapper_mod44w' in candidates)
+        self.assertFalse('mapper_landsat' in candidates)
+
+    def test_rank_user_mappers_first(self):
+        ''' User-defined mappers are tried before built-in mappers '''
+        ds = gdal.Open(self.test_file_gcps)
+        fileInfo = _get_file_info(self.test_file_gcps, ds, ds.GetMetadata())
+
+        class UserMapper(object):
+            pass
+
+        class BuiltinMapper(object):
+            signature = {'ext': ['.tif'], 'driver': ['GTiff']}
+
+        nansatMappers = OrderedDict([('mapper_user_test', UserMapper),
+                                     ('mapper_landsat', UserMapper),
+                                     ('mapper_obpg_l2', BuiltinMapper),
+                                     ('mapper_generic', UserMapper)])
+
+        self.assertEqual(_rank_mappers(nansatMappers, fileInfo),
+                         ['mapper_user_test', 'mapper_obpg_l2',
+                          'mapper_landsat', 'mapper_generic'])
+
+    def test_mapper_entries(self):
+        ''' Mappers from manifest are ranked as imported mappers '''
+        ds = gdal.Open(self.test_file_gcps)
+        fileInfo = _get_file_info(self.test_file_gcps, ds, ds.GetMetadata())
+        mapperEntries = _get_mapper_entries()
+
+        self.assertEqual(_rank_mappers(mapperEntries, fileInfo),
+                         _rank_mappers(_import_mappers(), fileInfo))
+        self.assertEqual(mapperEntries.keys()[-1], 'mapper_generic')
+        self.assertEqual(mapperEntries['mapper_generic'].load().__name__,
+                         'Mapper')
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,88 @@
+#------------------------------------------------------------------------------
+# Name:         test_node.py
+# Purpose:      Test the Node class
+#
+# Author:       Anton Korosov
+#
+# Created:      18.10.2016
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import xml.dom.minidom as xdm
+
+from nansat.node import Node
+
+
+class NodeTest(unittest.TestCase):
+    def setUp(self):
+        self.vrtXML = ('<VRTDataset rasterXSize="300" rasterYSize="200">' +
+                       ''.join(['<VRTRasterBand dataType="Float32" band="%d">'
+                                '<Metadata><MDI key="name">band%d</MDI>'
+                                '</Metadata><ComplexSource>'
+                                '<SourceFilename relativeToVRT="0">'
+                                '/vsimem/ABC.vrt</SourceFilename>'
+                                '<SourceBand>1</SourceBand>'
+                                '<SrcRect xOff="0" yOff="0" xSize="300" '
+                                'ySize="200"/>'
+                                '<DstRect xOff="0" yOff="0" xSize="300" '
+                                'ySize="200"/>'
+                                '</ComplexSource></VRTRasterBand>' % (i, i)
+                                for i in range(1, 101)]) +
+                       '</VRTDataset>')
+
+    def test_create_rawxml(self):
+        node0 = Node.create(self.vrtXML)
+        node1 = node0.nodeList('VRTRasterBand')[1]
+
+        self.assertEqual(node0.getAttribute('rasterXSize'), '300')
+        self.assertEqual(len(node0.nodeList('VRTRasterBand')), 100)
+        self.assertEqual(node1['MDI'], 'band2')
+        self.assertEqual(node1.node('SrcRect').getAttribute('xSize'), '300')
+        self.assertEqual(Node.create(node0.rawxml()).rawxml(),
+                         node0.rawxml())
+
+    def test_create_whitespace_and_escape(self):
+        node0 = Node.create('<a>\n  <b c="x &amp; y">  some   text &lt; '
+                            '</b>\n</a>')
+
+        self.assertEqual(node0['b'], 'some text <')
+        self.assertEqual(node0.node('b').getAttribute('c'), 'x & y')
+        self.assertEqual(node0.rawxml(),
+                         '<a><b c="x &amp; y">some text &lt;</b></a>')
+
+    def test_create_namespace_prefix(self):
+        node0 = Node.create('<safe:a xmlns:safe="http://www.esa.int/safe">'
+                            '<safe:b safe:c="1">2</safe:b></safe:a>')
+
+        self.assertEqual(node0.tag, 'safe:a')
+        self.assertEqual(node0['safe:b'], '2')
+        self.assertEqual(node0.node('safe:b').getAttribute('safe:c'), '1')
+
+    def test_insert(self):
+        node0 = Node.create('<a><b>1</b></a>')
+        node1 = node0.insert('<c>2</c>')
+
+        self.assertEqual(node1.rawxml(), '<a><b>1</b><c>2</c></a>')
+        self.assertEqual(node0.rawxml(), '<a><b>1</b></a>')
+
+    def test_rawxml_as_minidom(self):
+        ''' rawxml writes the same XML as minidom (no XML declaration) '''
+        node = Node.create(self.vrtXML)
+
+        self.assertEqual(node.rawxml(), str(node.dom().toxml()))
+        self.assertFalse(node.xml().startswith('<?xml'))
+
+    def test_create_namespaces_in_scope(self):
+        ''' Namespace prefixes are valid only inside declaring elements '''
+        node = Node.create('<a xmlns:x="u1"><b xmlns:y="u1"><y:c>1</y:c>'
+                           '</b><x:d>2</x:d></a>')
+
+        self.assertEqual(node['y:c'], '1')
+        self.assertEqual(node['x:d'], '2')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#------------------------------------------------------------------------------
+# Name:         test_reprojectionplan.py
+# Purpose:      Test the ReprojectionPlan class
+#
+# Author:       Anton Korosov
+#
+# Created:      18.10.2016
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import os
+
+import numpy as np
+
+from nansat import Nansat, Domain
+from nansat.reprojectionplan import ReprojectionPlan, PlanCache
+from nansat.tools import OptionError
+
+import nansat_test_data as ntd
+
+
+class ReprojectionPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.test_file_gcps = os.path.join(ntd.test_data_path, 'gcps.tif')
+        self.test_file_stere = os.path.join(ntd.test_data_path, 'stere.tif')
+        self.tmpFileName = os.path.join(ntd.tmp_data_path,
+                                        'reprojection_plan.npz')
+
+    def tearDown(self):
+        if os.path.exists(self.tmpFileName):
+            os.remove(self.tmpFileName)
+
+    def test_apply_nearest_as_reproject(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 300 200")
+        plan = ReprojectionPlan(n, d)
+        a = plan.apply(n[1])
+        n.reproject(d)
+        b = n[1]
+
+        self.assertEqual(a.shape, (200, 300))
+        self.assertEqual(a.dtype, b.dtype)
+        self.assertTrue(np.mean(a == b) > 0.99)
+
+    def test_read_bands_bilinear(self):
+        n1 = Nansat(self.test_file_stere, logLevel=40)
+        n2 = Nansat(self.test_file_gcps, logLevel=40)
+        plan = ReprojectionPlan(n1, n2, 'bilinear')
+        a = plan.read_bands(n1, [1, 2])
+
+        self.assertEqual(a.shape, (2,) + n2.shape())
+        self.assertEqual(a.dtype, np.float32)
+        self.assertTrue(np.any(np.isfinite(a)))
+
+    def test_reproject(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 300 200")
+        plan = ReprojectionPlan(n, d)
+        n2 = plan.reproject(n, ['L_555'])
+
+        self.assertEqual(n2.shape(), d.shape())
+        self.assertEqual(n2.get_metadata('name', 1), 'L_555')
+        np.testing.assert_array_equal(n2[1], plan.apply(n['L_555']))
+
+    def test_save_load(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 300 200")
+        plan = ReprojectionPlan(n, d, 'bilinear')
+        plan.save(self.tmpFileName)
+        plan2 = ReprojectionPlan.load(self.tmpFileName, d)
+
+        self.assertEqual(plan2.resampling, 'bilinear')
+        self.assertEqual(plan2.dstShape, plan.dstShape)
+        np.testing.assert_array_equal(plan2.apply(n[1]), plan.apply(n[1]))
+
+    def test_plan_cache(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 300 200")
+        planCache = PlanCache(maxPlans=1)
+        plan = planCache.get_plan(n, d)
+
+        self.assertTrue(planCache.get_plan(Nansat(self.test_file_gcps,
+                                                  logLevel=40), d) is plan)
+        self.assertFalse(planCache.get_plan(n, d, 'bilinear') is plan)
+        self.assertEqual(len(planCache.plans), 1)
+        self.assertEqual(planCache.hits, 1)
+
+    def test_wrong_shape(self):
+        n = Nansat(self.test_file_gcps, logLevel=40)
+        d = Domain(4326, "-te 27 70 30 72 -ts 30 20")
+        plan = ReprojectionPlan(n, d)
+
+        with self.assertRaises(OptionError):
+            plan.apply(np.zeros((10, 10)))
+        with self.assertRaises(OptionError):
+            ReprojectionPlan(n, d, 'cubic')
+
+
+if __name__ == "__main__":
+    unittest.main()
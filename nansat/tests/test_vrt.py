@@ -0,0 +1,245 @@
+#------------------------------------------------------------------------------
+# Name:         test_vrt.py
+# Purpose:      Test the VRT class
+#
+# Author:       Anton Korosov
+#
+# Created:      18.10.2016
+# Copyright:    (c) NERSC
+# Licence:      This file is part of NANSAT. You can redistribute it or modify
+#               under the terms of GNU General Public License, v.3
+#               http://www.gnu.org/licenses/gpl-3.0.html
+#------------------------------------------------------------------------------
+import unittest
+import threading
+import numpy as np
+
+from nansat.vrt import VRT, _thin_gcps, mem_open_enabled
+from nansat.wkv import wkvRegistry
+from nansat.tools import gdal, OptionError
+
+
+class VRTTest(unittest.TestCase):
+    def setUp(self):
+        self.array = np.random.randn(200, 300)
+
+    def _get_chain(self, depth):
+        ''' Create VRT with <depth> sub-VRTs '''
+        vrt = VRT(array=self.array)
+        for i in range(depth):
+            vrt = vrt.get_super_vrt()
+        return vrt
+
+    def test_get_super_vrt_shares_sub_vrt(self):
+        vrt = VRT(array=self.array)
+        superVRT = vrt.get_super_vrt()
+
+        self.assertTrue(superVRT.vrt is vrt)
+        np.testing.assert_allclose(superVRT.dataset.ReadAsArray(),
+                                   self.array)
+
+    def test_copy_shares_sub_vrt(self):
+        vrt = self._get_chain(3)
+        vrtCopy = vrt.copy()
+
+        self.assertFalse(vrtCopy is vrt)
+        self.assertTrue(vrtCopy.vrt is vrt.vrt)
+        np.testing.assert_allclose(vrtCopy.dataset.ReadAsArray(),
+                                   self.array)
+
+    def test_sub_vrt_survives_deletion_of_super_vrt(self):
+        vrt = self._get_chain(2)
+        subVRT = vrt.vrt
+        vrtCopy = vrt.copy()
+        vrt = None
+
+        np.testing.assert_allclose(subVRT.dataset.ReadAsArray(),
+                                   self.array)
+        np.testing.assert_allclose(vrtCopy.dataset.ReadAsArray(),
+                                   self.array)
+
+    @unittest.skipUnless(mem_open_enabled(), 'GDAL_MEM_ENABLE_OPEN required')
+    def test_copy_keeps_array(self):
+        vrt = VRT(array=self.array, copy=False)
+        vrtCopy = vrt.copy()
+        vrt = None
+
+        self.assertTrue(vrtCopy.array is self.array)
+        np.testing.assert_allclose(vrtCopy.dataset.ReadAsArray(),
+                                   self.array)
+
+    def test_copy_false_without_mem_open(self):
+        if mem_open_enabled():
+            superVRT = VRT(array=self.array, copy=False).get_super_vrt()
+            np.testing.assert_allclose(superVRT.dataset.ReadAsArray(),
+                                       self.array)
+        else:
+            with self.assertRaises(OptionError):
+                VRT(array=self.array, copy=False)
+
+    def test_collapse_sub_vrt(self):
+        vrt = self._get_chain(5)
+        while vrt._collapse_sub_vrt():
+            pass
+
+        self.assertTrue(vrt.vrt is not None)
+        self.assertTrue(vrt.vrt.vrt is None)
+        np.testing.assert_allclose(vrt.dataset.ReadAsArray(), self.array)
+
+    def test_collapse_sub_vrt_subsampled(self):
+        vrt = self._get_chain(2).get_subsampled_vrt(150, 100, 0.5, 0)
+        subsampled = vrt.dataset.ReadAsArray()
+        while vrt._collapse_sub_vrt():
+            pass
+
+        self.assertTrue(vrt.vrt.vrt is None)
+        np.testing.assert_allclose(vrt.dataset.ReadAsArray(), subsampled)
+
+    def test_editing(self):
+        vrt = VRT(array=self.array)
+        with vrt.editing() as node0:
+            node0.replaceAttribute('rasterXSize', '100')
+            with vrt.editing() as node1:
+                node1.replaceAttribute('rasterYSize', '50')
+            # XML is not written until the outer context is exited
+            self.assertEqual(vrt.dataset.RasterXSize, 300)
+
+        self.assertTrue(node1 is node0)
+        self.assertEqual(vrt.dataset.RasterXSize, 100)
+        self.assertEqual(vrt.dataset.RasterYSize, 50)
+
+    def test_get_thread_dataset(self):
+        vrt = VRT(array=self.array)
+        version = vrt.get_dataset_version()
+        datasets = []
+        thread = threading.Thread(target=lambda: datasets.append(
+                                            vrt.get_thread_dataset(version)))
+        thread.start()
+        thread.join()
+        dataset = vrt.get_thread_dataset(version)
+
+        self.assertTrue(vrt.get_thread_dataset(version) is dataset)
+        self.assertFalse(datasets[0] is dataset)
+        np.testing.assert_array_equal(dataset.ReadAsArray(), self.array)
+
+        vrt.dataset.SetMetadataItem('test', 'value')
+        newVersion = vrt.get_dataset_version()
+        self.assertNotEqual(newVersion, version)
+        self.assertEqual(vrt.get_thread_dataset(newVersion).GetMetadataItem(
+                                                            'test'), 'value')
+
+    def test_get_thread_dataset_version_of_sub_vrt(self):
+        vrt = VRT(array=self.array).get_super_vrt()
+        dataset = vrt.get_thread_dataset(None)
+        version = vrt.get_dataset_version()
+
+        vrt.vrt.dataset.SetMetadataItem('test', 'value')
+        newVersion = vrt.get_dataset_version()
+        self.assertTrue(dataset is not None)
+        self.assertNotEqual(newVersion, version)
+
+    def test_get_band_index(self):
+        srcVRT = VRT(array=self.array)
+        vrt = VRT(array=self.array)
+        vrt._create_band({'SourceFilename': srcVRT.fileName, 'SourceBand': 1},
+                         {'name': 'band2', 'pol': 'HH'})
+        bandIndex = vrt.get_band_index()
+
+        self.assertTrue(vrt.get_band_index() is bandIndex)
+        self.assertEqual(bandIndex.find({'name': 'band2', 'pol': 'HH'}), 2)
+        self.assertEqual(bandIndex.find({'name': 'band2', 'pol': 'VV'}), 0)
+        self.assertEqual(bandIndex.find({}), 0)
+
+        vrt._create_band({'SourceFilename': srcVRT.fileName, 'SourceBand': 1},
+                         {'name': 'band3', 'pol': 'HH'})
+        self.assertFalse(vrt.get_band_index() is bandIndex)
+        self.assertEqual(vrt.get_band_index().find({'pol': 'HH'}), 3)
+
+        vrt.delete_band(2)
+        self.assertEqual(vrt.get_band_index().find({'name': 'band2'}), 0)
+        self.assertEqual(vrt.get_band_index().find({'name': 'band3'}), 2)
+
+    def test_thin_gcps(self):
+        # pixel/line are linear in X/Y for pixel < 500 and curved above
+        gcps = [gdal.GCP(10 + p * 0.001,
+                         60 + l * 0.001 + max(p - 500, 0) ** 2 * 1e-6,
+                         0, p, l)
+                for l in range(0, 1000, 50) for p in range(0, 1000, 50)]
+        thinGCPs = _thin_gcps(gcps, 0.5)
+        pixels = np.array([g.GCPPixel for g in thinGCPs])
+
+        self.assertTrue(len(thinGCPs) < len(gcps))
+        self.assertTrue(np.sum(pixels < 500) < np.sum(pixels > 500))
+        self.assertTrue(_thin_gcps(gcps, 0) is gcps)
+        self.assertTrue(_thin_gcps(gcps, -1) is gcps)
+
+    def test_create_fake_gcps(self):
+        vrt = VRT(lon=np.linspace(10, 20, 300)[None].repeat(200, 0),
+                  lat=np.linspace(60, 70, 200)[:, None].repeat(300, 1))
+        dstGCPs = [gdal.GCP(12 + i * 0.5, 62 + j * 0.5, 0, i, j)
+                   for i in range(10) for j in range(10)]
+        fakeGCPs = vrt._create_fake_gcps(dstGCPs, 1)['gcps']
+
+        self.assertEqual(len(fakeGCPs), 100)
+        self.assertEqual([(g.GCPX, g.GCPY) for g in fakeGCPs],
+                         [(g.GCPPixel, g.GCPLine) for g in dstGCPs])
+        self.assertEqual(len(vrt._create_fake_gcps(dstGCPs, 2)['gcps']), 50)
+        self.assertTrue(len(vrt._create_fake_gcps(dstGCPs, 1,
+                                                  10)['gcps']) < 100)
+
+    def test_editing_exception(self):
+        vrt = VRT(array=self.array)
+        with self.assertRaises(ValueError):
+            with vrt.editing() as node0:
+                node0.replaceAttribute('rasterXSize', '100')
+                raise ValueError
+
+        self.assertEqual(vrt.dataset.RasterXSize, 300)
+        with vrt.editing() as node0:
+            self.assertEqual(node0.getAttribute('rasterXSize'), '300')
+
+    def test_delete_bands(self):
+        srcVRT = VRT(array=self.array)
+        vrt = VRT(gdalDataset=srcVRT.dataset)
+        for i in range(4):
+            vrt._create_band({'SourceFilename': srcVRT.fileName,
+                              'SourceBand': 1}, {'name': 'band%d' % i})
+        vrt.dataset.FlushCache()
+        vrt.delete_bands([2, 4])
+
+        self.assertEqual(vrt.dataset.RasterCount, 2)
+        self.assertEqual(vrt.dataset.GetRasterBand(2).GetMetadataItem('name'),
+                         'band2')
+
+    def test_get_wkv(self):
+        vrt = VRT(array=self.array)
+        wkvDict = vrt._get_wkv('surface_backwards_scattering_coefficient_'
+                               'of_radar_wave')
+
+        self.assertEqual(wkvDict['short_name'], 'sigma0')
+        self.assertEqual(wkvDict['units'], 'm/m')
+        self.assertEqual(vrt._get_wkv('not_a_wkv'), {})
+
+    def test_wkv_registry_is_read_only(self):
+        wkvDict = wkvRegistry['radar_brightness_coefficient']
+        wkvDict['short_name'] = 'modified'
+
+        self.assertEqual(wkvRegistry['radar_brightness_coefficient']
+                         ['short_name'], 'beta0')
+        with self.assertRaises(TypeError):
+            wkvRegistry['radar_brightness_coefficient'] = {}
+
+    def test_copy_of_deep_chain_shares_sub_vrts(self):
+        ''' Copy and get_super_vrt don't copy sub-VRTs of a deep chain '''
+        deepVRT = self._get_chain(50)
+        superVRT = deepVRT.copy().get_super_vrt()
+
+        subVRT, deepSubVRT = superVRT.vrt.vrt, deepVRT.vrt
+        while deepSubVRT is not None:
+            self.assertTrue(subVRT is deepSubVRT)
+            subVRT, deepSubVRT = subVRT.vrt, deepSubVRT.vrt
+        self.assertTrue(subVRT is None)
+
+
+if __name__ == "__main__":
+    unittest.main()
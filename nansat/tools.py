@@ -21,16 +21,15 @@ import sys
 import warnings
 import logging
 
-from matplotlib import cm
 import numpy as np
-from scipy import mod
 
 try:
     import gdal
+    import gdal_array
     import ogr
     import osr
 except:
-    from osgeo import gdal, ogr, osr
+    from osgeo import gdal, gdal_array, ogr, osr
 
 # Force GDAL to raise exceptions
 try:
@@ -102,11 +101,28 @@ ak01 = {'red': [(0, 0.1, 0.1,),
                  (1, 0.5, 0.5,)],
         }
 
-try:
-    cm.register_cmap(name='obpg', data=obpg, lut=256)
-    cm.register_cmap(name='ak01', data=ak01, lut=256)
-except:
-    warnings.warn('Cannot generate and register the OBPG colormap!')
+# names of registered colormaps (see register_colormaps)
+registeredColormaps = []
+
+
+def register_colormaps():
+    ''' Register Nansat colormaps (obpg, ak01) in matplotlib
+
+    Colormaps are registered only once, at the first successful call (by
+    Figure, Nansatmap or Nansat.write_geotiffimage), to avoid import of
+    matplotlib at import of nansat.
+
+    '''
+    if len(registeredColormaps) > 0:
+        return
+    try:
+        from matplotlib import cm
+        cm.register_cmap(name='obpg', data=obpg, lut=256)
+        cm.register_cmap(name='ak01', data=ak01, lut=256)
+    except:
+        warnings.warn('Cannot generate and register the OBPG colormap!')
+    else:
+        registeredColormaps.extend(['obpg', 'ak01'])
 
 
 class Error(Exception):
@@ -129,6 +145,16 @@ class GDALError(Error):
     pass
 
 
+class ExpressionError(Error):
+    '''Error for invalid or not allowed band expression '''
+    pass
+
+
+class ExecutorBusyError(Error):
+    '''Error if too many tasks are waiting in the executor (see nansat.aio)'''
+    pass
+
+
 class NansatReadError(Exception):
     '''Exception if a file cannot be read with Nansat'''
     pass
@@ -168,7 +194,7 @@ def initial_bearing(lon1, lat1, lon2, lat2):
                              np.cos(rlat1) * np.sin(rlat2) -
                              np.sin(rlat1) * np.cos(rlat2) *
                              np.cos(rlon2 - rlon1))
-        return mod(np.degrees(bearing) + 360, 360)
+        return np.mod(np.degrees(bearing) + 360, 360)
 
 
 def haversine(lon1, lat1, lon2, lat2):
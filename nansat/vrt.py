@@ -17,16 +17,132 @@
 from __future__ import absolute_import
 import os
 import tempfile
+import hashlib
+import threading
 from string import Template, ascii_uppercase, digits
 from random import choice
 import datetime
 import warnings
+from contextlib import contextmanager
 
 import numpy as np
 
 from nansat.node import Node
 from nansat.nsr import NSR
-from nansat.tools import add_logger, gdal, osr
+from nansat.bandcache import bandCache
+from nansat.bandindex import BandIndex
+from nansat.wkv import wkvRegistry
+from nansat.tools import add_logger, gdal, osr, OptionError
+
+
+def _get_rect(rectNode):
+    ''' Get xOff, yOff, xSize, ySize from <SrcRect> or <DstRect> node '''
+    return [float(rectNode.getAttribute(key))
+            for key in ['xOff', 'yOff', 'xSize', 'ySize']]
+
+
+def _test_mem_open():
+    ''' Can datasets of MEM driver be opened from a MEM::: string?
+
+    Newer GDAL versions open them only if GDAL_MEM_ENABLE_OPEN=YES
+
+    '''
+    array = np.zeros((1, 1), 'uint8')
+    gdal.PushErrorHandler('CPLQuietErrorHandler')
+    try:
+        dataset = gdal.Open('MEM:::DATAPOINTER=%d,PIXELS=1,LINES=1,'
+                            'BANDS=1,DATATYPE=Byte' % array.ctypes.data)
+    except RuntimeError:
+        dataset = None
+    finally:
+        gdal.PopErrorHandler()
+    return dataset is not None
+
+
+# MEM::: datasets can be opened without GDAL_MEM_ENABLE_OPEN
+MEM_OPEN_ENABLED = _test_mem_open()
+
+
+def mem_open_enabled():
+    ''' Can VRTs point to memory of arrays (VRT(array, copy=False))?
+
+    Returns
+    --------
+    enabled : bool
+        True if the GDAL version opens MEM::: datasets or if the config
+        option GDAL_MEM_ENABLE_OPEN is set (for the whole process)
+
+    '''
+    memEnableOpen = gdal.GetConfigOption('GDAL_MEM_ENABLE_OPEN', 'NO')
+    return (MEM_OPEN_ENABLED or
+            memEnableOpen.upper() in ['YES', 'TRUE', 'ON', '1'])
+
+
+def _format_number(number):
+    ''' Format coordinate for VRT-file: integer if possible '''
+    if number == int(number):
+        return str(int(number))
+    return repr(number)
+
+
+def _thin_gcps(gcps, maxError, minGCPs=16):
+    ''' Select subset of GCPs which reproduces all GCPs with given error
+
+    Starting from a sparse regular subset (and the extreme GCPs), GCPs with
+    the largest error of piecewise linear interpolation of pixel/line from
+    X/Y (using the subset) are added until error at all GCPs is below
+    <maxError>. Many GCPs are kept where pixel/line change non-linearly and
+    few where they change linearly. Thin plate spline is smoother than
+    linear interpolation, therefore its error is usually smaller.
+
+    Parameters
+    -----------
+    gcps : list
+        GDAL GCPs
+    maxError : float
+        maximum error (pixels) of pixel/line at removed GCPs. If zero or
+        negative, all GCPs are kept
+    minGCPs : int
+        approximate size of the initial subset
+
+    Returns
+    --------
+    gcps : list
+        subset of GDAL GCPs
+
+    '''
+    if maxError <= 0 or len(gcps) <= minGCPs:
+        return gcps
+    from scipy.interpolate import LinearNDInterpolator
+
+    xy = np.array([(g.GCPX, g.GCPY) for g in gcps])
+    pixlin = np.array([(g.GCPPixel, g.GCPLine) for g in gcps])
+
+    # initial subset: regular subsample and the extreme GCPs
+    selected = np.zeros(len(gcps), bool)
+    selected[::max(1, len(gcps) // minGCPs)] = True
+    for values in [xy[:, 0] + xy[:, 1], xy[:, 0] - xy[:, 1]]:
+        selected[values.argmin()] = True
+        selected[values.argmax()] = True
+
+    while not selected.all():
+        try:
+            interpolator = LinearNDInterpolator(xy[selected],
+                                                pixlin[selected])
+        except RuntimeError:
+            # degenerate subset (e.g. all GCPs on one line)
+            return gcps
+        error = np.hypot(*(interpolator(xy) - pixlin).T)
+        error[np.isnan(error)] = np.inf
+        error[selected] = 0
+        bad = np.nonzero(error > maxError)[0]
+        if bad.size == 0:
+            break
+        # add the worst GCPs (at most as many as already selected)
+        bad = bad[np.argsort(error[bad])[::-1][:selected.sum()]]
+        selected[bad] = True
+
+    return [gcp for gcp, isSelected in zip(gcps, selected) if isSelected]
 
 
 class GeolocationArray():
@@ -151,6 +267,10 @@ class VRT(object):
     self.vrt = method_to_create_super_VRT()
     self.vrt.vrt = subVRT
 
+    SubVRTs are not copied: several VRTs (e.g. copies of supVRT) may
+    reference the same subVRT. Therefore a VRT is not modified after it has
+    become a subVRT of another VRT.
+
     '''
     ComplexSource = Template('''
             <$SourceType>
@@ -175,6 +295,16 @@ class VRT(object):
               </VRTRasterBand>
             </VRTDataset> ''')
 
+    MemRasterBandSource = Template('''
+            <VRTDataset rasterXSize="$XSize" rasterYSize="$YSize">
+              <VRTRasterBand dataType="$DataType" band="$BandNum">
+                <SimpleSource>
+                  <SourceFilename relativeToVRT="0">$SrcFileName</SourceFilename>
+                  <SourceBand>1</SourceBand>
+                </SimpleSource>
+              </VRTRasterBand>
+            </VRTDataset> ''')
+
     ReprojectTransformer = Template('''
         <ReprojectTransformer>
           <ReprojectionTransformer>
@@ -187,8 +317,16 @@ class VRT(object):
     vrt = None
     # other sub VRTs
     bandVRTs = None
+    # array with data of the VRT created from array
+    array = None
     # use Thin Spline Transformation of the VRT has GCPs?
     tps = False
+    # XML of the VRT-file being edited (see editing)
+    _editNode = None
+    # datasets opened for reading in other threads (see get_thread_dataset)
+    _threadDatasets = None
+    # index of metadata of bands (see get_band_index)
+    _bandIndex = None
 
     def __init__(self, gdalDataset=None, vrtDataset=None,
                  array=None,
@@ -201,7 +339,7 @@ class VRT(object):
                  srcMetadata='',
                  geolocationArray=None,
                  nomem=False,
-                 lat=None, lon=None):
+                 lat=None, lon=None, copy=True):
         ''' Create VRT dataset from GDAL dataset, or from given parameters
 
         If vrtDataset is given, creates full copy of VRT content
@@ -232,6 +370,8 @@ class VRT(object):
             object with info on geolocation array
             and VRTs with x/y datasets
         nomem : boolean, saves the vrt to a tempfile if nomem is True
+        copy : boolean, copy the array? If False, the VRT points to the
+            memory of the array (see create_dataset_from_array)
         lon : Numpy array
             grid with longitudes
         lat : Numpy array
@@ -253,11 +393,6 @@ class VRT(object):
         if self.bandVRTs is None:
             self.bandVRTs = {}
 
-        # open and parse wkv.xml
-        fileNameWKV = os.path.join(os.path.dirname(
-                                   os.path.realpath(__file__)), 'wkv.xml')
-        self.wkvNode0 = Node.create(fileNameWKV)
-
         # default empty geolocation array of source
         srcGeolocationArray = GeolocationArray()
         if vrtDataset is not None:
@@ -301,7 +436,7 @@ class VRT(object):
                                                      srcRasterYSize,
                                                      bands=0)
             else:
-                self.create_dataset_from_array(array)
+                self.create_dataset_from_array(array, nomem, copy)
 
             # set geo-metadata in the VRT dataset
             self.dataset.SetGCPs(srcGCPs, srcGCPProjection)
@@ -333,6 +468,7 @@ class VRT(object):
     def __del__(self):
         ''' Destructor deletes VRT and RAW files'''
         try:
+            bandCache.invalidate(self.fileName)
             gdal.Unlink(self.fileName)
             gdal.Unlink(self.fileName.replace('vrt', 'raw'))
         except:
@@ -573,6 +709,7 @@ class VRT(object):
 
         # Add Band
         self.dataset.AddBand(int(dst['dataType']), options=options)
+        self.invalidate_band_index()
         dstRasterBand = self.dataset.GetRasterBand(self.dataset.RasterCount)
 
         # Append sources to destination dataset
@@ -629,11 +766,12 @@ class VRT(object):
         for i in range(numBands):
             iBand = self.dataset.GetRasterBand(i + 1)
             iBand.SetMetadataItem('time', str(time[i].isoformat()))
+        self.invalidate_band_index()
 
         return
 
     def _get_wkv(self, wkvName):
-        ''' Get wkv from wkv.xml
+        ''' Get wkv from wkv.xml (see nansat.wkv.wkvRegistry)
 
         Parameters
         -----------
@@ -646,14 +784,7 @@ class VRT(object):
             WKV corresponds to the given wkv_name
 
         '''
-        wkvDict = {}
-        for iNode in self.wkvNode0.nodeList('wkv'):
-            tagsList = iNode.tagList()
-            if iNode.node('standard_name').value == wkvName:
-                wkvDict = {'standard_name': wkvName}
-                for iTag in tagsList:
-                    wkvDict[iTag] = str(iNode.node(iTag).value)
-        return wkvDict
+        return wkvRegistry.get(wkvName, {})
 
     def _put_metadata(self, rasterBand, metadataDict):
         ''' Put all metadata into a raster band
@@ -682,39 +813,59 @@ class VRT(object):
                 self.logger.error('Cannot add %s to metadata' % key)
             else:
                 rasterBand.SetMetadataItem(key, metaValue)
+        self.invalidate_band_index()
 
         return rasterBand
 
-    def create_dataset_from_array(self, array):
+    def create_dataset_from_array(self, array, nomem=False, copy=True):
         '''Create a dataset with a band from an array
 
-        Write contents of the array into flat binary file (VSI)
-        Write VRT file with RawRastesrBand, which points to the binary file
-        Open the VRT file as self.dataset with GDAL
+        if nomem is False and copy is True (default), contents of the array
+        are written into flat binary file (VSI) and the VRT file with
+        RawRasterBand points to the binary file.
+        if nomem is True, the array is written into a temporary flat binary
+        file on disk through np.memmap and VRT file with RawRasterBand points
+        to the binary file.
+        if copy is False, the array is not copied: the VRT file points to
+        the memory of the array (using MEM driver with DATAPOINTER) and the
+        array is kept in self.array. Changing values in the array changes
+        values in the band (but not arrays cached in bandCache)! Newer
+        GDAL versions require GDAL_MEM_ENABLE_OPEN=YES for the whole process
+        (see mem_open_enabled), otherwise OptionError is raised.
 
         Parameters
         -----------
         array : numpy array
+        nomem : bool
+            write the array into a temporary file?
+        copy : bool
+            copy the array? Ignored if nomem is True
 
         Modifies
         ---------
-        binary file is written (VSI)
+        self.array : the array or memory map of the binary file (if copy is
+            False or nomem is True)
+        binary file is written (if copy is True)
         VRT file is written (VSI)
         self.dataset is opened
 
+        Raises
+        -------
+        OptionError : if copy is False and MEM::: datasets cannot be opened
+
         '''
+        if not nomem and not copy and not mem_open_enabled():
+            raise OptionError('copy=False requires GDAL_MEM_ENABLE_OPEN=YES '
+                              'with this version of GDAL')
+
+        # MEM driver and RawRasterBand read data in native byte order
+        if not array.dtype.isnative:
+            array = array.astype(array.dtype.newbyteorder('='))
         arrayDType = array.dtype.name
         arrayShape = array.shape
-        # create flat binary file from array (in VSI)
-        binaryFile = self.fileName.replace('.vrt', '.raw')
-        ofile = gdal.VSIFOpenL(binaryFile, 'wb')
-        gdal.VSIFWriteL(array.tostring(), len(array.tostring()), 1, ofile)
-        gdal.VSIFCloseL(ofile)
-        array = None
 
         self.logger.debug('arrayDType: %s', arrayDType)
 
-        #create conents of VRT-file pointing to the binary file
         dataType = {'uint8': 'Byte',
                     'int8': 'Byte',
                     'uint16': 'UInt16',
@@ -726,27 +877,60 @@ class VRT(object):
                     'complex64': 'CFloat32',
                     'complex128': 'CFloat64'}.get(str(arrayDType))
 
-        pixelOffset = {'Byte': '1',
-                       'UInt16': '2',
-                       'Int16': '2',
-                       'UInt32': '4',
-                       'Int32': '4',
-                       'Float32': '4',
-                       'Float64': '8',
-                       'CFloat32': '8',
-                       'CFloat64': '16'}.get(dataType)
-
         self.logger.debug('DataType: %s', dataType)
 
-        lineOffset = str(int(pixelOffset) * arrayShape[1])
-        contents = self.RawRasterBandSource.substitute(
-            XSize=arrayShape[1],
-            YSize=arrayShape[0],
-            DataType=dataType,
-            BandNum=1,
-            SrcFileName=binaryFile,
-            PixelOffset=pixelOffset,
-            LineOffset=lineOffset)
+        memOpen = False
+        binaryFile = self.fileName.replace('.vrt', '.raw')
+        if nomem:
+            # write array into flat binary file through memory map
+            memmap = np.memmap(binaryFile, array.dtype, 'w+', shape=arrayShape)
+            memmap[:] = array
+            memmap.flush()
+            del memmap
+            self.array = np.memmap(binaryFile, array.dtype, 'r',
+                                   shape=arrayShape)
+        elif copy:
+            # write array into flat binary file (VSI)
+            arrayString = np.ascontiguousarray(array).tostring()
+            ofile = gdal.VSIFOpenL(binaryFile, 'wb')
+            gdal.VSIFWriteL(arrayString, len(arrayString), 1, ofile)
+            gdal.VSIFCloseL(ofile)
+            arrayString = None
+        else:
+            # MEM driver does not support negative offsets
+            if min(array.strides) <= 0:
+                array = np.ascontiguousarray(array)
+            self.array = array
+            memOpen = True
+
+            # create contents of VRT-file pointing to the memory of array
+            memFileName = ('MEM:::DATAPOINTER=%d,PIXELS=%d,LINES=%d,'
+                           'BANDS=1,DATATYPE=%s,PIXELOFFSET=%d,'
+                           'LINEOFFSET=%d' % (array.ctypes.data,
+                                              arrayShape[1],
+                                              arrayShape[0],
+                                              dataType,
+                                              array.strides[1],
+                                              array.strides[0]))
+            contents = self.MemRasterBandSource.substitute(
+                XSize=arrayShape[1],
+                YSize=arrayShape[0],
+                DataType=dataType,
+                BandNum=1,
+                SrcFileName=memFileName)
+
+        if not memOpen:
+            #create conents of VRT-file pointing to the binary file
+            contents = self.RawRasterBandSource.substitute(
+                XSize=arrayShape[1],
+                YSize=arrayShape[0],
+                DataType=dataType,
+                BandNum=1,
+                SrcFileName=binaryFile,
+                PixelOffset=array.itemsize,
+                LineOffset=array.itemsize * arrayShape[1])
+        array = None
+
         #write XML contents to
         self.write_xml(contents)
 
@@ -803,13 +987,65 @@ class VRT(object):
         gdal.VSIFCloseL(vsiFile)
         # re-open self.dataset with new content
         self.dataset = gdal.Open(self.fileName)
+        # arrays and metadata read from the old content are not valid anymore
+        bandCache.invalidate(self.fileName)
+        self.invalidate_band_index()
+
+    @contextmanager
+    def editing(self):
+        '''Context for editing XML of the VRT-file
+
+        The XML is read and parsed once when the context is entered. All
+        changes are applied to the Node and written into the VRT-file
+        (and the dataset is re-opened) once when the context is exited. If
+        an exception is raised inside the context the VRT is not changed.
+        Contexts can be nested: the inner context yields the same Node and
+        doesn't write. self.dataset should not be modified inside the
+        context because these changes are overwritten on exit.
+
+        Yields
+        -------
+        node0 : Node
+            root node of the XML content of the VRT-file
+
+        Modifies
+        ---------
+        self.dataset : re-opened with the new XML content
+
+        Examples
+        --------
+        with vrt.editing() as node0:
+            node0.replaceAttribute('rasterXSize', '100')
+            vrt.delete_bands([2, 3])
+        # XML is written once
+
+        '''
+        if self._editNode is not None:
+            yield self._editNode
+            return
+
+        self._editNode = Node.create(self.read_xml())
+        try:
+            yield self._editNode
+            xml = self._editNode.rawxml()
+        finally:
+            self._editNode = None
+        self.write_xml(xml)
 
     def export(self, fileName):
         '''Export VRT file as XML into given <fileName>'''
         self.vrtDriver.CreateCopy(fileName, self.dataset)
 
     def copy(self):
-        '''Creates full copy of VRT dataset'''
+        '''Creates copy of VRT dataset
+
+        Only the top level is copied. The copy references the same sub-VRT
+        (self.vrt) and band VRTs (self.bandVRTs) as self: VRTs are never
+        modified after they have become sub-VRTs of other VRTs, therefore
+        they can be shared between VRTs (the VRT files are deleted only
+        when the last reference to the VRT object is deleted)
+
+        '''
         try:
             # deep copy (everything including bands)
             vrt = VRT(vrtDataset=self.dataset,
@@ -823,19 +1059,113 @@ class VRT(object):
         # or with added bands
         vrt.bandVRTs = self.bandVRTs
 
+        # keep the array which may be referenced by the VRT file
+        vrt.array = self.array
+
         # set TPS flag
         vrt.tps = bool(self.tps)
 
-        # iterative copy of self.vrt
-        if self.vrt is not None:
-            vrt.vrt = self.vrt.copy()
-            vrtXML = vrt.read_xml()
-            vrtXML = vrtXML.replace(os.path.split(self.vrt.fileName)[1],
-                                    os.path.split(vrt.vrt.fileName)[1])
-            vrt.write_xml(vrtXML)
+        # share self.vrt (the copy references the same VRT file)
+        vrt.vrt = self.vrt
 
         return vrt
 
+    def _share(self):
+        '''Prepare self to become a sub-VRT of another VRT
+
+        Write all changes of self.dataset into the VRT file so that the
+        file can be opened by other VRTs. After that self should not be
+        modified.
+
+        Returns
+        --------
+        self
+
+        '''
+        self.dataset.FlushCache()
+        return self
+
+    def get_dataset_version(self):
+        '''Write changes into the VRT-files and get version of their content
+
+        Should be called in the thread which modifies the VRT before
+        reading from other threads (see get_thread_dataset)
+
+        Returns
+        --------
+        version : str
+            hash of the XML content of the VRT-file and of all VRT-files
+            it references (sub-VRT, band VRTs and geolocation VRTs)
+
+        '''
+        if self._threadDatasets is None:
+            self._threadDatasets = threading.local()
+        md5 = hashlib.md5()
+        for vrt in _get_vrt_tree(self):
+            md5.update(vrt.fileName)
+            md5.update(vrt.read_xml())
+        return md5.hexdigest()
+
+    def get_thread_dataset(self, version):
+        '''Get GDAL dataset for reading in the current thread
+
+        GDAL datasets cannot be shared between threads but GDAL releases
+        the GIL while reading, therefore bands can be read in parallel from
+        several datasets opened from the same VRT-file. The dataset is opened
+        once per thread and re-opened if the content of the VRT-file changed.
+
+        Parameters
+        -----------
+        version : str
+            version of the VRT-file from get_dataset_version
+
+        Returns
+        --------
+        dataset : GDAL Dataset
+            dataset of the current thread (read only)
+
+        Examples
+        --------
+        version = vrt.get_dataset_version()
+        # in each thread:
+        band = vrt.get_thread_dataset(version).GetRasterBand(1)
+
+        '''
+        if self._threadDatasets is None:
+            self._threadDatasets = threading.local()
+        threadDatasets = self._threadDatasets
+        if getattr(threadDatasets, 'version', None) != version:
+            threadDatasets.dataset = gdal.Open(self.fileName)
+            threadDatasets.version = version
+        return threadDatasets.dataset
+
+    def get_band_index(self):
+        '''Get index of metadata of bands
+
+        The index is created at the first call and re-created after bands
+        are added, deleted or metadata of bands is changed by methods of
+        VRT and Nansat. If metadata of bands is changed directly through
+        GDAL, invalidate_band_index() should be called.
+
+        Returns
+        --------
+        bandIndex : BandIndex
+
+        Examples
+        --------
+        bandNumber = vrt.get_band_index().find({'name': 'sigma0_HH'})
+
+        '''
+        bandIndex = self._bandIndex
+        if bandIndex is None or not bandIndex.is_valid(self.dataset):
+            bandIndex = BandIndex(self.dataset)
+            self._bandIndex = bandIndex
+        return bandIndex
+
+    def invalidate_band_index(self):
+        '''Remove index of metadata of bands (see get_band_index)'''
+        self._bandIndex = None
+
     def add_geolocationArray(self, geolocationArray=None):
         ''' Add GEOLOCATION ARRAY to the VRT
 
@@ -879,13 +1209,9 @@ class VRT(object):
         The tag <GeoTransform> is revoved from the VRT-file
 
         '''
-        # read XML content from VRT
-        tmpVRTXML = self.read_xml()
         # find and remove GeoTransform
-        node0 = Node.create(tmpVRTXML)
-        node1 = node0.delNode('GeoTransform')
-        # Write the modified elemements back into temporary VRT
-        self.write_xml(node0.rawxml())
+        with self.editing() as node0:
+            node0.delNode('GeoTransform')
 
     def get_warped_vrt(self, dstSRS=None, eResampleAlg=0,
                        xSize=0, ySize=0, blockSize=None,
@@ -893,7 +1219,9 @@ class VRT(object):
                        use_geolocationArray=True,
                        use_gcps=True, skip_gcps=1,
                        use_geotransform=True,
-                       dstGCPs=[], dstGeolocationArray=None):
+                       dstGCPs=[], dstGeolocationArray=None,
+                       numThreads=None, warpMemoryLimit=None,
+                       maxError=0, optimizeSize=None, max_gcp_error=None):
 
         ''' Create VRT object with WarpedVRT
 
@@ -967,9 +1295,22 @@ class VRT(object):
             Use GCPs in input dataset (if present) for warping
         skip_gcps : int
             See nansat.reproject() for explanation
+        max_gcp_error : float
+            See nansat.reproject() for explanation
         use_geotransform : Boolean (True)
             Use GeoTransform in input dataset for warping or make artificial
             GeoTransform : (0, 1, 0, srcVRT.xSize, -1)
+        numThreads : int or str
+            number of threads used by GDAL for warping each block
+            (e.g. 4 or 'ALL_CPUS'). Default is one thread
+        warpMemoryLimit : float
+            memory (bytes) used by GDAL for warping. Larger value allows
+            larger chunks and fewer calls to the transformer
+        maxError : float
+            error threshold (pixels) for the approximate transformer. If 0,
+            exact transformation is computed for each pixel
+        optimizeSize : bool
+            warp in chunks aligned with blocks of the WarpedVRT
 
         Returns
         --------
@@ -984,7 +1325,8 @@ class VRT(object):
 
         # if destination GCPs are given: create and add fake GCPs to src
         if len(dstGCPs) > 0 and use_gcps:
-            fakeGCPs = srcVRT._create_fake_gcps(dstGCPs, skip_gcps)
+            fakeGCPs = srcVRT._create_fake_gcps(dstGCPs, skip_gcps,
+                                                max_gcp_error)
             srcVRT.dataset.SetGCPs(fakeGCPs['gcps'], fakeGCPs['srs'])
             # don't use geolocation array
             use_geolocationArray = False
@@ -1004,6 +1346,11 @@ class VRT(object):
             # (remove GeolocationArray and GeoTransform)
             srcVRT.dataset.SetMetadata('', 'GEOLOCATION')
             srcVRT._remove_geotransform()
+            # reduce number of own GCPs (fake GCPs are already reduced)
+            if max_gcp_error is not None and len(dstGCPs) == 0:
+                srcVRT.dataset.SetGCPs(
+                    _thin_gcps(srcVRT.dataset.GetGCPs(), max_gcp_error),
+                    srcVRT.dataset.GetGCPProjection())
         elif use_geotransform:
             # fallback to GeoTransform in input VRT
             # (remove GeolocationArray and GCP)
@@ -1019,7 +1366,8 @@ class VRT(object):
         # create Warped VRT GDAL Dataset
         self.logger.debug('Run AutoCreateWarpedVRT...')
         warpedVRT = gdal.AutoCreateWarpedVRT(srcVRT.dataset, None,
-                                             acwvSRS, eResampleAlg)
+                                             acwvSRS, eResampleAlg,
+                                             float(maxError))
         # TODO: implement the below option for proper handling of
         # stereo projections
         # warpedVRT = gdal.AutoCreateWarpedVRT(srcVRT.dataset, '',
@@ -1036,56 +1384,80 @@ class VRT(object):
         # set x/y size, geoTransform, blockSize
         self.logger.debug('set x/y size, geoTransform, blockSize')
 
-        # Modify rasterXsize, rasterYsize and geotranforms in the warped VRT
-        warpedXML = warpedVRT.read_xml()
-        node0 = Node.create(warpedXML)
-
-        if xSize > 0:
-            node0.replaceAttribute('rasterXSize', str(xSize))
-        if ySize > 0:
-            node0.replaceAttribute('rasterYSize', str(ySize))
-
-        if geoTransform is not None:
-            invGeotransform = gdal.InvGeoTransform(geoTransform)
-            # convert proper string style and set to the GeoTransform element
-            node0.node('GeoTransform').value = str(geoTransform).strip('()')
-            node0.node('DstGeoTransform').value = str(geoTransform).strip('()')
-            node0.node('DstInvGeoTransform').value = (
-                str(invGeotransform[1]).strip('()'))
-
-            if node0.node('SrcGeoLocTransformer'):
-                node0.node('BlockXSize').value = str(xSize)
-                node0.node('BlockYSize').value = str(ySize)
-
-            if blockSize is not None:
-                node0.node('BlockXSize').value = str(blockSize)
-                node0.node('BlockYSize').value = str(blockSize)
+        # Keep reference to self in warpedVRT
+        warpedVRT.vrt = self._share()
 
-            if WorkingDataType is not None:
-                node0.node('WorkingDataType').value = WorkingDataType
-
-        """
-        # TODO: test thoroughly and implement later
-        if srcSRS is not None and dstSRS is not None:
-            rt = self.ReprojectTransformer.substitute(SourceSRS=None,
-                                                      TargetSRS=None)
-            print 'rt', rt
-            rtNode = Node.create(rt)
-            print 'rtNode.xml()', rtNode.xml()
-            giptNode = node0.node('GenImgProjTransformer')
-            print 'giptNode', giptNode
-            giptNode += rtNode
-            print 'node0.xml()', node0.xml()
-        """
-        # overwrite XML of the warped VRT file with uprated size
-        # and geotranform
-        warpedVRT.write_xml(node0.rawxml())
-
-        # apply thin-spline-transformation option
-        if use_gcps and self.tps:
-            tmpVRTXML = warpedVRT.read_xml()
-            tmpVRTXML = tmpVRTXML.replace('GCPTransformer', 'TPSTransformer')
-            warpedVRT.write_xml(tmpVRTXML)
+        # Modify rasterXsize, rasterYsize and geotranforms in the warped VRT
+        # (XML is written once on exit)
+        with warpedVRT.editing() as node0:
+            if xSize > 0:
+                node0.replaceAttribute('rasterXSize', str(xSize))
+            if ySize > 0:
+                node0.replaceAttribute('rasterYSize', str(ySize))
+
+            if geoTransform is not None:
+                invGeotransform = gdal.InvGeoTransform(geoTransform)
+                # convert proper string style and set to the GeoTransform
+                node0.node('GeoTransform').value = (
+                    str(geoTransform).strip('()'))
+                node0.node('DstGeoTransform').value = (
+                    str(geoTransform).strip('()'))
+                node0.node('DstInvGeoTransform').value = (
+                    str(invGeotransform[1]).strip('()'))
+
+                if node0.node('SrcGeoLocTransformer'):
+                    node0.node('BlockXSize').value = str(xSize)
+                    node0.node('BlockYSize').value = str(ySize)
+
+                if blockSize is not None:
+                    node0.node('BlockXSize').value = str(blockSize)
+                    node0.node('BlockYSize').value = str(blockSize)
+
+                if WorkingDataType is not None:
+                    node0.node('WorkingDataType').value = WorkingDataType
+
+            """
+            # TODO: test thoroughly and implement later
+            if srcSRS is not None and dstSRS is not None:
+                rt = self.ReprojectTransformer.substitute(SourceSRS=None,
+                                                          TargetSRS=None)
+                print 'rt', rt
+                rtNode = Node.create(rt)
+                print 'rtNode.xml()', rtNode.xml()
+                giptNode = node0.node('GenImgProjTransformer')
+                print 'giptNode', giptNode
+                giptNode += rtNode
+                print 'node0.xml()', node0.xml()
+            """
+
+            # apply thin-spline-transformation option
+            if use_gcps and self.tps:
+                # (e.g. <SrcGCPTransformer><GCPTransformer>)
+                nodes = [node0]
+                while nodes:
+                    node1 = nodes.pop()
+                    node1.tag = node1.tag.replace('GCPTransformer',
+                                                  'TPSTransformer')
+                    nodes += node1.children
+
+            # replace the reference from srcVRT to self
+            self.logger.debug('replace the reference from srcVRT to self')
+            rawFileName = str(os.path.basename(warpedVRT.vrt.fileName))
+            node1 = node0.node('GDALWarpOptions')
+            node1.node('SourceDataset').value = '/vsimem/' + rawFileName
+
+            # set performance options of warping
+            if warpMemoryLimit is not None:
+                node2 = node1.node('WarpMemoryLimit')
+                if not node2:
+                    node2 = Node('WarpMemoryLimit')
+                    node1 += node2
+                node2.value = str(float(warpMemoryLimit))
+            if numThreads is not None:
+                self._set_warp_option(node1, 'NUM_THREADS', numThreads)
+            if optimizeSize is not None:
+                self._set_warp_option(node1, 'OPTIMIZE_SIZE',
+                                      str(bool(optimizeSize)).upper())
 
         """
         # TODO: implement the below option for proper handling stereo
@@ -1112,21 +1484,28 @@ class VRT(object):
             warpedVRT.add_geolocationArray(dstGeolocationArray)
             warpedVRT.dataset.SetProjection('')
 
-        # Copy self to warpedVRT
-        warpedVRT.vrt = self.copy()
+        return warpedVRT
 
-        # replace the reference from srcVRT to self
-        self.logger.debug('replace the reference from srcVRT to self')
-        rawFileName = str(os.path.basename(warpedVRT.vrt.fileName))
-        warpedXML = str(warpedVRT.read_xml())
-        node0 = Node.create(warpedXML)
-        node1 = node0.node('GDALWarpOptions')
-        node1.node('SourceDataset').value = '/vsimem/' + rawFileName
-        warpedVRT.write_xml(node0.rawxml())
+    def _set_warp_option(self, warpOptionsNode, name, value):
+        '''Set value of <Option> in <GDALWarpOptions> (add if needed)
 
-        return warpedVRT
+        Parameters
+        -----------
+        warpOptionsNode : Node
+            GDALWarpOptions node of the WarpedVRT XML
+        name : str
+            name of the option (e.g. NUM_THREADS)
+        value : str or int
+            value of the option
 
-    def _create_fake_gcps(self, gcps, skip_gcps):
+        '''
+        for optionNode in warpOptionsNode.nodeList('Option'):
+            if optionNode.attributes.get('name') == name:
+                optionNode.value = str(value)
+                return
+        warpOptionsNode += Node('Option', str(value), name=name)
+
+    def _create_fake_gcps(self, gcps, skip_gcps, max_gcp_error=None):
         '''Create GCPs with reference self.pixel/line ==> dst.pixel/line
 
         GCPs from a destination image (dstGCP) are converted to a gcp of source
@@ -1137,12 +1516,18 @@ class VRT(object):
         srcGCPX = dstGCPPixel = f(srcSRS, dstGCPX, dstGCPY)
         srcGCPY = dstGCPLine = f(srcSRS, dstGCPX, dstGCPY)
 
+        All GCPs are transformed with one call to the transformer. GCPs
+        which cannot be transformed (e.g. outside of geolocation arrays)
+        are skipped.
+
         Parameters
         -----------
         gcps : list
             GDAL GCPs
         skip_gcps : int
             See nansat.reproject() for explanation
+        max_gcp_error : float
+            See nansat.reproject() for explanation
 
         Returns
         --------
@@ -1155,18 +1540,25 @@ class VRT(object):
                                           ['SRC_SRS=' + self.get_projection(),
                                            'DST_SRS=' + NSR().wkt])
 
-        # create 'fake' GCPs
-        fakeGCPs = []
-        for g in gcps[::skip_gcps]:
-            # transform DST lat/lon to SRC pixel/line
-            succ, point = srcTransformer.TransformPoint(1, g.GCPX, g.GCPY)
-            srcPixel = point[0]
-            srcLine = point[1]
-
-            # swap coordinates in GCPs:
-            # pix1/line1 -> lat/lon  =>=>  pix2/line2 -> pix1/line1
-            fakeGCPs.append(gdal.GCP(g.GCPPixel, g.GCPLine,
-                                     0, srcPixel, srcLine))
+        # transform DST lat/lon to SRC pixel/line
+        gcps = gcps[::skip_gcps]
+        dstPixLinXY = np.array([(g.GCPPixel, g.GCPLine, g.GCPX, g.GCPY)
+                                for g in gcps]).reshape(-1, 4)
+        srcPixLin, success = srcTransformer.TransformPoints(
+                                            1, dstPixLinXY[:, 2:].tolist())
+        srcPixLin = np.array(srcPixLin).reshape(-1, 3)[:, :2]
+        valid = np.array(success, bool)
+
+        # swap coordinates in GCPs:
+        # pix1/line1 -> lat/lon  =>=>  pix2/line2 -> pix1/line1
+        fakeGCPs = [gdal.GCP(dstPixel, dstLine, 0, srcPixel, srcLine)
+                    for dstPixel, dstLine, srcPixel, srcLine
+                    in np.hstack([dstPixLinXY[valid, :2],
+                                  srcPixLin[valid]]).tolist()]
+
+        # reduce number of GCPs
+        if max_gcp_error is not None:
+            fakeGCPs = _thin_gcps(fakeGCPs, max_gcp_error)
 
         return {'gcps': fakeGCPs, 'srs': NSR('+proj=stere').wkt}
 
@@ -1295,9 +1687,8 @@ class VRT(object):
             band number
 
         '''
-        node0 = Node.create(self.read_xml())
-        node0.delNode('VRTRasterBand', options={'band': bandNum})
-        self.write_xml(node0.rawxml())
+        with self.editing() as node0:
+            node0.delNode('VRTRasterBand', options={'band': bandNum})
 
     def delete_bands(self, bandNums):
         ''' Delete bands
@@ -1308,10 +1699,12 @@ class VRT(object):
             elements are int
 
         '''
-        bandNums.sort()
-        bandNums.reverse()
-        for iBand in bandNums:
-            self.delete_band(iBand)
+        bandNums = [str(bandNum) for bandNum in bandNums]
+        with self.editing() as node0:
+            node0.children = [child for child in node0.children
+                              if not (child.tag == 'VRTRasterBand' and
+                                      child.attributes.get('band') in
+                                      bandNums)]
 
     def set_subsetMask(self, maskDs, xOff, yOff, dstXSize, dstYSize):
         ''' Add maskband and modify xml to proper size
@@ -1392,9 +1785,9 @@ class VRT(object):
         shiftVRT : VRT object with rolled bands
 
         '''
-        # Copy self into self.vrt
+        # Keep reference to self in shiftVRT.vrt
         shiftVRT = VRT(gdalDataset=self.dataset)
-        shiftVRT.vrt = self.copy()
+        shiftVRT.vrt = self._share()
 
         if shiftDegree < 0:
             shiftDegree += 360.0
@@ -1499,13 +1892,14 @@ class VRT(object):
     def get_super_vrt(self):
         '''Create vrt with subVRT
 
-        copy of self in vrt.vrt and change references from vrt to vrt.vrt
+        superVRT references self (superVRT.vrt = self) and has bands which
+        reference the bands of self
 
         '''
 
         # create new self
         superVRT = VRT(gdalDataset=self.dataset)
-        superVRT.vrt = self.copy()
+        superVRT.vrt = self._share()
         superVRT.tps = self.tps
 
         # Add bands to newSelf
@@ -1527,43 +1921,204 @@ class VRT(object):
 
         subsamVRT = self.get_super_vrt()
 
-        # Get XML content from VRT-file
-        vrtXML = subsamVRT.read_xml()
-        node0 = Node.create(vrtXML)
-
-        # replace rasterXSize in <VRTDataset>
-        node0.replaceAttribute('rasterXSize', str(newRasterXSize))
-        node0.replaceAttribute('rasterYSize', str(newRasterYSize))
-
-        rasterYSize = subsamVRT.vrt.dataset.RasterYSize
-        rasterXSize = subsamVRT.vrt.dataset.RasterXSize
-
-        # replace xSize in <DstRect> of each source
-        for iNode1 in node0.nodeList('VRTRasterBand'):
-            for sourceName in ['ComplexSource', 'SimpleSource']:
-                for iNode2 in iNode1.nodeList(sourceName):
-                    iNodeDstRect = iNode2.node('DstRect')
-                    iNodeDstRect.replaceAttribute('xSize',
-                                                  str(newRasterXSize))
-                    iNodeDstRect.replaceAttribute('ySize',
-                                                  str(newRasterYSize))
-            # if method=-1, overwrite 'ComplexSource' to 'AveragedSource'
-            if eResampleAlg == -1:
-                iNode1.replaceTag('ComplexSource', 'AveragedSource')
-                iNode1.replaceTag('SimpleSource', 'AveragedSource')
-                # if the values are complex number, give a warning
-                if iNode1.getAttribute('dataType').startswith('C'):
-                    warnings.warn(
-                        'Band %s : The imaginary parts of complex numbers ' \
-                        'are lost when resampling by averaging ' \
-                        '(eResampleAlg=-1)' %iNode1.getAttribute('band')
-                    )
-
-        # Write the modified elemements into VRT
-        subsamVRT.write_xml(node0.rawxml())
+        # Edit XML content of VRT-file (written on exit)
+        with subsamVRT.editing() as node0:
+            # replace rasterXSize in <VRTDataset>
+            node0.replaceAttribute('rasterXSize', str(newRasterXSize))
+            node0.replaceAttribute('rasterYSize', str(newRasterYSize))
+
+            # replace xSize in <DstRect> of each source
+            for iNode1 in node0.nodeList('VRTRasterBand'):
+                for sourceName in ['ComplexSource', 'SimpleSource']:
+                    for iNode2 in iNode1.nodeList(sourceName):
+                        iNodeDstRect = iNode2.node('DstRect')
+                        iNodeDstRect.replaceAttribute('xSize',
+                                                      str(newRasterXSize))
+                        iNodeDstRect.replaceAttribute('ySize',
+                                                      str(newRasterYSize))
+                # if method=-1, overwrite 'ComplexSource' to 'AveragedSource'
+                if eResampleAlg == -1:
+                    iNode1.replaceTag('ComplexSource', 'AveragedSource')
+                    iNode1.replaceTag('SimpleSource', 'AveragedSource')
+                    # if the values are complex number, give a warning
+                    if iNode1.getAttribute('dataType').startswith('C'):
+                        warnings.warn(
+                            'Band %s : The imaginary parts of complex '
+                            'numbers are lost when resampling by averaging '
+                            '(eResampleAlg=-1)' % iNode1.getAttribute('band')
+                        )
 
         return subsamVRT
 
+    def _is_translation(self, sourceNode):
+        '''Check if source only copies (shifted) pixels from its source band
+
+        Parameters
+        -----------
+        sourceNode : Node
+            <SimpleSource> or <ComplexSource> from XML of a band
+
+        Returns
+        --------
+        True if the source has no scaling, LUT, NODATA or resampling,
+        has SrcRect and DstRect of the same size and references the source
+        file by absolute name
+
+        '''
+        if sourceNode.tag not in ['SimpleSource', 'ComplexSource']:
+            return False
+
+        for child in sourceNode.children:
+            if child.tag in ['SourceFilename', 'SourceBand',
+                             'SourceProperties', 'SrcRect', 'DstRect']:
+                continue
+            elif child.tag in ['NODATA', 'LUT'] and not child.value:
+                continue
+            elif (child.tag == 'ScaleOffset' and
+                    float(child.value or 0) == 0):
+                continue
+            elif (child.tag == 'ScaleRatio' and
+                    float(child.value or 1) == 1):
+                continue
+            return False
+
+        srcRect = sourceNode.node('SrcRect')
+        dstRect = sourceNode.node('DstRect')
+        if (not srcRect or not dstRect or
+                not sourceNode['SourceBand'].isdigit() or
+                sourceNode.node('SourceFilename').attributes.get(
+                    'relativeToVRT', '0') != '0'):
+            return False
+
+        return (_get_rect(srcRect)[2:] == _get_rect(dstRect)[2:])
+
+    def _collapse_sub_vrt(self):
+        '''Make sources of self reference the sources of self.vrt directly
+
+        If bands of the sub-VRT (self.vrt) only copy or crop the data of
+        their sources (e.g. sub-VRT was created by get_super_vrt or by
+        Nansat.crop) the sources of self can reference these data directly.
+        SrcRect of each source of self which references the sub-VRT is
+        shifted by SrcRect/DstRect of the respective source in the sub-VRT,
+        and the sub-VRT is removed from the chain. The sub-VRT is not
+        removed if any of the bands used by self change the data (scaling,
+        LUT, pixel functions, resampling, warping, change of data type).
+        The deepest VRT (created by a mapper) is never removed.
+
+        Returns
+        --------
+        True if the sub-VRT was removed, False otherwise
+
+        Modifies
+        ---------
+        self.dataset : sources of bands are replaced
+        self.vrt : replaced with self.vrt.vrt
+        self.bandVRTs : band VRTs of the removed sub-VRT are added
+
+        '''
+        subVRT = self.vrt
+        if subVRT is None or subVRT.vrt is None:
+            return False
+
+        node0 = Node.create(self.read_xml())
+        subNode0 = Node.create(subVRT.read_xml())
+        if ('subClass' in node0.attributes or
+                'subClass' in subNode0.attributes):
+            return False
+
+        # files which are kept alive after removal of the sub-VRT
+        keptFiles = [subVRT.vrt.fileName]
+        keptFiles += [bandVRT.fileName
+                      for bandVRT in _get_band_vrts(subVRT.bandVRTs)]
+
+        # find bands of the sub-VRT which only copy/crop their sources
+        subSources = {}
+        datasets = {}
+        for bandNode in subNode0.nodeList('VRTRasterBand'):
+            sources = [child for child in bandNode.children
+                       if child.tag.endswith('Source')]
+            if ('subClass' in bandNode.attributes or len(sources) != 1 or
+                    not self._is_translation(sources[0])):
+                continue
+            srcFileName = sources[0]['SourceFilename']
+            srcBand = int(sources[0]['SourceBand'])
+            if (srcFileName.startswith('/vsimem/') and
+                    srcFileName not in keptFiles):
+                continue
+
+            # data type of the source should not change
+            properties = sources[0].node('SourceProperties')
+            if properties:
+                srcDataType = properties.getAttribute('DataType')
+            else:
+                if srcFileName not in datasets:
+                    datasets[srcFileName] = gdal.Open(srcFileName)
+                if datasets[srcFileName] is None:
+                    continue
+                srcDataType = gdal.GetDataTypeName(
+                    datasets[srcFileName].GetRasterBand(srcBand).DataType)
+            if srcDataType != bandNode.getAttribute('dataType'):
+                continue
+
+            subSources[int(bandNode.getAttribute('band'))] = sources[0]
+        datasets = None
+
+        # compose sources of self with sources of the sub-VRT
+        for bandNode in node0.nodeList('VRTRasterBand'):
+            for sourceNode in bandNode.children:
+                if (sourceNode.tag not in ['SimpleSource', 'ComplexSource',
+                                           'AveragedSource'] or
+                        sourceNode['SourceFilename'] != subVRT.fileName):
+                    continue
+                subSource = subSources.get(int(sourceNode['SourceBand']))
+                srcRect = sourceNode.node('SrcRect')
+                if subSource is None or not srcRect:
+                    return False
+                xOff, yOff, xSize, ySize = _get_rect(srcRect)
+                subSrcRect = _get_rect(subSource.node('SrcRect'))
+                subDstRect = _get_rect(subSource.node('DstRect'))
+                # only pixels inside DstRect of the sub-VRT are read
+                if (xOff < subDstRect[0] or yOff < subDstRect[1] or
+                        xOff + xSize > subDstRect[0] + subDstRect[2] or
+                        yOff + ySize > subDstRect[1] + subDstRect[3]):
+                    return False
+                srcRect.replaceAttribute('xOff', _format_number(
+                    subSrcRect[0] + xOff - subDstRect[0]))
+                srcRect.replaceAttribute('yOff', _format_number(
+                    subSrcRect[1] + yOff - subDstRect[1]))
+                sourceNode.replaceNode('SourceFilename', newNode=
+                                       subSource.node('SourceFilename'))
+                sourceNode.replaceNode('SourceBand', newNode=
+                                       subSource.node('SourceBand'))
+                # properties of the new source band
+                sourceNode.children = [child for child in sourceNode.children
+                                       if child.tag != 'SourceProperties']
+                if subSource.node('SourceProperties'):
+                    sourceNode.children.insert(
+                        2, subSource.node('SourceProperties'))
+
+        # the sub-VRT can be removed only if nothing references it
+        xml = node0.rawxml()
+        if subVRT.fileName in xml:
+            return False
+        self.write_xml(xml)
+
+        # keep VRTs of the removed sub-VRT
+        bandVRTs = dict(self.bandVRTs)
+        for bandVRTName, bandVRT in subVRT.bandVRTs.items():
+            if (bandVRTName in bandVRTs and
+                    bandVRTs[bandVRTName] is not bandVRT):
+                bandVRTName = '%s_%s' % (bandVRTName, bandVRT.fileName)
+            bandVRTs[bandVRTName] = bandVRT
+        self.bandVRTs = bandVRTs
+        if self.geolocationArray.xVRT is None:
+            self.geolocationArray.xVRT = subVRT.geolocationArray.xVRT
+            self.geolocationArray.yVRT = subVRT.geolocationArray.yVRT
+
+        self.vrt = subVRT.vrt
+
+        return True
+
     def transform_points(self, colVector, rowVector, DstToSrc=0,
                          dstDs=None, options=None):
         '''Transform given lists of X,Y coordinates into lat/lon
@@ -1647,8 +2202,8 @@ class VRT(object):
         ''' Resize VRT
 
         Create Warped VRT with modified RasterXSize, RasterYSize, GeoTransform.
-        The returned VRT object has a copy of its original source VRT in its
-        own vrt object (e.g. warpedVRT.vrt = originalVRT.copy()).
+        The returned VRT object keeps its original source VRT in its
+        own vrt object (e.g. warpedVRT.vrt = originalVRT).
 
         Parameters
         -----------
@@ -1714,3 +2269,47 @@ class VRT(object):
 
         # Update dataset
         self.dataset.SetGCPs(dstGCPs, dstSRS.wkt)
+
+
+def _get_vrt_tree(vrt):
+    ''' Get list of VRTs referenced by the VRT (referenced before referring)
+
+    Parameters
+    -----------
+    vrt : VRT
+        the top VRT
+
+    Returns
+    --------
+    vrts : list
+        all VRTs in the tree, the top VRT is the last
+
+    '''
+    vrts = []
+    fileNames = set()
+
+    def add_vrt(iVRT):
+        if iVRT is None or iVRT.fileName in fileNames:
+            return
+        fileNames.add(iVRT.fileName)
+        add_vrt(iVRT.vrt)
+        for bandVRT in _get_band_vrts(iVRT.bandVRTs):
+            add_vrt(bandVRT)
+        add_vrt(iVRT.geolocationArray.xVRT)
+        add_vrt(iVRT.geolocationArray.yVRT)
+        vrts.append(iVRT)
+
+    add_vrt(vrt)
+    return vrts
+
+
+def _get_band_vrts(bandVRTs):
+    ''' Get list of VRTs in bandVRTs (values are VRTs or lists of VRTs) '''
+    vrts = []
+    for bandKey in sorted(bandVRTs or {}):
+        bandVRT = bandVRTs[bandKey]
+        if isinstance(bandVRT, list):
+            vrts.extend(bandVRT)
+        else:
+            vrts.append(bandVRT)
+    return vrts
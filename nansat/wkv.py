@@ -0,0 +1,80 @@
+# Name:    wkv.py
+# Purpose: Registry of well known variables from wkv.xml
+# Authors:      Anton Korosov
+# Created:      18.10.2016
+# Copyright:    (c) NERSC 2011 - 2016
+# Licence:
+# This file is part of NANSAT.
+# NANSAT is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+# http://www.gnu.org/licenses/gpl-3.0.html
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+from __future__ import absolute_import
+import os
+import threading
+import xml.etree.ElementTree as ET
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class WKVRegistry(Mapping):
+    '''Read-only dictionary of well known variables (WKV)
+
+    Keys are standard names, values are dictionaries with standard_name,
+    long_name, short_name, units, etc. The XML-file is parsed only once, at
+    the first access. Values are copies, therefore the registry cannot be
+    modified.
+
+    Nansat uses one registry per process (nansat.wkv.wkvRegistry):
+
+    from nansat.wkv import wkvRegistry
+    wkvRegistry['surface_backwards_scattering_coefficient_of_radar_wave']
+    # {'standard_name': 'surface_backwards_scattering_coefficient_of_radar
+    # _wave', 'short_name': 'sigma0', 'units': 'm/m', ...}
+
+    '''
+    def __init__(self, fileName):
+        '''Create registry from XML-file
+
+        Parameters
+        -----------
+        fileName : str
+            name of the XML-file with <wkv> elements
+
+        '''
+        self.fileName = fileName
+        self._wkvs = None
+        self._lock = threading.Lock()
+
+    def _get_wkvs(self):
+        '''Parse XML-file (only once) and return dictionary of WKVs'''
+        if self._wkvs is None:
+            with self._lock:
+                if self._wkvs is None:
+                    wkvs = {}
+                    for wkvElement in ET.parse(self.fileName).findall('wkv'):
+                        wkvDict = dict((str(child.tag),
+                                        str((child.text or '').strip()))
+                                       for child in wkvElement)
+                        wkvs[wkvDict['standard_name']] = wkvDict
+                    self._wkvs = wkvs
+        return self._wkvs
+
+    def __getitem__(self, standardName):
+        return dict(self._get_wkvs()[standardName])
+
+    def __iter__(self):
+        return iter(self._get_wkvs())
+
+    def __len__(self):
+        return len(self._get_wkvs())
+
+
+# well known variables from nansat/wkv.xml shared by all VRT objects
+wkvRegistry = WKVRegistry(os.path.join(os.path.dirname(
+                          os.path.realpath(__file__)), 'wkv.xml'))
@@ -214,7 +214,7 @@ def run_setup(skip_compile):
         platforms=PLATFORMS,
         packages=packages,
         package_data={NAME:['wkv.xml', "fonts/*.ttf", 'mappers/*.pl',
-            'tests/data/*.*']},
+            'mappers/manifest.json', 'tests/data/*.*']},
         scripts=[os.path.join('utilities', name) for name in
                     ['nansatinfo',
                      'nansat_add_coastline',